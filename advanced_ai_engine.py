@@ -8,9 +8,14 @@ import numpy as np
 from datetime import datetime, timedelta
 import logging
 from typing import Dict, List, Tuple
+from analysis_cache import analysis_cache
 
 logger = logging.getLogger(__name__)
 
+# Market analysis is shared by every bot until the next bar of the
+# finest timeframe it looks at opens
+ANALYSIS_TIMEFRAME = '15m'
+
 
 class AdvancedAIEngine:
     """
@@ -21,6 +26,11 @@ class AdvancedAIEngine:
     def __init__(self, exchange):
         self.exchange = exchange
         
+    def _per_bar(self, kind: str, symbol: str, compute, cache_if=None):
+        """Compute once per ANALYSIS_TIMEFRAME bar for all engines on this exchange"""
+        key = (getattr(self.exchange, 'id', None), kind, symbol)
+        return analysis_cache.get(key, ANALYSIS_TIMEFRAME, compute, cache_if=cache_if)
+    
     def analyze_multi_timeframe(self, symbol: str) -> Dict:
         """
         Analyze trend across multiple timeframes (like 3Commas)
@@ -515,7 +525,8 @@ class AdvancedAIEngine:
             logger.error(f"Error updating smart trailing stop: {e}")
             return position
     
-    def analyze_risk_score(self, symbol: str, confidence: int, volatility: float) -> Dict:
+    def analyze_risk_score(self, symbol: str, confidence: int, volatility: float,
+                           volume_24h: float = None) -> Dict:
         """
         Calculate comprehensive risk score (like Bitsgap)
         
@@ -523,6 +534,7 @@ class AdvancedAIEngine:
             symbol: Trading pair
             confidence: Signal confidence
             volatility: Market volatility
+            volume_24h: 24h quote volume, fetched from the ticker if not given
         
         Returns:
             dict: {
@@ -551,8 +563,9 @@ class AdvancedAIEngine:
             
             # 3. Liquidity risk (check volume)
             try:
-                ticker = self.exchange.fetch_ticker(symbol)
-                volume_24h = ticker.get('quoteVolume', 0)
+                if volume_24h is None:
+                    ticker = self.exchange.fetch_ticker(symbol)
+                    volume_24h = ticker.get('quoteVolume', 0)
                 
                 if volume_24h > 10_000_000:
                     liquidity_risk = 0.1  # Very liquid
@@ -604,9 +617,18 @@ class AdvancedAIEngine:
         """
         Comprehensive real-time market analysis with all indicators
         
+        Computed once per bar and shared by every caller (see analysis_cache).
+        
         Returns:
             dict: Complete market analysis with insights and recommendations
         """
+        return self._per_bar(
+            'comprehensive', symbol,
+            lambda: self._comprehensive_market_analysis(symbol),
+            cache_if=lambda result: bool(result['indicators'])
+        )
+    
+    def _comprehensive_market_analysis(self, symbol: str) -> Dict:
         try:
             logger.info(f"\n{'='*70}")
             logger.info(f"🔍 COMPREHENSIVE MARKET ANALYSIS: {symbol}")
@@ -733,14 +755,18 @@ class AdvancedAIEngine:
             }
         """
         try:
-            # Multi-timeframe analysis
-            mtf = self.analyze_multi_timeframe(symbol)
-            
-            # Calculate volatility
-            volatility = self.calculate_volatility(symbol)
+            # Market state is shared per bar; only the signal-specific
+            # checks below run per call
+            market = self._per_bar(
+                'entry_market', symbol,
+                lambda: self._entry_market_state(symbol),
+                cache_if=lambda result: bool(result['multi_timeframe']['timeframes'])
+            )
+            mtf = market['multi_timeframe']
+            volatility = market['volatility']
             
             # Risk score
-            risk = self.analyze_risk_score(symbol, confidence, volatility)
+            risk = self.analyze_risk_score(symbol, confidence, volatility, market['volume_24h'])
             
             # Decision logic
             should_enter = True
@@ -792,6 +818,21 @@ class AdvancedAIEngine:
                 'analysis': {}
             }
 
+    
+    def _entry_market_state(self, symbol: str) -> Dict:
+        """Signal-independent inputs of should_enter_trade"""
+        try:
+            volume_24h = self.exchange.fetch_ticker(symbol).get('quoteVolume', 0)
+        except Exception as e:
+            logger.warning(f"Could not fetch ticker for {symbol}: {e}")
+            volume_24h = None
+        
+        return {
+            'multi_timeframe': self.analyze_multi_timeframe(symbol),
+            'volatility': self.calculate_volatility(symbol),
+            'volume_24h': volume_24h
+        }
+
 
 # Example usage
 if __name__ == "__main__":
@@ -131,7 +131,7 @@ class AdvancedBacktester:
             
             # Train strategy on historical data
             if len(train_data) >= 50:
-                self.strategy.train_ml_model(train_data, symbol)
+                self.strategy.train_ml_model(train_data, symbol, persist=False, warm_start=False)
             
             # Run backtest on test period
             period_result = self._single_period_backtest(test_data, symbol, verbose=False)
@@ -25,13 +25,18 @@ class AITradingAssistant:
     def analyze_user_performance(self, user_id):
         """
         Comprehensive analysis of user's trading performance
+        
+        Answers from the user's running analytics (trade_analytics.py),
+        which every trade close keeps up to date, instead of refetching
+        and rescanning their trades.
         """
-        trades = self.get_user_trades(user_id)
+        stats = self.db.analytics.get_totals(str(user_id))
+        total_trades = stats.get('trades', 0)
         
-        if len(trades) < 10:
+        if total_trades < 10:
             return {
                 'status': 'insufficient_data',
-                'message': f'Keep trading! Need at least 10 trades to analyze. You have {len(trades)} trades.',
+                'message': f'Keep trading! Need at least 10 trades to analyze. You have {total_trades} trades.',
                 'suggestions': [],
                 'quick_tips': [
                     'Start with paper trading to learn',
@@ -41,21 +46,7 @@ class AITradingAssistant:
                 ]
             }
         
-        # Calculate all metrics
-        analysis = {
-            'win_rate': self.calculate_win_rate(trades),
-            'avg_win': self.calculate_avg_win(trades),
-            'avg_loss': self.calculate_avg_loss(trades),
-            'profit_factor': self.calculate_profit_factor(trades),
-            'max_drawdown': self.calculate_max_drawdown(trades),
-            'avg_hold_time': self.calculate_avg_hold_time(trades),
-            'best_trading_times': self.find_best_times(trades),
-            'best_symbols': self.find_best_symbols(trades),
-            'worst_symbols': self.find_worst_symbols(trades),
-            'common_mistakes': self.find_mistakes(trades),
-            'trading_pattern': self.detect_trading_pattern(trades),
-            'risk_score': self.calculate_risk_score(trades)
-        }
+        analysis = self.analysis_from_stats(stats)
         
         # Generate suggestions
         suggestions = self.generate_suggestions(analysis)
@@ -68,9 +59,64 @@ class AITradingAssistant:
             'analysis': analysis,
             'suggestions': suggestions,
             'grade': grade,
-            'total_trades': len(trades)
+            'total_trades': total_trades
+        }
+    
+    def analysis_from_stats(self, stats):
+        """
+        All metrics from precomputed aggregates (no trade scan)
+        """
+        trades = stats.get('trades', 0)
+        wins = stats.get('wins', 0)
+        losses = stats.get('losses', 0)
+        gross_profit = stats.get('gross_profit', 0)
+        gross_loss = stats.get('gross_loss', 0)
+        
+        win_rate = (wins / trades) * 100 if trades else 0
+        avg_win = gross_profit / wins if wins else 0
+        avg_loss = gross_loss / losses if losses else 0
+        if gross_loss == 0:
+            profit_factor = float('inf') if gross_profit > 0 else 0
+        else:
+            profit_factor = gross_profit / gross_loss
+        max_dd = stats.get('max_drawdown', 0)
+        avg_hold = self._avg(stats, 'hold', default=0)
+        
+        hour_avg = {int(hour): bucket['pnl'] / bucket['trades']
+                    for hour, bucket in stats.get('hours', {}).items() if bucket.get('trades')}
+        best_hours = sorted(hour_avg.items(), key=lambda x: x[1], reverse=True)[:3]
+        
+        symbol_avg = {symbol: bucket['pnl'] / bucket['trades']
+                      for symbol, bucket in stats.get('symbols', {}).items() if bucket.get('trades', 0) >= 3}
+        best_symbols = sorted(symbol_avg.items(), key=lambda x: x[1], reverse=True)[:3]
+        worst_symbols = sorted(symbol_avg.items(), key=lambda x: x[1])[:3]
+        
+        return {
+            'win_rate': win_rate,
+            'avg_win': avg_win,
+            'avg_loss': avg_loss,
+            'profit_factor': profit_factor,
+            'max_drawdown': max_dd,
+            'avg_hold_time': avg_hold,
+            'hold_time_distribution': stats.get('hold_hist', {}),
+            'best_trading_times': [f"{hour:02d}:00-{hour+1:02d}:00" for hour, _ in best_hours],
+            'best_symbols': [symbol for symbol, _ in best_symbols],
+            'worst_symbols': [symbol for symbol, _ in worst_symbols if worst_symbols[0][1] < 0],
+            'common_mistakes': self._mistakes(
+                trades, win_rate, avg_win, avg_loss,
+                self._avg(stats, 'win_hold') if wins else None,
+                self._avg(stats, 'loss_hold') if losses else None
+            ),
+            'trading_pattern': self._pattern(avg_hold),
+            'risk_score': self._risk_score(max_dd, win_rate, profit_factor)
         }
     
+    @staticmethod
+    def _avg(stats, prefix, default=3600):
+        """Average hold time in seconds from <prefix>_seconds / <prefix>_count"""
+        count = stats.get(f'{prefix}_count', 0)
+        return stats.get(f'{prefix}_seconds', 0) / count if count else default
+    
     def get_user_trades(self, user_id):
         """
         Get all closed trades for user
@@ -201,14 +247,24 @@ class AITradingAssistant:
     
     def find_mistakes(self, trades):
         """Identify common trading mistakes"""
-        mistakes = []
-        
         wins = [t for t in trades if t.get('pnl', 0) > 0]
         losses = [t for t in trades if t.get('pnl', 0) < 0]
         
+        return self._mistakes(
+            len(trades),
+            self.calculate_win_rate(trades),
+            self.calculate_avg_win(trades),
+            self.calculate_avg_loss(trades),
+            np.mean([t.get('hold_time', 3600) for t in wins]) if wins else None,
+            np.mean([t.get('hold_time', 3600) for t in losses]) if losses else None
+        )
+    
+    def _mistakes(self, total_trades, win_rate, avg_win, avg_loss, avg_win_time, avg_loss_time):
+        """Mistakes from summary figures (hold times in seconds, None without wins/losses)"""
+        mistakes = []
+        
         # Cutting winners too early
-        if wins:
-            avg_win_time = np.mean([t.get('hold_time', 3600) for t in wins])
+        if avg_win_time is not None:
             if avg_win_time < 3600:  # Less than 1 hour
                 mistakes.append({
                     'type': 'cutting_winners_early',
@@ -217,9 +273,7 @@ class AITradingAssistant:
                 })
         
         # Letting losers run
-        if losses and wins:
-            avg_loss_time = np.mean([t.get('hold_time', 3600) for t in losses])
-            avg_win_time = np.mean([t.get('hold_time', 3600) for t in wins])
+        if avg_loss_time is not None and avg_win_time is not None:
             if avg_loss_time > avg_win_time * 1.5:
                 mistakes.append({
                     'type': 'letting_losers_run',
@@ -228,8 +282,7 @@ class AITradingAssistant:
                 })
         
         # Over-trading
-        if len(trades) > 50:  # More than 50 trades in analysis period
-            win_rate = self.calculate_win_rate(trades)
+        if total_trades > 50:  # More than 50 trades in analysis period
             if win_rate < 55:
                 mistakes.append({
                     'type': 'overtrading',
@@ -238,8 +291,6 @@ class AITradingAssistant:
                 })
         
         # Poor risk/reward
-        avg_win = self.calculate_avg_win(trades)
-        avg_loss = self.calculate_avg_loss(trades)
         if avg_loss > avg_win:
             mistakes.append({
                 'type': 'poor_risk_reward',
@@ -251,8 +302,9 @@ class AITradingAssistant:
     
     def detect_trading_pattern(self, trades):
         """Detect user's trading pattern"""
-        avg_hold = self.calculate_avg_hold_time(trades)
-        
+        return self._pattern(self.calculate_avg_hold_time(trades))
+    
+    def _pattern(self, avg_hold):
         if avg_hold < 3600:  # < 1 hour
             return 'scalper'
         elif avg_hold < 14400:  # < 4 hours
@@ -267,11 +319,13 @@ class AITradingAssistant:
         if not trades:
             return 50
         
-        # Factors
-        max_dd = self.calculate_max_drawdown(trades)
-        win_rate = self.calculate_win_rate(trades)
-        profit_factor = self.calculate_profit_factor(trades)
-        
+        return self._risk_score(
+            self.calculate_max_drawdown(trades),
+            self.calculate_win_rate(trades),
+            self.calculate_profit_factor(trades)
+        )
+    
+    def _risk_score(self, max_dd, win_rate, profit_factor):
         # Calculate score (lower is riskier)
         risk = 100
         
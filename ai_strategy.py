@@ -7,22 +7,77 @@ import numpy as np
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import TimeSeriesSplit
+from sklearn.base import clone
 import joblib
+from joblib import Parallel, delayed
+import copy
+import os
 import requests
 import re
+import time
+from functools import lru_cache
 from datetime import datetime, timedelta
 from ta.trend import SMAIndicator, EMAIndicator, MACD, ADXIndicator
 from ta.momentum import RSIIndicator, StochasticOscillator
 from ta.volatility import BollingerBands, AverageTrueRange
-from ta.volume import OnBalanceVolumeIndicator, VolumeSMAIndicator
+from ta.volume import OnBalanceVolumeIndicator
 import config
+from model_registry import ModelRegistry
+from feature_store import FeatureStore
+
+# Memory accounting for training runs is optional
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+CANDLE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# sma_200 plus warm-up for the recursive indicators (EMA 50, ADX, ATR)
+INDICATOR_LOOKBACK = 600
+
+# Ensemble size for a full fit, trees/stages added per warm start, and the
+# size at which a warm-started model is rebuilt from scratch instead
+N_ESTIMATORS = 100
+WARM_START_ESTIMATORS = 20
+MAX_WARM_START_ESTIMATORS = 300
+
+
+@lru_cache(maxsize=64)
+def _fold_splits(n_samples, n_splits):
+    """TimeSeriesSplit indices; shared by every symbol with the same history length"""
+    return tuple(TimeSeriesSplit(n_splits=n_splits).split(np.arange(n_samples)))
+
+
+def _fold_score(model, X, y, train_idx, test_idx):
+    model.fit(X[train_idx], y[train_idx])
+    return model.score(X[test_idx], y[test_idx])
+
+
+def _rss_mb():
+    if not PSUTIL_AVAILABLE:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
 
 
 class AITradingStrategy:
     def __init__(self):
         self.name = "AI-Powered Multi-Strategy"
-        self.models = {}
-        self.scalers = {}
+        # Per-symbol {'rf', 'gb', 'features', 'scaler'} bundles, LRU-capped
+        self.registry = ModelRegistry(
+            os.path.join(config.MODEL_DIR, 'ai_strategy'),
+            max_in_memory=config.MODEL_CACHE_SIZE
+        )
+        # Indicator frames per symbol, extended one candle at a time
+        self.indicators = FeatureStore(
+            self.add_advanced_indicators, lookback=INDICATOR_LOOKBACK,
+            input_columns=CANDLE_COLUMNS
+        )
+        self.n_jobs = config.ML_TRAIN_N_JOBS
+        self.cv_splits = config.ML_CV_SPLITS
+        # Last training run per symbol: time, memory, mode, CV scores
+        self.training_stats = {}
         self.sentiment_cache = {}
         self.last_sentiment_update = None
         
@@ -73,7 +128,8 @@ class AITradingStrategy:
         
         # Volume indicators
         df['obv'] = OnBalanceVolumeIndicator(close=df['close'], volume=df['volume']).on_balance_volume()
-        df['volume_sma'] = VolumeSMAIndicator(close=df['close'], volume=df['volume']).volume_sma()
+        # ta has no volume SMA indicator; a 20-bar rolling mean is the same thing
+        df['volume_sma'] = df['volume'].rolling(window=20).mean()
         
         # Price action patterns
         df['doji'] = self._detect_doji(df)
@@ -207,44 +263,127 @@ class AITradingStrategy:
         
         return df[feature_columns].fillna(0)
     
-    def train_ml_model(self, df, symbol):
-        """Train machine learning model for price prediction"""
-        try:
-            # Prepare features
-            features_df = self.prepare_ml_features(df)
-            
-            # Create target (future price movement)
-            df['future_return'] = df['close'].shift(-1) / df['close'] - 1
-            target = df['future_return'].fillna(0)
-            
-            # Remove last row (no future data)
-            features_df = features_df[:-1]
-            target = target[:-1]
-            
-            if len(features_df) < 50:
-                return False
-            
+    def _can_warm_start(self, previous, features):
+        return (
+            previous is not None
+            and previous.get('features') == features
+            and previous['rf'].n_estimators + WARM_START_ESTIMATORS <= MAX_WARM_START_ESTIMATORS
+        )
+    
+    @staticmethod
+    def _cv_model(model):
+        """Unfitted full-size copy for a CV fold; folds are the parallel unit"""
+        model = clone(model).set_params(warm_start=False, n_estimators=N_ESTIMATORS)
+        if 'n_jobs' in model.get_params():
+            model.set_params(n_jobs=1)
+        return model
+    
+    def _fit_models(self, df, symbol=None, previous=None, cv=False):
+        """
+        Fit the ensemble on df; returns a model bundle or None
+        
+        With a compatible previous bundle the models are warm-started:
+        its scaler is kept and WARM_START_ESTIMATORS trees/stages are
+        added on the new data, instead of refitting all of them. RF and
+        GB are fitted side by side, and RF also spreads its trees over
+        n_jobs cores.
+        """
+        started = time.perf_counter()
+        rss_before = _rss_mb()
+        
+        # Prepare features (offline pass of the same indicator pipeline)
+        df = self.indicators.compute(df)
+        features_df = self.prepare_ml_features(df)
+        
+        # Create target (future price movement)
+        df['future_return'] = df['close'].shift(-1) / df['close'] - 1
+        target = df['future_return'].fillna(0)
+        
+        # Remove last row (no future data)
+        features_df = features_df[:-1]
+        target = target[:-1].values
+        
+        if len(features_df) < 50:
+            return None
+        
+        features = list(features_df.columns)
+        
+        if self._can_warm_start(previous, features):
+            mode = 'warm_start'
+            # Old trees were fitted in the old scaler's space; keep it
+            scaler = previous['scaler']
+            features_scaled = scaler.transform(features_df)
+            rf_model = copy.deepcopy(previous['rf'])
+            gb_model = copy.deepcopy(previous['gb'])
+            rf_model.set_params(warm_start=True, n_jobs=self.n_jobs,
+                                n_estimators=rf_model.n_estimators + WARM_START_ESTIMATORS)
+            gb_model.set_params(warm_start=True,
+                                n_estimators=gb_model.n_estimators + WARM_START_ESTIMATORS)
+        else:
+            mode = 'full'
             # Scale features
             scaler = StandardScaler()
             features_scaled = scaler.fit_transform(features_df)
             
             # Train ensemble model
-            rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-            gb_model = GradientBoostingRegressor(n_estimators=100, random_state=42)
-            
-            # Time series cross-validation
-            tscv = TimeSeriesSplit(n_splits=3)
-            
-            rf_model.fit(features_scaled, target)
-            gb_model.fit(features_scaled, target)
+            rf_model = RandomForestRegressor(n_estimators=N_ESTIMATORS, random_state=42, n_jobs=self.n_jobs)
+            gb_model = GradientBoostingRegressor(n_estimators=N_ESTIMATORS, random_state=42)
+        
+        # Time series cross-validation on fresh copies (rf/gb x folds in parallel)
+        cv_scores = {}
+        if cv:
+            folds = _fold_splits(len(features_df), self.cv_splits)
+            members = {'rf': rf_model, 'gb': gb_model}
+            tasks = [(name, train_idx, test_idx) for name in members for train_idx, test_idx in folds]
+            scores = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+                delayed(_fold_score)(
+                    self._cv_model(members[name]), features_scaled, target, train_idx, test_idx
+                )
+                for name, train_idx, test_idx in tasks
+            )
+            for (name, _, _), score in zip(tasks, scores):
+                cv_scores.setdefault(name, []).append(round(float(score), 6))
+        
+        # Tree building releases the GIL, so the two members overlap
+        Parallel(n_jobs=2, prefer='threads')(
+            delayed(model.fit)(features_scaled, target) for model in (rf_model, gb_model)
+        )
+        
+        rss_after = _rss_mb()
+        stats = {
+            'mode': mode,
+            'rows': len(features_df),
+            'n_estimators': rf_model.n_estimators,
+            'train_seconds': round(time.perf_counter() - started, 3),
+            'rss_mb': round(rss_after, 1) if rss_after is not None else None,
+            'rss_delta_mb': round(rss_after - rss_before, 1) if rss_after is not None else None,
+            'cv_scores': cv_scores,
+            'trained_at': datetime.utcnow().isoformat()
+        }
+        if symbol is not None:
+            self.training_stats[symbol] = stats
+        
+        return {
+            'rf': rf_model,
+            'gb': gb_model,
+            'features': features,
+            'scaler': scaler,
+            'training': stats
+        }
+    
+    def train_ml_model(self, df, symbol, persist=True, warm_start=True, cv=False):
+        """Train machine learning model for price prediction (blocking)"""
+        try:
+            previous = self.registry.get(symbol) if warm_start else None
+            bundle = self._fit_models(df, symbol, previous=previous, cv=cv)
+            if bundle is None:
+                return False
             
-            # Store models
-            self.models[symbol] = {
-                'rf': rf_model,
-                'gb': gb_model,
-                'features': list(features_df.columns)
-            }
-            self.scalers[symbol] = scaler
+            # Store models (persist=False keeps e.g. backtest models out of models/)
+            if persist:
+                self.registry.save(symbol, bundle, bundle['training'])
+            else:
+                self.registry.put(symbol, bundle)
             
             return True
             
@@ -252,24 +391,47 @@ class AITradingStrategy:
             print(f"Error training ML model for {symbol}: {e}")
             return False
     
+    def retrain_universe(self, data_by_symbol, warm_start=True, cv=True):
+        """
+        Retrain every symbol (e.g. from a nightly job)
+        
+        Symbols run one after another, each using all n_jobs cores.
+        Returns per-symbol training stats plus totals, so the run can be
+        checked against its time window.
+        """
+        started = time.perf_counter()
+        report = {'symbols': {}, 'failed': []}
+        
+        for symbol, df in data_by_symbol.items():
+            if self.train_ml_model(df, symbol, warm_start=warm_start, cv=cv):
+                report['symbols'][symbol] = self.training_stats.get(symbol)
+            else:
+                report['failed'].append(symbol)
+        
+        rss = [s['rss_mb'] for s in report['symbols'].values() if s and s.get('rss_mb') is not None]
+        report['total_seconds'] = round(time.perf_counter() - started, 3)
+        report['peak_rss_mb'] = max(rss) if rss else None
+        return report
+    
     def predict_price_movement(self, df, symbol):
         """Predict future price movement using ML"""
         try:
-            if symbol not in self.models:
-                # Train model if not exists
-                if not self.train_ml_model(df, symbol):
-                    return 0, 0
+            models = self.registry.get(symbol)
+            if models is None:
+                # Never train on the signal path: queue it and sit this bar out
+                data = df.copy()
+                self.registry.train_async(symbol, lambda: self._fit_models(data, symbol))
+                return 0, 0
             
             # Prepare current features
             features_df = self.prepare_ml_features(df)
             current_features = features_df.iloc[-1:].values
             
             # Scale features
-            scaler = self.scalers[symbol]
+            scaler = models['scaler']
             current_features_scaled = scaler.transform(current_features)
             
             # Make predictions
-            models = self.models[symbol]
             rf_pred = models['rf'].predict(current_features_scaled)[0]
             gb_pred = models['gb'].predict(current_features_scaled)[0]
             
@@ -290,8 +452,8 @@ class AITradingStrategy:
         if len(df) < 200:
             return None, 0, {}
         
-        # Add all indicators
-        df = self.add_advanced_indicators(df)
+        # Add all indicators (only new candles are computed)
+        df = self.indicators.update(symbol, df)
         
         latest = df.iloc[-1]
         prev = df.iloc[-2]
@@ -0,0 +1,141 @@
+"""
+Per-Bar Analysis Cache
+Memoizes market analysis per (symbol, timeframe bar) for every bot in the
+process: the first caller in a bar computes, callers that arrive while it
+is running wait for that same computation (single flight), and everyone
+after gets the stored result until the next bar opens.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_KEYS = 2048
+DEFAULT_WAIT_TIMEOUT = 60.0
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """'15m' -> 900, '4h' -> 14400"""
+    try:
+        return int(timeframe[:-1]) * _UNITS[timeframe[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+
+def bar_open(timeframe: str, now: Optional[float] = None) -> int:
+    """Epoch second the current bar of `timeframe` opened at"""
+    seconds = timeframe_seconds(timeframe)
+    now = time.time() if now is None else now
+    return int(now // seconds) * seconds
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BarCache:
+    """
+    Single-flight memo of one result per key per bar
+
+    A key holds only its latest bar's result, so a new bar replaces the
+    old entry instead of piling up. Results are handed out as deep
+    copies; callers are free to modify what they get back.
+    """
+
+    def __init__(self, max_keys: int = DEFAULT_MAX_KEYS,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT):
+        self.max_keys = max_keys
+        self.wait_timeout = wait_timeout
+        self._entries: OrderedDict = OrderedDict()  # key -> (bar, result)
+        self._flights: Dict = {}                     # (key, bar) -> _Flight
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'computed': 0, 'waited': 0, 'not_cached': 0}
+
+    def get(self, key: Hashable, timeframe: str, compute: Callable,
+            cache_if: Optional[Callable] = None, now: Optional[float] = None):
+        """
+        Result of compute() for key in the current bar of `timeframe`
+
+        cache_if(result) -> False keeps a result (e.g. a fallback returned
+        after a failed fetch) out of the cache; it is still handed to the
+        callers already waiting on it.
+        """
+        bar = bar_open(timeframe, now)
+        flight_key = (key, bar)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == bar:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return copy.deepcopy(entry[1])
+
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+            else:
+                self.stats['waited'] += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return copy.deepcopy(flight.result)
+            # The computation is stuck (slow exchange); don't queue behind it
+            logger.warning(f"Timed out waiting for analysis of {key}; computing directly")
+            return compute()
+
+        try:
+            flight.result = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+                if flight.error is None:
+                    if cache_if is None or cache_if(flight.result):
+                        self._store(key, bar, flight.result)
+                        self.stats['computed'] += 1
+                    else:
+                        self.stats['not_cached'] += 1
+            flight.done.set()
+
+        return copy.deepcopy(flight.result)
+
+    def _store(self, key, bar, result):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > bar:
+            return  # a newer bar landed while this one was computing
+        self._entries[key] = (bar, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['keys'] = len(self._entries)
+            stats['in_flight'] = len(self._flights)
+        return stats
+
+
+# Shared by every AdvancedAIEngine in the process
+analysis_cache = BarCache()
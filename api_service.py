@@ -4,13 +4,22 @@ Allows external developers to integrate with the trading bot
 """
 import secrets
 import hashlib
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 import logging
+import config
+from principal_cache import PrincipalCache
+from rate_limit import RateLimitEngine, get_engine, retry_after_seconds
 
 logger = logging.getLogger(__name__)
 
 
+def rate_limit_bucket(prefix: str, api_key: str) -> str:
+    """Rate-limit bucket name; keys are hashed so they never reach Redis or logs"""
+    return f"{prefix}:{hashlib.sha256(api_key.encode()).hexdigest()}"
+
+
 class APIKeyManager:
     """
     Manage API keys for third-party access
@@ -25,6 +34,34 @@ class APIKeyManager:
         """
         self.db = db
         self.api_keys_collection = db.db['api_keys']
+        self.rate_engine = get_engine()
+        # Active keys by api_key; revoked keys drop out immediately here
+        # and within the TTL in other workers
+        self.key_cache = PrincipalCache(ttl=config.API_KEY_CACHE_TTL)
+        # Usage counters are coalesced and flushed in bulk when available
+        self.writer = getattr(db, 'writer', None)
+    
+    def _get_active_key(self, api_key: str) -> Optional[Dict]:
+        """Active key document, from cache when possible"""
+        return self.key_cache.get(
+            api_key,
+            lambda key: self.api_keys_collection.find_one({'api_key': key, 'is_active': True})
+        )
+    
+    def _record_usage(self, api_key: str):
+        """Count a request against the key (batched via the write-behind buffer)"""
+        now = datetime.utcnow()
+        if self.writer is not None:
+            self.writer.increment('api_keys', {'api_key': api_key},
+                                  {'usage_count': 1}, {'last_used': now})
+        else:
+            self.api_keys_collection.update_one(
+                {'api_key': api_key},
+                {
+                    '$set': {'last_used': now},
+                    '$inc': {'usage_count': 1}
+                }
+            )
     
     def generate_api_key(self, user_id: str, name: str, permissions: list = None) -> Dict:
         """
@@ -97,10 +134,7 @@ class APIKeyManager:
         """
         try:
             # Find API key
-            key_data = self.api_keys_collection.find_one({
-                'api_key': api_key,
-                'is_active': True
-            })
+            key_data = self._get_active_key(api_key)
             
             if not key_data:
                 logger.warning(f"Invalid API key: {api_key[:10]}...")
@@ -109,18 +143,12 @@ class APIKeyManager:
             # Verify secret
             secret_hash = hashlib.sha256(api_secret.encode()).hexdigest()
             
-            if secret_hash != key_data['secret_hash']:
+            if not hmac.compare_digest(secret_hash, key_data['secret_hash']):
                 logger.warning(f"Invalid API secret for key: {api_key[:10]}...")
                 return None
             
             # Update last used
-            self.api_keys_collection.update_one(
-                {'api_key': api_key},
-                {
-                    '$set': {'last_used': datetime.utcnow()},
-                    '$inc': {'usage_count': 1}
-                }
-            )
+            self._record_usage(api_key)
             
             return key_data
             
@@ -139,19 +167,16 @@ class APIKeyManager:
             True if within limit, False if exceeded
         """
         try:
-            key_data = self.api_keys_collection.find_one({'api_key': api_key})
+            key_data = self._get_active_key(api_key)
             
             if not key_data:
                 return False
             
-            # Check usage in last hour
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            
-            # Count recent requests (simplified - in production use Redis)
-            recent_usage = key_data.get('usage_count', 0)
+            # Requests in the last hour, against the key's hourly limit
             rate_limit = key_data.get('rate_limit', 1000)
+            decision = self.rate_engine.hit(rate_limit_bucket("apikey", api_key), [(rate_limit, 3600)])
             
-            return recent_usage < rate_limit
+            return decision.allowed
             
         except Exception as e:
             logger.error(f"Error checking rate limit: {e}")
@@ -173,6 +198,7 @@ class APIKeyManager:
                 {'api_key': api_key, 'user_id': user_id},
                 {'$set': {'is_active': False, 'revoked_at': datetime.utcnow()}}
             )
+            self.key_cache.invalidate(api_key)
             
             if result.modified_count > 0:
                 logger.info(f"✅ API key revoked: {api_key[:10]}...")
@@ -224,7 +250,7 @@ class APIKeyManager:
             True if has permission, False otherwise
         """
         try:
-            key_data = self.api_keys_collection.find_one({'api_key': api_key})
+            key_data = self._get_active_key(api_key)
             
             if not key_data or not key_data.get('is_active'):
                 return False
@@ -256,9 +282,9 @@ class APIRateLimiter:
     Rate limiting for API requests
     """
     
-    def __init__(self):
-        """Initialize rate limiter"""
-        self.request_counts = {}  # In production, use Redis
+    def __init__(self, engine: RateLimitEngine = None):
+        """Initialize rate limiter (shared across workers when Redis is configured)"""
+        self.engine = engine or get_engine()
     
     def check_rate_limit(self, api_key: str, limit: int = 1000, window: int = 3600) -> Dict:
         """
@@ -273,36 +299,14 @@ class APIRateLimiter:
             Rate limit status
         """
         current_time = datetime.utcnow()
-        
-        if api_key not in self.request_counts:
-            self.request_counts[api_key] = []
-        
-        # Remove old requests outside window
-        cutoff_time = current_time - timedelta(seconds=window)
-        self.request_counts[api_key] = [
-            req_time for req_time in self.request_counts[api_key]
-            if req_time > cutoff_time
-        ]
-        
-        # Check if limit exceeded
-        current_count = len(self.request_counts[api_key])
-        
-        if current_count >= limit:
-            return {
-                'allowed': False,
-                'limit': limit,
-                'remaining': 0,
-                'reset_at': (current_time + timedelta(seconds=window)).isoformat()
-            }
-        
-        # Add current request
-        self.request_counts[api_key].append(current_time)
+        decision = self.engine.hit(rate_limit_bucket("api", api_key), [(limit, window)])
         
         return {
-            'allowed': True,
+            'allowed': decision.allowed,
             'limit': limit,
-            'remaining': limit - current_count - 1,
-            'reset_at': (current_time + timedelta(seconds=window)).isoformat()
+            'remaining': decision.remaining,
+            'retry_after': retry_after_seconds(decision),
+            'reset_at': (current_time + timedelta(seconds=decision.reset_after)).isoformat()
         }
 
 
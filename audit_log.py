@@ -0,0 +1,200 @@
+"""
+Audit Log Pipeline
+Security events are queued in memory and written to a TTL-indexed Mongo
+collection in batches by a background thread, so logging an event on the
+request path is an append instead of a database round trip.
+
+When Mongo errors or is slower than `slow_ms`, batches are appended as
+JSON lines to a local fallback file for `backoff` seconds instead of
+piling up in memory. The file can be loaded back with mongoimport.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class AuditPipeline:
+    """
+    Batched, non-blocking writer for audit events
+
+    Events keep their order within the collection and the fallback file.
+    If more than `max_pending` events are waiting, the backlog goes to the
+    file rather than to Mongo; past twice that the oldest are dropped and
+    counted, so memory stays bounded whatever the database does.
+    """
+
+    def __init__(self, collection, fallback_path: str, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_pending: int = 10000,
+                 retention_days: Optional[float] = 90, slow_ms: float = 500.0,
+                 backoff: float = 30.0, start: bool = True):
+        self.collection = collection
+        self.fallback_path = fallback_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention_days = retention_days
+        self.slow_ms = slow_ms
+        self.backoff = backoff
+
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._mongo_paused_until = 0.0
+        self._closed = False
+        self._thread = None
+
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'spilled': 0,
+            'dropped': 0,
+            'errors': 0,
+            'slow_flushes': 0,
+            'last_flush_ms': 0.0,
+        }
+
+        self._ensure_indexes()
+        if start:
+            self.start()
+
+    def _ensure_indexes(self):
+        """Expire events after the retention period (TTL on the datetime timestamp)"""
+        try:
+            if self.retention_days:
+                self.collection.create_index(
+                    'timestamp', expireAfterSeconds=int(self.retention_days * 86400)
+                )
+            self.collection.create_index([('user_id', 1), ('timestamp', -1)])
+            self.collection.create_index([('event_type', 1), ('timestamp', -1)])
+        except Exception as e:
+            logger.warning(f"Could not create audit log indexes: {e}")
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+
+    def submit(self, event: Dict):
+        """Queue one event; never touches the database or the disk"""
+        with self._lock:
+            if len(self._pending) >= 2 * self.max_pending:
+                self._pending.popleft()
+                self.stats['dropped'] += 1
+            self._pending.append(event)
+            self.stats['submitted'] += 1
+            wake = len(self._pending) >= self.batch_size
+
+        if wake:
+            self._wakeup.set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.queue_depth
+        stats['mongo_paused'] = time.monotonic() < self._mongo_paused_until
+        return stats
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Audit log flush failed: {e}")
+
+    def flush(self) -> int:
+        """Write everything queued so far; returns events stored (Mongo or file)"""
+        stored = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    backlog = len(self._pending)
+                    batch = [self._pending.popleft()
+                             for _ in range(min(self.batch_size, backlog))]
+
+                if backlog > self.max_pending or time.monotonic() < self._mongo_paused_until:
+                    stored += self._spill(batch)
+                else:
+                    stored += self._insert(batch)
+        return stored
+
+    def _insert(self, batch: List[Dict]) -> int:
+        started = time.perf_counter()
+        try:
+            # Copies, so the caller's events don't grow an _id
+            self.collection.insert_many([dict(event) for event in batch], ordered=False)
+            written = len(batch)
+        except BulkWriteError as e:
+            # Rejected documents won't succeed on retry; the rest were stored
+            written = e.details.get('nInserted', 0)
+            self.stats['dropped'] += len(batch) - written
+            logger.error(f"Audit log dropped {len(batch) - written} rejected events")
+        except Exception as e:
+            self.stats['errors'] += 1
+            self._mongo_paused_until = time.monotonic() + self.backoff
+            logger.warning(f"Audit log insert failed, using {self.fallback_path} for {self.backoff:.0f}s: {e}")
+            return self._spill(batch)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stats['last_flush_ms'] = elapsed_ms
+
+        self.stats['written'] += written
+        if elapsed_ms > self.slow_ms:
+            self.stats['slow_flushes'] += 1
+            self._mongo_paused_until = time.monotonic() + self.backoff
+            logger.warning(f"Audit log insert took {elapsed_ms:.0f}ms, using {self.fallback_path} for {self.backoff:.0f}s")
+        return written
+
+    def _spill(self, batch: List[Dict]) -> int:
+        """Append events to the fallback file as JSON lines"""
+        try:
+            directory = os.path.dirname(self.fallback_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.fallback_path, 'a') as f:
+                f.writelines(json.dumps(event, default=str) + '\n' for event in batch)
+        except Exception as e:
+            self.stats['dropped'] += len(batch)
+            logger.error(f"Audit log fallback write failed, {len(batch)} events lost: {e}")
+            return 0
+        self.stats['spilled'] += len(batch)
+        return len(batch)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Stop the flusher and store whatever is left"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Audit log final flush failed: {e}")
@@ -10,6 +10,8 @@ from typing import Dict, Optional, List
 from decimal import Decimal
 import config
 from mongodb_database import MongoTradingDatabase
+from broadcaster import broadcaster, PUBLIC_TOPIC, user_topic, bot_topic
+from position_stream import position_stream
 from bson import ObjectId
 from cryptography.fernet import Fernet
 import logging
@@ -490,6 +492,16 @@ class BotInstance:
             except Exception as e:
                 logger.warning(f"⚠️ Failed to send bot started notification: {e}")
     
+    def _publish(self, event_type: str, data: Dict):
+        """Stream an event to the public feed, the bot's owner and the bot's subscribers"""
+        try:
+            broadcaster.publish(
+                [PUBLIC_TOPIC, user_topic(self.user_id), bot_topic(self.bot_id)],
+                {'type': event_type, 'data': {'bot_id': self.bot_id, **data}}
+            )
+        except Exception as e:
+            logger.debug(f"WebSocket publish failed: {e}")
+    
     def _save_bot_state(self):
         """Persist bot state to database (survives restarts)"""
         try:
@@ -511,6 +523,7 @@ class BotInstance:
         self.running = False
         if self.task:
             self.task.cancel()
+        position_stream.close(self.bot_id, reason='bot_stopped')
         
         # Save final state
         self._save_bot_state()
@@ -555,6 +568,10 @@ class BotInstance:
                     if len(self.price_history) > self.max_history_length:
                         self.price_history.pop(0)  # Keep only last 10 prices
                     
+                    # Free mark for the position stream
+                    position_stream.mark(self.symbol, price)
+                    self.db.record_price(self.symbol, price)
+                    
                 except Exception as e:
                     logger.error(f"Failed to fetch ticker for {self.symbol}: {e}")
                     await asyncio.sleep(10)
@@ -741,11 +758,13 @@ class BotInstance:
                         'price': price,
                         'entry_price': price,
                         'status': 'open',  # Track that this position is open
+                        'strategy': self.strategy_type,
                         'is_paper': self.paper_trading,
                         'timestamp': datetime.utcnow()
                     }
                     result = self.db.db['trades'].insert_one(trade_doc)
                     position['trade_id'] = str(result.inserted_id)  # Store trade ID for later update
+                    self.db.rollups.record_open(self.user_id, self.bot_id, opened_at=trade_doc['timestamp'])
                     logger.info(f"💾 Trade saved to database with ID: {result.inserted_id}")
                     
                     # Send Telegram notification for BUY using standard format
@@ -757,22 +776,28 @@ class BotInstance:
                         except Exception as e:
                             logger.warning(f"⚠️ Failed to send BUY notification: {e}")
                     
+                    # Stream the position; PnL updates follow from the shared price feed
+                    position_stream.open(
+                        self.bot_id,
+                        self.user_id,
+                        self.symbol,
+                        entry=price,
+                        amount=amount,
+                        trade_id=position['trade_id'],
+                        stop_loss=stop_loss_price,
+                        take_profit=take_profit_price,
+                        is_paper=self.paper_trading,
+                        opened_at=position['time']
+                    )
+                    
                     # Broadcast via WebSocket
-                    try:
-                        from web_dashboard import manager
-                        await manager.broadcast({
-                            'type': 'trade',
-                            'data': {
-                                'bot_id': self.bot_id,
-                                'symbol': self.symbol,
-                                'side': 'buy',
-                                'price': price,
-                                'amount': amount,
-                                'mode': 'paper' if self.paper_trading else 'real'
-                            }
-                        })
-                    except:
-                        pass
+                    self._publish('trade', {
+                        'symbol': self.symbol,
+                        'side': 'buy',
+                        'price': price,
+                        'amount': amount,
+                        'mode': 'paper' if self.paper_trading else 'real'
+                    })
                 
                 # AI SUGGESTIONS: Monitor position and suggest exits
                 if position and not signal:
@@ -924,6 +949,9 @@ class BotInstance:
                                         pass
                                 continue
                         
+                        # One close time for the BUY leg, the SELL record and the rollups
+                        closed_at = datetime.utcnow()
+                        
                         # Update the original BUY trade to mark it as closed
                         if position.get('trade_id'):
                             from bson import ObjectId
@@ -934,7 +962,7 @@ class BotInstance:
                                     'exit_price': price,
                                     'pnl_percent': final_pnl_pct,
                                     'exit_reason': exit_reason,
-                                    'exit_timestamp': datetime.utcnow()
+                                    'exit_timestamp': closed_at
                                 }}
                             )
                             logger.info(f"💾 Updated BUY trade {position['trade_id']} to closed status")
@@ -951,9 +979,26 @@ class BotInstance:
                             'pnl_percent': final_pnl_pct,
                             'exit_reason': exit_reason,
                             'status': 'closed',
+                            'strategy': self.strategy_type,
                             'is_paper': self.paper_trading,
-                            'timestamp': datetime.utcnow()
+                            'entry_time': position.get('time'),
+                            'timestamp': closed_at
                         })
+                        self.db.rollups.record_close(
+                            self.user_id,
+                            self.bot_id,
+                            pnl=(price - position['entry']) * position['amount'],
+                            closed_at=closed_at
+                        )
+                        self.db.analytics.record_close(
+                            self.user_id,
+                            self.symbol,
+                            pnl=(price - position['entry']) * position['amount'],
+                            opened_at=position.get('time'),
+                            entry_value=position['entry'] * position['amount'],
+                            strategy=self.strategy_type,
+                            closed_at=closed_at
+                        )
                         
                         # Send Telegram notification for SELL
                         if self.telegram and self.telegram.enabled:
@@ -983,22 +1028,20 @@ class BotInstance:
                                 logger.warning(f"⚠️ Failed to send SELL notification: {e}")
                         
                         # Broadcast via WebSocket
-                        try:
-                            from web_dashboard import manager
-                            await manager.broadcast({
-                                'type': 'trade',
-                                'data': {
-                                    'bot_id': self.bot_id,
-                                    'symbol': self.symbol,
-                                    'side': 'sell',
-                                    'price': price,
-                                    'amount': position['amount'],
-                                    'pnl': final_pnl_pct,
-                                    'mode': 'paper' if self.paper_trading else 'real'
-                                }
-                            })
-                        except:
-                            pass
+                        self._publish('trade', {
+                            'symbol': self.symbol,
+                            'side': 'sell',
+                            'price': price,
+                            'amount': position['amount'],
+                            'pnl': final_pnl_pct,
+                            'mode': 'paper' if self.paper_trading else 'real'
+                        })
+                        position_stream.close(
+                            self.bot_id,
+                            reason=exit_reason,
+                            exit_price=price,
+                            pnl_percent=final_pnl_pct
+                        )
                         
                         position = None
                 
@@ -0,0 +1,286 @@
+"""
+WebSocket Fan-out Broadcaster
+Each event is serialized once and handed to every subscribed connection's
+own bounded send queue; a per-connection sender task drains it, so one
+slow client only ever delays itself.
+
+Connections subscribe to topics: the public trade feed, their user, or
+individual bots. With Redis configured, events published in any API
+worker reach the subscribers connected to every other worker.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_TOPIC = 'trades'
+ADMIN_TOPIC = 'admin'    # every user's private events, for admin dashboards
+DEFAULT_QUEUE_SIZE = 100
+REDIS_CHANNEL = 'ws:events'
+
+# What to do when a connection's queue is full
+DROP_OLDEST = 'drop_oldest'
+CLOSE = 'close'
+
+# Close code for clients that can't keep up (1013: try again later)
+SLOW_CONSUMER_CODE = 1013
+
+
+def user_topic(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def bot_topic(bot_id) -> str:
+    return f"bot:{bot_id}"
+
+
+class Connection:
+    """One websocket, its subscriptions and its private send queue"""
+
+    def __init__(self, websocket, topics: Iterable[str], queue_size: int, user_id=None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.topics: Set[str] = set(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class LocalPubSub:
+    """In-process delivery; events reach this worker's connections only"""
+
+    def __init__(self):
+        self.handler = None
+
+    def publish(self, topics, payload: str):
+        self.handler(topics, payload)
+
+    def close(self):
+        pass
+
+
+class RedisPubSub:
+    """
+    Redis channel shared by all API workers
+
+    Every worker, including the publisher, receives each event from the
+    channel and delivers it to its own connections.
+    """
+
+    def __init__(self, url: str, channel: str = REDIS_CHANNEL):
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self.handler = None
+        self._pubsub = None
+        self._thread = None
+
+    def start(self):
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message):
+        try:
+            event = json.loads(message['data'])
+            self.handler(event['topics'], event['payload'])
+        except Exception as e:
+            logger.error(f"Bad broadcast event from Redis: {e}")
+
+    def publish(self, topics, payload: str):
+        try:
+            self.client.publish(self.channel, json.dumps({'topics': list(topics), 'payload': payload}))
+        except Exception as e:
+            # Better to reach this worker's clients than nobody
+            logger.warning(f"Redis publish failed, delivering locally: {e}")
+            self.handler(topics, payload)
+
+    def close(self):
+        if self._thread:
+            self._thread.stop()
+
+
+class Broadcaster:
+    """
+    Topic-based websocket fan-out with per-connection backpressure
+
+    publish() never awaits a socket and may be called from any thread;
+    overflow is handled per connection by dropping its oldest queued
+    event (default) or closing it as a slow consumer.
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, overflow: str = DROP_OLDEST,
+                 backend=None):
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self._subscribers: Dict[str, Set[Connection]] = defaultdict(set)
+        self._connections: Set[Connection] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.backend = None
+        self.stats = {'published': 0, 'delivered': 0, 'dropped': 0, 'slow_closed': 0}
+        self.use_backend(backend or LocalPubSub())
+
+    def use_backend(self, backend):
+        if self.backend is not None:
+            self.backend.close()
+        backend.handler = self._deliver
+        self.backend = backend
+        if hasattr(backend, 'start'):
+            backend.start()
+
+    def use_redis(self, url: str) -> bool:
+        """Switch to cross-worker delivery; stays local if Redis can't be reached"""
+        if not (url and REDIS_AVAILABLE):
+            return False
+        try:
+            backend = RedisPubSub(url)
+            backend.client.ping()
+            self.use_backend(backend)
+            return True
+        except Exception as e:
+            logger.warning(f"Redis unavailable for broadcasts, using local delivery: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    async def connect(self, websocket, topics: Iterable[str] = (PUBLIC_TOPIC,), user_id=None) -> Connection:
+        await websocket.accept()
+        self._loop = asyncio.get_running_loop()
+        conn = Connection(websocket, topics, self.queue_size, user_id)
+        with self._lock:
+            self._connections.add(conn)
+            for topic in conn.topics:
+                self._subscribers[topic].add(conn)
+        conn.task = asyncio.create_task(self._sender(conn))
+        return conn
+
+    async def disconnect(self, conn: Connection):
+        self._remove(conn)
+        if conn.task and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+
+    def subscribe(self, conn: Connection, topic: str):
+        with self._lock:
+            conn.topics.add(topic)
+            self._subscribers[topic].add(conn)
+
+    def unsubscribe(self, conn: Connection, topic: str):
+        with self._lock:
+            conn.topics.discard(topic)
+            self._discard(topic, conn)
+
+    def _discard(self, topic, conn):
+        subscribers = self._subscribers.get(topic)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self._subscribers[topic]
+
+    def _remove(self, conn: Connection):
+        conn.closed = True
+        with self._lock:
+            self._connections.discard(conn)
+            for topic in conn.topics:
+                self._discard(topic, conn)
+
+    async def _sender(self, conn: Connection):
+        try:
+            while not conn.closed:
+                payload = await conn.queue.get()
+                await conn.websocket.send_text(payload)
+                self.stats['delivered'] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"WebSocket send failed, dropping connection: {e}")
+        finally:
+            self._remove(conn)
+
+    async def _close_slow(self, conn: Connection):
+        self._remove(conn)
+        if conn.task:
+            conn.task.cancel()
+        try:
+            await conn.websocket.close(code=SLOW_CONSUMER_CODE)
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish(self, topics: Iterable[str], message: Dict):
+        """Send message to every connection subscribed to any of topics"""
+        payload = json.dumps(message, default=str)
+        self.stats['published'] += 1
+        self.backend.publish(list(topics), payload)
+
+    def send(self, conn: Connection, message: Dict):
+        """Queue message for one connection only (e.g. its initial snapshot)"""
+        if not conn.closed:
+            self._fan_out_to([conn], json.dumps(message, default=str))
+
+    async def broadcast(self, message: Dict):
+        """Public feed (the old ConnectionManager.broadcast)"""
+        self.publish([PUBLIC_TOPIC], message)
+
+    def _deliver(self, topics, payload: str):
+        loop = self._loop
+        if loop is None:
+            return  # nobody has connected to this worker
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(topics, payload)
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(self._fan_out, topics, payload)
+
+    def _fan_out(self, topics, payload: str):
+        with self._lock:
+            targets = set()
+            for topic in topics:
+                targets |= self._subscribers.get(topic, set())
+        self._fan_out_to(targets, payload)
+
+    def _fan_out_to(self, targets, payload: str):
+        for conn in targets:
+            if conn.closed:
+                continue
+            try:
+                conn.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                if self.overflow == CLOSE:
+                    self.stats['slow_closed'] += 1
+                    asyncio.ensure_future(self._close_slow(conn))
+                    continue
+                conn.queue.get_nowait()
+                conn.queue.put_nowait(payload)
+                conn.dropped += 1
+                self.stats['dropped'] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['connections'] = len(self._connections)
+            stats['topics'] = len(self._subscribers)
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+# Shared by the API and the bot engine running inside it
+broadcaster = Broadcaster()
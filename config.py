@@ -22,6 +22,15 @@ MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 
 # JWT Configuration (for user authentication)
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'change-this-secret-key')
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '30'))  # Seconds an authenticated user stays cached
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '10000'))
+API_KEY_CACHE_TTL = float(os.getenv('API_KEY_CACHE_TTL', '60'))  # Seconds a validated API key stays cached
+
+# Shared state across API workers (rate limits); in-process if unset
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+# Seconds between mark-to-market passes over open positions pushed to websockets
+POSITION_STREAM_INTERVAL = float(os.getenv('POSITION_STREAM_INTERVAL', '1.0'))
 
 # Encryption Key (for API keys)
 ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', 'generate-a-fernet-key-here')
@@ -158,10 +167,44 @@ MACD_SIGNAL = 9
 BACKTEST_DAYS = 90  # Number of days to backtest
 INITIAL_CAPITAL = float(os.getenv('INITIAL_CAPITAL', '10000'))  # Starting capital (configurable)
 
+# ML model artifacts (versioned per symbol, see model_registry.py)
+MODEL_DIR = os.getenv('MODEL_DIR', 'models')
+MODEL_CACHE_SIZE = int(os.getenv('MODEL_CACHE_SIZE', '16'))  # Max model bundles held in memory
+ML_TRAIN_N_JOBS = int(os.getenv('ML_TRAIN_N_JOBS', '-1'))  # Cores for model training (-1 = all)
+ML_CV_SPLITS = int(os.getenv('ML_CV_SPLITS', '3'))  # Time-series CV folds
+
+# Cold-start import budgets in ms (checked by: python lazy_imports.py)
+COLD_START_BUDGETS_MS = {
+    'web_dashboard': float(os.getenv('COLD_START_BUDGET_API_MS', '2500')),
+    'bot_worker': float(os.getenv('COLD_START_BUDGET_WORKER_MS', '1500')),
+}
+
 # Logging
 LOG_LEVEL = 'INFO'
 LOG_FILE = 'trading_bot.log'
 
+# Security audit log: kept in Mongo for this many days (TTL index); batches
+# go to the fallback file while Mongo is failing or slow
+AUDIT_LOG_RETENTION_DAYS = float(os.getenv('AUDIT_LOG_RETENTION_DAYS', '90'))
+AUDIT_LOG_FALLBACK_PATH = os.getenv('AUDIT_LOG_FALLBACK_PATH', 'logs/audit_fallback.jsonl')
+
+# Days MongoDB keeps time-series data before expiring it (TTL); charts use
+# the 1m/1h/1d price rollups, which are kept longer
+SIGNAL_RETENTION_DAYS = float(os.getenv('SIGNAL_RETENTION_DAYS', '90'))
+SNAPSHOT_RETENTION_DAYS = float(os.getenv('SNAPSHOT_RETENTION_DAYS', '90'))
+PRICE_SAMPLE_RETENTION_DAYS = float(os.getenv('PRICE_SAMPLE_RETENTION_DAYS', '7'))
+# Run the background 1m/1h/1d price rollups in this process. One process is
+# enough; set it to false on the others (e.g. extra web workers, bot workers)
+TIMESERIES_ROLLUPS_ENABLED = os.getenv('TIMESERIES_ROLLUPS_ENABLED', 'true').lower() == 'true'
+
+# Time every Mongo query by shape; queries slower than QUERY_PROFILER_SLOW_MS
+# are logged (/api/admin/query-profile). QUERY_PROFILER_EXPLAIN also re-runs
+# each shape with explain/executionStats every 5 minutes - extra load on the
+# server, so only turn it on while investigating
+QUERY_PROFILER_ENABLED = os.getenv('QUERY_PROFILER_ENABLED', 'true').lower() == 'true'
+QUERY_PROFILER_EXPLAIN = os.getenv('QUERY_PROFILER_EXPLAIN', 'false').lower() == 'true'
+QUERY_PROFILER_SLOW_MS = float(os.getenv('QUERY_PROFILER_SLOW_MS', '100'))
+
 # Markets to trade
 CRYPTO_MARKETS = True  # Trade cryptocurrencies
 FOREX_MARKETS = False  # Trade forex (requires different account type on OKX)
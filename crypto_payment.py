@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 import hashlib
 import hmac
 from colorama import Fore, Style
+from price_quotes import get_quote_service, QuoteUnavailable, STABLECOINS
 
 # CoinGate Configuration (Popular crypto payment gateway)
 COINGATE_API_KEY = os.getenv('COINGATE_API_KEY', '')
@@ -233,6 +234,15 @@ class CryptoPaymentProcessor:
         Returns:
             Exchange rate
         """
+        # USD -> crypto comes from the shared in-memory quote cache
+        if from_currency in ('USD',) + STABLECOINS and to_currency in SUPPORTED_CRYPTOS:
+            try:
+                price = get_quote_service(SUPPORTED_CRYPTOS).get_price(to_currency)
+                return 1.0 / price
+            except QuoteUnavailable as e:
+                print(f"{Fore.RED}❌ Error: {e}{Style.RESET_ALL}")
+                return None
+        
         if self.gateway == 'coingate':
             url = f'{self.base_url}/rates/merchant/{from_currency}/{to_currency}'
         else:
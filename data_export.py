@@ -0,0 +1,316 @@
+"""
+Streaming Data Export
+Writes trades / signals / snapshots to CSV or Parquet in fixed-size
+chunks read from a batched cursor, so exporting a million rows uses the
+same memory as exporting a hundred.
+
+Documents in one collection don't all have the same fields (open trades
+have no exit_price or pnl), so exports first scan the source for every
+column and the kinds of value it holds, then stream it a second time.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from bson import ObjectId
+
+# Parquet support is optional (pip install pyarrow)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'parquet')
+
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+# ============================================================================
+# BATCH SOURCES
+# ============================================================================
+
+def iter_mongo_batches(collection, query: Optional[Dict] = None,
+                       projection: Optional[Dict] = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Read a collection as lists of at most batch_size documents"""
+    cursor = collection.find(query or {}, projection).sort('_id', 1).batch_size(batch_size)
+    batch = []
+    try:
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+
+def iter_sqlite_batches(conn, table_name: str,
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Read an SQLite table as lists of at most batch_size row dicts"""
+    cursor = conn.cursor()
+    # Table names can't be bound as parameters; only allow known identifiers
+    if not table_name.isidentifier():
+        raise ValueError(f"Invalid table name: {table_name}")
+    cursor.execute(f"SELECT * FROM {table_name}")
+    columns = [col[0] for col in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+
+
+# ============================================================================
+# VALUE NORMALIZATION
+# ============================================================================
+
+def _flat_value(value):
+    """Make a document value representable in a flat CSV/Parquet cell"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def _columns_for(batch: List[Dict]) -> List[str]:
+    columns = []
+    seen = set()
+    for doc in batch:
+        for key in doc.keys():
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return columns
+
+
+def _kind(value) -> Optional[str]:
+    """Column kind of one value: 'bool', 'float', 'datetime' or 'string'"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'float'  # ints are widened so 1 and 0.5 share a column
+    if isinstance(value, datetime):
+        return 'datetime'
+    return 'string'
+
+
+class ExportSchema(NamedTuple):
+    columns: List[str]
+    kinds: Dict[str, str]
+
+
+def scan_schema(batches: Iterable[List[Dict]]) -> ExportSchema:
+    """
+    Every column in the source, in first-seen order, with one kind each
+
+    A column whose values are all of one kind keeps it; mixed or all-null
+    columns become 'string'. Memory is per column, not per row.
+    """
+    columns: List[str] = []
+    seen: Dict[str, set] = {}
+    for batch in batches:
+        for doc in batch:
+            for key, value in doc.items():
+                if key not in seen:
+                    seen[key] = set()
+                    columns.append(key)
+                kind = _kind(value)
+                if kind:
+                    seen[key].add(kind)
+    kinds = {key: next(iter(found)) if len(found) == 1 else 'string' for key, found in seen.items()}
+    return ExportSchema(columns, kinds)
+
+
+def _cell(value, kind: str):
+    """Value converted to its column's kind (None when it doesn't fit)"""
+    if value is None:
+        return None
+    if _kind(value) == kind:
+        return float(value) if kind == 'float' else value
+    if kind == 'string':
+        flat = _flat_value(value)
+        return flat if isinstance(flat, str) else str(flat)
+    return None
+
+
+# ============================================================================
+# CHUNK WRITERS
+# ============================================================================
+
+def iter_csv_chunks(batches: Iterable[List[Dict]],
+                    columns: Optional[List[str]] = None,
+                    schema: Optional[ExportSchema] = None) -> Iterator[bytes]:
+    """
+    Encode batches as CSV, one chunk per batch
+
+    The header comes from `schema` (see scan_schema), `columns` or, if
+    neither is given, from the keys seen in the first batch. In that last
+    case fields that only appear later can't be added to the header and
+    are left out with a warning.
+    """
+    buffer = io.StringIO()
+    writer = None
+    dropped = set()
+
+    for batch in batches:
+        if writer is None:
+            columns = schema.columns if schema else columns or _columns_for(batch)
+            writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            known = set(columns)
+
+        for doc in batch:
+            dropped.update(key for key in doc if key not in known)
+            writer.writerow({key: _flat_value(value) for key, value in doc.items()})
+
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if dropped:
+        logger.warning(f"CSV export left out fields missing from the header: {sorted(dropped)}")
+
+
+class _DrainableBuffer(io.RawIOBase):
+    """Write-only sink whose contents can be taken out between row groups"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(schema: ExportSchema):
+    types = {
+        'float': pa.float64(),
+        'bool': pa.bool_(),
+        'datetime': pa.timestamp('us'),
+        'string': pa.string(),
+    }
+    return pa.schema([pa.field(key, types[schema.kinds.get(key, 'string')]) for key in schema.columns])
+
+
+def iter_parquet_chunks(batches: Iterable[List[Dict]],
+                        columns: Optional[List[str]] = None,
+                        schema: Optional[ExportSchema] = None) -> Iterator[bytes]:
+    """
+    Encode batches as a Parquet file, one row group per batch
+
+    Column types come from `schema` (see scan_schema). Without one they
+    are inferred from the first batch, and later values that don't fit
+    their column are written as null with a warning.
+    """
+    if not PARQUET_AVAILABLE:
+        raise ImportError("Parquet export needs pyarrow. Install: pip install pyarrow")
+
+    sink = _DrainableBuffer()
+    writer = None
+    mismatched = 0
+
+    try:
+        for batch in batches:
+            if writer is None:
+                if schema is None:
+                    inferred = scan_schema([batch])
+                    schema = ExportSchema(columns or inferred.columns, inferred.kinds)
+                arrow_schema = _arrow_schema(schema)
+                writer = pq.ParquetWriter(sink, arrow_schema)
+
+            data = {}
+            for key in schema.columns:
+                kind = schema.kinds.get(key, 'string')
+                values = [_cell(doc.get(key), kind) for doc in batch]
+                mismatched += sum(1 for doc, value in zip(batch, values)
+                                  if value is None and doc.get(key) is not None)
+                data[key] = values
+
+            writer.write_table(pa.Table.from_pydict(data, schema=arrow_schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if mismatched:
+        logger.warning(f"Parquet export wrote {mismatched} values that didn't fit their column as null")
+
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def iter_export_chunks(batches: Iterable[List[Dict]], fmt: str = 'csv',
+                       columns: Optional[List[str]] = None,
+                       schema: Optional[ExportSchema] = None) -> Iterator[bytes]:
+    """Pick the chunk writer for an export format"""
+    if fmt == 'csv':
+        return iter_csv_chunks(batches, columns, schema)
+    if fmt == 'parquet':
+        return iter_parquet_chunks(batches, columns, schema)
+    raise ValueError(f"Unsupported export format: {fmt} (use one of {EXPORT_FORMATS})")
+
+
+def iter_scanned_export(source: Callable[[], Iterable[List[Dict]]],
+                        fmt: str = 'csv') -> Iterator[bytes]:
+    """
+    Scan source() for its schema, then stream a second source() with it
+
+    Both passes happen as the chunks are consumed, so a web response can
+    start straight away and the scan never runs on the request thread.
+    """
+    schema = scan_schema(source())
+    yield from iter_export_chunks(source(), fmt, schema=schema)
+
+
+def write_export(batches: Iterable[List[Dict]], filename: str, fmt: str = 'csv',
+                 columns: Optional[List[str]] = None,
+                 schema: Optional[ExportSchema] = None) -> int:
+    """Stream an export to disk; returns the number of bytes written"""
+    written = 0
+    with open(filename, 'wb') as f:
+        for chunk in iter_export_chunks(batches, fmt, columns, schema):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def export_filename(name: str, fmt: str = 'csv') -> str:
+    """Default timestamped file name for an export"""
+    return f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
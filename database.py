@@ -1,22 +1,81 @@
 """
 Database Integration
 Persistent storage for trades, performance, and analytics
+
+SQLite runs in WAL mode: one writer connection (serialized by a lock)
+and one reader connection per thread, so reads never wait on writes.
+Signals are buffered and inserted with executemany by a background
+flusher; trades are committed immediately.
 """
 import sqlite3
+import threading
 import pandas as pd
 from datetime import datetime
 import json
 from colorama import Fore, Style
+from data_export import DEFAULT_BATCH_SIZE, iter_sqlite_batches, scan_schema, write_export, export_filename
+
+SIGNAL_COLUMNS = ('symbol', 'signal', 'confidence', 'price', 'indicators', 'market_condition', 'executed')
+TRADE_COLUMNS = ('symbol', 'side', 'entry_price', 'amount', 'entry_time',
+                 'stop_loss', 'take_profit', 'confidence', 'status')
 
 
 class TradingDatabase:
-    def __init__(self, db_path='trading_bot.db'):
+    def __init__(self, db_path='trading_bot.db', batch_size=500, flush_interval=1.0):
         """Initialize database connection"""
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        # Writer connection (also used by exports); every write holds the lock
+        self.conn = self._connect()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        
+        # Buffered signal rows, written in one executemany per flush
+        self._pending_signals = []
+        self._wakeup = threading.Event()
+        self._closed = False
+        
         self.create_tables()
+        
+        self._flusher = threading.Thread(target=self._run_flusher, name='sqlite-writer', daemon=True)
+        self._flusher.start()
         print(f"{Fore.GREEN}✅ Database initialized: {db_path}{Style.RESET_ALL}")
     
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        # WAL lets readers run alongside the writer; NORMAL syncs at
+        # checkpoints instead of on every commit (safe in WAL mode)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+    
+    @property
+    def _in_memory(self):
+        return self.db_path == ':memory:' or self.db_path.startswith('file::memory:')
+    
+    def _reader(self):
+        """This thread's read connection"""
+        if self._in_memory:
+            return self.conn  # a second connection would be a different database
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute('PRAGMA query_only=ON')
+            self._local.conn = conn
+            with self._write_lock:
+                self._readers.append(conn)
+        return conn
+    
+    def _read_sql(self, query, params=()):
+        if self._in_memory:
+            with self._write_lock:
+                return pd.read_sql_query(query, self.conn, params=params)
+        return pd.read_sql_query(query, self._reader(), params=params)
+    
     def create_tables(self):
         """Create database tables"""
         cursor = self.conn.cursor()
@@ -88,18 +147,33 @@ class TradingDatabase:
             )
         ''')
         
+        # Open-trade lookups, closes by symbol and history pages
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_trades_symbol_status_entry
+            ON trades (symbol, status, entry_time)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_trades_status_entry
+            ON trades (status, entry_time)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_signals_symbol_timestamp
+            ON signals (symbol, timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_signals_timestamp
+            ON signals (timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_strategy_performance_name_symbol
+            ON strategy_performance (strategy_name, symbol)
+        ''')
+        
         self.conn.commit()
     
-    def save_trade(self, trade_data):
-        """Save a new trade"""
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO trades (
-                symbol, side, entry_price, amount, entry_time,
-                stop_loss, take_profit, confidence, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+    @staticmethod
+    def _trade_row(trade_data):
+        return (
             trade_data['symbol'],
             trade_data['side'],
             trade_data['entry_price'],
@@ -109,34 +183,51 @@ class TradingDatabase:
             trade_data.get('take_profit'),
             trade_data.get('confidence', 0),
             'open'
-        ))
-        
-        self.conn.commit()
-        return cursor.lastrowid
+        )
+    
+    def save_trade(self, trade_data):
+        """Save a new trade"""
+        with self._write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+                INSERT INTO trades ({', '.join(TRADE_COLUMNS)})
+                VALUES ({', '.join('?' * len(TRADE_COLUMNS))})
+            ''', self._trade_row(trade_data))
+            self.conn.commit()
+            return cursor.lastrowid
+    
+    def save_trades(self, trades):
+        """Save many new trades in one transaction"""
+        rows = [self._trade_row(trade) for trade in trades]
+        with self._write_lock:
+            self.conn.executemany(f'''
+                INSERT INTO trades ({', '.join(TRADE_COLUMNS)})
+                VALUES ({', '.join('?' * len(TRADE_COLUMNS))})
+            ''', rows)
+            self.conn.commit()
+        return len(rows)
     
     def update_trade(self, symbol, exit_data):
         """Update trade when closed"""
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
-            UPDATE trades
-            SET exit_price = ?,
-                exit_time = ?,
-                pnl = ?,
-                pnl_percent = ?,
-                exit_reason = ?,
-                status = 'closed'
-            WHERE symbol = ? AND status = 'open'
-        ''', (
-            exit_data['exit_price'],
-            exit_data['exit_time'],
-            exit_data['pnl'],
-            exit_data['pnl_percent'],
-            exit_data.get('exit_reason', 'manual'),
-            symbol
-        ))
-        
-        self.conn.commit()
+        with self._write_lock:
+            self.conn.execute('''
+                UPDATE trades
+                SET exit_price = ?,
+                    exit_time = ?,
+                    pnl = ?,
+                    pnl_percent = ?,
+                    exit_reason = ?,
+                    status = 'closed'
+                WHERE symbol = ? AND status = 'open'
+            ''', (
+                exit_data['exit_price'],
+                exit_data['exit_time'],
+                exit_data['pnl'],
+                exit_data['pnl_percent'],
+                exit_data.get('exit_reason', 'manual'),
+                symbol
+            ))
+            self.conn.commit()
     
     def get_trades(self, limit=100, status=None):
         """Get trades from database"""
@@ -150,8 +241,7 @@ class TradingDatabase:
         query += " ORDER BY entry_time DESC LIMIT ?"
         params.append(limit)
         
-        df = pd.read_sql_query(query, self.conn, params=params)
-        return df
+        return self._read_sql(query, params)
     
     def get_open_trades(self):
         """Get all open trades"""
@@ -159,27 +249,25 @@ class TradingDatabase:
     
     def save_performance_snapshot(self, stats):
         """Save daily performance snapshot"""
-        cursor = self.conn.cursor()
-        
         today = datetime.now().date()
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO performance (
-                date, capital, daily_pnl, total_trades,
-                winning_trades, losing_trades, win_rate, profit_factor
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            today,
-            stats['current_capital'],
-            stats['daily_pnl'],
-            stats['total_trades'],
-            stats['winning_trades'],
-            stats['losing_trades'],
-            stats['win_rate'],
-            stats['profit_factor']
-        ))
-        
-        self.conn.commit()
+        with self._write_lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO performance (
+                    date, capital, daily_pnl, total_trades,
+                    winning_trades, losing_trades, win_rate, profit_factor
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                today,
+                stats['current_capital'],
+                stats['daily_pnl'],
+                stats['total_trades'],
+                stats['winning_trades'],
+                stats['losing_trades'],
+                stats['win_rate'],
+                stats['profit_factor']
+            ))
+            self.conn.commit()
     
     def get_performance_history(self, days=30):
         """Get performance history"""
@@ -188,19 +276,15 @@ class TradingDatabase:
             ORDER BY date DESC
             LIMIT ?
         '''
-        df = pd.read_sql_query(query, self.conn, params=(days,))
-        return df
+        return self._read_sql(query, (days,))
     
     def save_signal(self, signal_data):
-        """Save trading signal"""
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO signals (
-                symbol, signal, confidence, price,
-                indicators, market_condition, executed
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        """Queue a trading signal (written by the background flusher)"""
+        self.save_signals([signal_data])
+    
+    def save_signals(self, signals):
+        """Queue several trading signals"""
+        rows = [(
             signal_data['symbol'],
             signal_data['signal'],
             signal_data['confidence'],
@@ -208,12 +292,51 @@ class TradingDatabase:
             json.dumps(signal_data.get('indicators', {})),
             signal_data.get('market_condition'),
             signal_data.get('executed', False)
-        ))
-        
+        ) for signal_data in signals]
+        
+        if self._closed:
+            with self._write_lock:
+                self._insert_signals(rows)
+            return
+        
+        with self._write_lock:
+            self._pending_signals.extend(rows)
+            full = len(self._pending_signals) >= self.batch_size
+        if full:
+            self._wakeup.set()
+    
+    def _insert_signals(self, rows):
+        self.conn.executemany(f'''
+            INSERT INTO signals ({', '.join(SIGNAL_COLUMNS)})
+            VALUES ({', '.join('?' * len(SIGNAL_COLUMNS))})
+        ''', rows)
         self.conn.commit()
     
+    def flush(self):
+        """Write queued signals now; returns rows written"""
+        with self._write_lock:
+            rows, self._pending_signals = self._pending_signals, []
+            if rows:
+                try:
+                    self._insert_signals(rows)
+                except sqlite3.Error:
+                    self.conn.rollback()
+                    self._pending_signals[:0] = rows
+                    raise
+        return len(rows)
+    
+    def _run_flusher(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"{Fore.RED}❌ Failed to write signals: {e}{Style.RESET_ALL}")
+    
     def get_signals(self, symbol=None, limit=100):
         """Get trading signals"""
+        self.flush()  # read your own writes
         query = "SELECT * FROM signals"
         params = []
         
@@ -224,84 +347,80 @@ class TradingDatabase:
         query += " ORDER BY timestamp DESC LIMIT ?"
         params.append(limit)
         
-        df = pd.read_sql_query(query, self.conn, params=params)
-        return df
+        return self._read_sql(query, params)
     
     def update_strategy_performance(self, strategy_name, symbol, success):
         """Update strategy performance metrics"""
-        cursor = self.conn.cursor()
-        
-        # Get current stats
-        cursor.execute('''
-            SELECT total_signals, successful_signals
-            FROM strategy_performance
-            WHERE strategy_name = ? AND symbol = ?
-        ''', (strategy_name, symbol))
-        
-        result = cursor.fetchone()
+        with self._write_lock:
+            cursor = self.conn.cursor()
         
-        if result:
-            total = result[0] + 1
-            successful = result[1] + (1 if success else 0)
-            win_rate = (successful / total) * 100
-            
+            # Get current stats
             cursor.execute('''
-                UPDATE strategy_performance
-                SET total_signals = ?,
-                    successful_signals = ?,
-                    win_rate = ?,
-                    last_updated = CURRENT_TIMESTAMP
+                SELECT total_signals, successful_signals
+                FROM strategy_performance
                 WHERE strategy_name = ? AND symbol = ?
-            ''', (total, successful, win_rate, strategy_name, symbol))
-        else:
-            cursor.execute('''
-                INSERT INTO strategy_performance (
-                    strategy_name, symbol, total_signals,
-                    successful_signals, win_rate
-                ) VALUES (?, ?, 1, ?, ?)
-            ''', (strategy_name, symbol, 1 if success else 0, 100 if success else 0))
+            ''', (strategy_name, symbol))
         
-        self.conn.commit()
+            result = cursor.fetchone()
+        
+            if result:
+                total = result[0] + 1
+                successful = result[1] + (1 if success else 0)
+                win_rate = (successful / total) * 100
+            
+                cursor.execute('''
+                    UPDATE strategy_performance
+                    SET total_signals = ?,
+                        successful_signals = ?,
+                        win_rate = ?,
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE strategy_name = ? AND symbol = ?
+                ''', (total, successful, win_rate, strategy_name, symbol))
+            else:
+                cursor.execute('''
+                    INSERT INTO strategy_performance (
+                        strategy_name, symbol, total_signals,
+                        successful_signals, win_rate
+                    ) VALUES (?, ?, 1, ?, ?)
+                ''', (strategy_name, symbol, 1 if success else 0, 100 if success else 0))
+        
+            self.conn.commit()
     
     def get_strategy_performance(self):
         """Get strategy performance metrics"""
         query = "SELECT * FROM strategy_performance ORDER BY win_rate DESC"
-        df = pd.read_sql_query(query, self.conn)
-        return df
+        return self._read_sql(query)
     
     def get_statistics(self):
         """Get comprehensive statistics"""
-        cursor = self.conn.cursor()
-        
-        # Total trades
-        cursor.execute("SELECT COUNT(*) FROM trades WHERE status = 'closed'")
-        total_trades = cursor.fetchone()[0]
-        
-        # Winning trades
-        cursor.execute("SELECT COUNT(*) FROM trades WHERE status = 'closed' AND pnl > 0")
-        winning_trades = cursor.fetchone()[0]
-        
-        # Total PnL
-        cursor.execute("SELECT SUM(pnl) FROM trades WHERE status = 'closed'")
-        total_pnl = cursor.fetchone()[0] or 0
-        
-        # Average win/loss
-        cursor.execute("SELECT AVG(pnl) FROM trades WHERE status = 'closed' AND pnl > 0")
-        avg_win = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT AVG(pnl) FROM trades WHERE status = 'closed' AND pnl < 0")
-        avg_loss = cursor.fetchone()[0] or 0
+        # One pass over the closed trades instead of a query per figure
+        row = self._read_sql('''
+            SELECT COUNT(*) AS total_trades,
+                   SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END) AS winning_trades,
+                   SUM(pnl) AS total_pnl,
+                   AVG(CASE WHEN pnl > 0 THEN pnl END) AS avg_win,
+                   AVG(CASE WHEN pnl < 0 THEN pnl END) AS avg_loss,
+                   SUM(CASE WHEN pnl > 0 THEN pnl END) AS total_wins,
+                   SUM(CASE WHEN pnl < 0 THEN ABS(pnl) END) AS total_losses
+            FROM trades
+            WHERE status = 'closed'
+        ''').iloc[0]
+        
+        def value(column, default=0):
+            return default if pd.isna(row[column]) else float(row[column])
+        
+        total_trades = int(row['total_trades'])
+        winning_trades = int(value('winning_trades'))
+        total_pnl = value('total_pnl')
+        avg_win = value('avg_win')
+        avg_loss = value('avg_loss')
         
         # Win rate
         win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
         
         # Profit factor
-        cursor.execute("SELECT SUM(pnl) FROM trades WHERE status = 'closed' AND pnl > 0")
-        total_wins = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT SUM(ABS(pnl)) FROM trades WHERE status = 'closed' AND pnl < 0")
-        total_losses = cursor.fetchone()[0] or 1
-        
+        total_wins = value('total_wins')
+        total_losses = value('total_losses', 1)
         profit_factor = total_wins / total_losses if total_losses > 0 else 0
         
         return {
@@ -317,33 +436,55 @@ class TradingDatabase:
     
     def export_to_csv(self, table_name, filename=None):
         """Export table to CSV"""
+        return self.export(table_name, filename=filename, fmt='csv')
+    
+    def export(self, table_name, filename=None, fmt='csv', batch_size=DEFAULT_BATCH_SIZE):
+        """Export table to CSV or Parquet, reading it in batches"""
         if filename is None:
-            filename = f"{table_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            filename = export_filename(table_name, fmt)
+        
+        self.flush()
+        
+        # SQLite columns can hold mixed types; scan them before writing
+        def export_with(conn):
+            def batches():
+                return iter_sqlite_batches(conn, table_name, batch_size=batch_size)
+            write_export(batches(), filename, fmt, schema=scan_schema(batches()))
         
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", self.conn)
-        df.to_csv(filename, index=False)
+        if self._in_memory:
+            with self._write_lock:
+                export_with(self.conn)
+        else:
+            export_with(self._reader())
         print(f"{Fore.GREEN}✅ Exported {table_name} to {filename}{Style.RESET_ALL}")
         return filename
     
     def cleanup_old_data(self, days=90):
         """Clean up old data"""
-        cursor = self.conn.cursor()
-        
         cutoff_date = datetime.now() - pd.Timedelta(days=days)
         
-        cursor.execute('''
-            DELETE FROM signals
-            WHERE timestamp < ?
-        ''', (cutoff_date,))
-        
-        deleted = cursor.rowcount
-        self.conn.commit()
+        self.flush()
+        with self._write_lock:
+            cursor = self.conn.execute('''
+                DELETE FROM signals
+                WHERE timestamp < ?
+            ''', (cutoff_date,))
+            deleted = cursor.rowcount
+            self.conn.commit()
         
         print(f"{Fore.YELLOW}🗑️  Cleaned up {deleted} old signals{Style.RESET_ALL}")
     
     def close(self):
         """Close database connection"""
-        self.conn.close()
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join(timeout=10)
+        self.flush()
+        with self._write_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+            self.conn.close()
         print(f"{Fore.YELLOW}Database connection closed{Style.RESET_ALL}")
 
 
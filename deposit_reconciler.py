@@ -0,0 +1,191 @@
+"""
+Deposit Reconciliation Engine
+Matches every pending crypto payment against ONE deposit-history fetch
+per currency per cycle, instead of downloading the deposit history once
+per pending invoice.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Deposits can show up in the history a little after their timestamp;
+# re-read this much before the watermark every cycle
+DEFAULT_OVERLAP_MS = 10 * 60 * 1000
+DEFAULT_PAGE_LIMIT = 100
+
+FINAL_DEPOSIT_STATUSES = ('ok', 'confirmed', 'failed', 'canceled', 'cancelled')
+
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+class DepositReconciler:
+    """
+    Watermarked deposit index shared by all pending payments
+
+    Each cycle, for every currency with pending payments:
+      1. fetch deposits once, from max(watermark - overlap, oldest pending
+         payment) onwards, following pagination
+      2. index them by (address, tag)
+      3. match each pending payment (oldest first) against its bucket,
+         taking the smallest deposit that covers it
+
+    The watermark is persisted per currency and never moves past a
+    deposit that is still unconfirmed, so it is re-read until it settles.
+    A deposit (txid) can confirm at most one payment.
+    """
+
+    def __init__(self, exchange, payments, state,
+                 confirm: Callable[[str, Dict], Dict],
+                 is_match: Callable[[Dict, Dict], bool],
+                 overlap_ms: int = DEFAULT_OVERLAP_MS,
+                 page_limit: int = DEFAULT_PAGE_LIMIT):
+        self.exchange = exchange
+        self.payments = payments
+        self.state = state
+        self.confirm = confirm
+        self.is_match = is_match
+        self.overlap_ms = overlap_ms
+        self.page_limit = page_limit
+
+        self.last_run = {}
+
+    # ------------------------------------------------------------------
+    # Watermarks
+    # ------------------------------------------------------------------
+
+    def get_watermark(self, currency: str) -> Optional[int]:
+        doc = self.state.find_one({'_id': currency})
+        return doc.get('watermark') if doc else None
+
+    def _set_watermark(self, currency: str, watermark: int):
+        self.state.update_one(
+            {'_id': currency},
+            {'$set': {'watermark': watermark, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    # ------------------------------------------------------------------
+    # Fetch + index
+    # ------------------------------------------------------------------
+
+    def fetch_deposits(self, currency: str, since: int) -> List[Dict]:
+        """All deposits for a currency from `since`, following pagination"""
+        deposits = []
+        seen = set()
+        cursor = since
+
+        while True:
+            page = self.exchange.fetch_deposits(code=currency, since=cursor, limit=self.page_limit)
+            new = [d for d in page if (d.get('id') or d.get('txid')) not in seen]
+            for deposit in new:
+                seen.add(deposit.get('id') or deposit.get('txid'))
+            deposits.extend(new)
+
+            if len(page) < self.page_limit or not new:
+                break
+            cursor = max(d.get('timestamp') or cursor for d in page) + 1
+
+        return deposits
+
+    @staticmethod
+    def index_deposits(deposits: List[Dict]) -> Dict[Tuple, List[Dict]]:
+        """Bucket deposits by (address, tag), oldest first"""
+        index = defaultdict(list)
+        for deposit in sorted(deposits, key=lambda d: d.get('timestamp') or 0):
+            index[(deposit.get('address'), deposit.get('tag') or None)].append(deposit)
+        return index
+
+    def _next_watermark(self, deposits: List[Dict], since: int, previous: Optional[int]) -> int:
+        unsettled = [
+            d['timestamp'] for d in deposits
+            if d.get('timestamp') and d.get('status') not in FINAL_DEPOSIT_STATUSES
+        ]
+        if unsettled:
+            # Hold back so the unconfirmed deposit is fetched again
+            return min(unsettled)
+        stamps = [d['timestamp'] for d in deposits if d.get('timestamp')]
+        # Only ever move forward otherwise (since already includes the overlap)
+        return max(stamps + [previous if previous is not None else since])
+
+    # ------------------------------------------------------------------
+    # Reconcile
+    # ------------------------------------------------------------------
+
+    def _used_txids(self, deposits: List[Dict]) -> set:
+        txids = [d.get('txid') for d in deposits if d.get('txid')]
+        if not txids:
+            return set()
+        return {
+            p['tx_hash'] for p in self.payments.find(
+                {'tx_hash': {'$in': txids}}, {'tx_hash': 1}
+            )
+        }
+
+    def reconcile(self, now: Optional[datetime] = None) -> Dict:
+        """Run one cycle; returns counts per outcome"""
+        now = now or datetime.utcnow()
+        result = {'confirmed': 0, 'expired': 0, 'pending': 0, 'fetches': 0, 'errors': 0}
+
+        expired = self.payments.update_many(
+            {'status': 'pending', 'expires_at': {'$lte': now}},
+            {'$set': {'status': 'expired'}}
+        )
+        result['expired'] = expired.modified_count
+
+        by_currency = defaultdict(list)
+        for payment in self.payments.find(
+            {'status': 'pending', 'expires_at': {'$gt': now}}
+        ).sort('created_at', 1):
+            by_currency[payment['crypto_currency']].append(payment)
+
+        for currency, pending in by_currency.items():
+            try:
+                oldest = _to_ms(pending[0]['created_at'])
+                watermark = self.get_watermark(currency)
+                since = oldest if watermark is None else max(watermark - self.overlap_ms, oldest)
+
+                deposits = self.fetch_deposits(currency, since)
+                result['fetches'] += 1
+                index = self.index_deposits(deposits)
+                used = self._used_txids(deposits)
+
+                for payment in pending:
+                    key = (payment['deposit_address'], payment.get('deposit_tag') or None)
+                    created_ms = _to_ms(payment['created_at'])
+                    candidates = [
+                        deposit for deposit in index.get(key, [])
+                        if not (deposit.get('txid') and deposit['txid'] in used)
+                        and (deposit.get('timestamp') or 0) >= created_ms
+                        and self.is_match(deposit, payment)
+                    ]
+                    # Best fit: the smallest deposit that covers this invoice,
+                    # so a large transfer stays available for a large invoice
+                    match = min(
+                        candidates,
+                        key=lambda d: (d['amount'], d.get('timestamp') or 0),
+                        default=None
+                    )
+
+                    if match:
+                        self.confirm(payment['payment_id'], match)
+                        if match.get('txid'):
+                            used.add(match['txid'])
+                        result['confirmed'] += 1
+                        logger.info(f"Payment {payment['payment_id']} matched deposit {match.get('txid')}")
+                    else:
+                        result['pending'] += 1
+
+                self._set_watermark(currency, self._next_watermark(deposits, since, watermark))
+
+            except Exception as e:
+                result['errors'] += 1
+                result['pending'] += len(pending)
+                logger.error(f"Error reconciling {currency} deposits: {e}")
+
+        self.last_run = dict(result, finished_at=datetime.utcnow())
+        return result
@@ -0,0 +1,159 @@
+"""
+Incremental Feature Store
+Keeps a bounded window of candles and computed feature rows per symbol
+and, when new candles arrive, computes rows for just those candles
+instead of rebuilding every feature over the full history.
+
+The same feature function runs in both modes:
+  - offline: compute(df) over a whole history (training, backtests)
+  - online:  update(symbol, df) over the retained window + new candles
+so training and inference can't drift apart.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ROWS = 1000
+DEFAULT_MAX_SYMBOLS = 256
+
+
+class FeatureStore:
+    """
+    Per-symbol rolling feature state
+
+    `lookback` is how many past candles the feature function needs to
+    reproduce a row exactly. Windowed features (rolling means, shifts)
+    need their window; recursive ones (EMA, Wilder smoothing) need enough
+    warm-up for the starting value to decay away, so size it generously.
+
+    With fill=True rows are forward-filled from the previous stored row
+    and remaining gaps set to 0, matching df.ffill().fillna(0) over the
+    full history.
+    """
+
+    def __init__(self, compute_fn: Callable[[pd.DataFrame], pd.DataFrame], lookback: int,
+                 max_rows: int = DEFAULT_MAX_ROWS, fill: bool = False,
+                 input_columns: Optional[List[str]] = None,
+                 max_symbols: int = DEFAULT_MAX_SYMBOLS):
+        self.compute_fn = compute_fn
+        self.lookback = lookback
+        self.max_rows = max(max_rows, 1)
+        self.fill = fill
+        self.input_columns = input_columns
+        self.max_symbols = max_symbols
+
+        self._state: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {'hits': 0, 'rows_appended': 0, 'rebuilds': 0}
+
+    # ------------------------------------------------------------------
+    # Offline
+    # ------------------------------------------------------------------
+
+    def _inputs(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.input_columns:
+            return df[[c for c in self.input_columns if c in df.columns]]
+        return df
+
+    def compute(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Features for every row of df (offline / training mode)"""
+        features = self.compute_fn(self._inputs(df).copy())
+        if self.fill:
+            features = features.ffill().fillna(0)
+        return features
+
+    # ------------------------------------------------------------------
+    # Online
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _keys(df: pd.DataFrame) -> Optional[pd.Index]:
+        """Candle timestamps, or None if rows can't be told apart over time"""
+        if isinstance(df.index, pd.DatetimeIndex):
+            keys = df.index
+        elif 'timestamp' in df.columns:
+            keys = pd.Index(df['timestamp'])
+        else:
+            return None
+        return keys if keys.is_monotonic_increasing and keys.is_unique else None
+
+    def _store(self, symbol, candles: pd.DataFrame, features: pd.DataFrame, keys: pd.Index):
+        self._state[symbol] = {
+            'candles': candles.iloc[-self.lookback:],
+            'features': features.iloc[-self.max_rows:],
+            'last_key': keys[-1],
+        }
+        self._state.move_to_end(symbol)
+        while len(self._state) > self.max_symbols:
+            self._state.popitem(last=False)
+
+    def update(self, symbol, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Bring a symbol's features up to date with df and return them
+
+        df is the usual "last N candles" fetch. Only candles from the last
+        stored one onwards are computed; the last stored candle is always
+        redone because the exchange keeps updating the bar that is still
+        open. Returns (a copy of) at most max_rows feature rows, newest last.
+        """
+        return self._update(symbol, df).copy()
+
+    def latest(self, symbol, df: pd.DataFrame) -> pd.Series:
+        """Feature row for the newest candle in df"""
+        return self._update(symbol, df).iloc[-1]
+
+    def _update(self, symbol, df: pd.DataFrame) -> pd.DataFrame:
+        keys = self._keys(df)
+        if keys is None or symbol is None or len(df) == 0:
+            return self.compute(df).iloc[-self.max_rows:]
+
+        candles = self._inputs(df)
+
+        with self._lock:
+            state = self._state.get(symbol)
+            start = None
+            if state is not None:
+                start = keys.searchsorted(state['last_key'])
+                if start >= len(keys) or keys[start] != state['last_key']:
+                    # No overlap with what we have (gap, or history rewound)
+                    start = None
+
+            if start is None:
+                features = self.compute(candles)
+                self._store(symbol, candles, features, keys)
+                self.stats['rebuilds'] += 1
+                return self._state[symbol]['features']
+
+            new = candles.iloc[start:]
+            stored_candles = state['candles']
+            if len(new) == 1 and new.iloc[0].equals(stored_candles.iloc[-1]):
+                self._state.move_to_end(symbol)
+                self.stats['hits'] += 1
+                return state['features']
+
+            window = pd.concat([stored_candles.iloc[:-1], new])
+            rows = self.compute_fn(window.copy()).iloc[-len(new):]
+
+            previous = state['features'].iloc[:-1]
+            if self.fill:
+                seed = previous.iloc[-1:]
+                rows = pd.concat([seed, rows]).ffill().fillna(0).iloc[len(seed):]
+
+            features = pd.concat([previous, rows])
+            self._store(symbol, window, features, keys)
+            self.stats['rows_appended'] += len(new) - 1
+            return self._state[symbol]['features']
+
+    def reset(self, symbol=None):
+        """Forget one symbol's state, or everything"""
+        with self._lock:
+            if symbol is None:
+                self._state.clear()
+            else:
+                self._state.pop(symbol, None)
@@ -0,0 +1,158 @@
+"""
+Index Schema
+Every MongoDB index the app relies on, declared in one place and created
+at startup. Compound keys follow equality -> sort -> range order so each
+query below reads only the documents it returns.
+
+The query profiler (query_profiler.py) checks observed query shapes
+against this schema and suggests an index for any it doesn't cover.
+"""
+import logging
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from pymongo import IndexModel
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict
+
+    @property
+    def fields(self) -> List[str]:
+        return [field for field, _ in self.keys]
+
+
+def idx(*fields: str, **options) -> IndexSpec:
+    """idx('user_id', '-timestamp') -> index on user_id asc, timestamp desc"""
+    keys = tuple((f[1:], -1) if f.startswith('-') else (f, 1) for f in fields)
+    return IndexSpec(keys, options)
+
+
+INDEX_SCHEMA: Dict[str, List[IndexSpec]] = {
+    'trades': [
+        idx('symbol'),
+        idx('status'),
+        idx('entry_time'),
+        # Statistics filters and per-user/bot closed-trade history
+        idx('status', '-timestamp'),
+        idx('user_id', 'status', '-timestamp'),
+        idx('bot_id', 'status', '-timestamp'),
+        # Keyset pagination walks (timestamp, _id) newest first
+        idx('user_id', '-timestamp', '-_id'),
+        idx('bot_id', '-timestamp', '-_id'),
+        idx('-entry_time', '-_id'),
+        # Open position lookup: a bot's latest buy / later sell
+        idx('bot_id', 'side', '-timestamp'),
+        # Performance summaries over a closing-time window
+        idx('user_id', 'status', 'exit_time'),
+        idx('status', 'exit_time'),
+    ],
+    'performance': [
+        idx('date', unique=True),
+    ],
+    'users': [
+        idx('email'),
+        idx('-created_at'),
+    ],
+    'bot_instances': [
+        idx('user_id', 'status'),
+        idx('status'),
+    ],
+    'payments': [
+        idx('status', 'expires_at', 'created_at'),
+        idx('tx_hash', sparse=True),
+        idx('payment_id'),
+        idx('reference', sparse=True),
+        idx('user_id', '-created_at'),
+    ],
+    'subscriptions': [
+        idx('user_id'),
+    ],
+    'api_keys': [
+        idx('api_key', 'is_active'),
+        idx('user_id'),
+    ],
+    'published_strategies': [
+        idx('status', '-win_rate', '-monthly_return'),
+        idx('trader_id'),
+    ],
+    'copy_subscriptions': [
+        idx('leader_id', 'status'),
+        idx('follower_id', 'strategy_id', 'status'),
+        idx('strategy_id', 'status'),
+    ],
+    'copy_trades': [
+        idx('original_trade_id', 'status'),
+    ],
+    'new_listing_trades': [
+        idx('user_id', '-entry_time'),
+    ],
+    'strategy_marketplace': [
+        idx('is_active'),
+    ],
+    'trade_analytics_daily': [
+        idx('key', 'date'),
+    ],
+}
+
+
+def ensure_indexes(db, schema: Dict[str, List[IndexSpec]] = INDEX_SCHEMA) -> Dict[str, int]:
+    """
+    Create every declared index (existing ones are a no-op)
+
+    One createIndexes call per collection; if it fails (e.g. an index of
+    the same name with other options exists), indexes are retried one by
+    one so a single conflict doesn't leave the rest missing.
+    """
+    result = {'created': 0, 'failed': 0}
+    for name, specs in schema.items():
+        models = [IndexModel(list(spec.keys), **spec.options) for spec in specs]
+        try:
+            db[name].create_indexes(models)
+            result['created'] += len(models)
+            continue
+        except Exception as e:
+            logger.warning(f"Batch index creation on {name} failed, retrying one by one: {e}")
+        for spec in specs:
+            try:
+                db[name].create_index(list(spec.keys), **spec.options)
+                result['created'] += 1
+            except Exception as e:
+                result['failed'] += 1
+                logger.error(f"Could not create index {spec.fields} on {name}: {e}")
+    return result
+
+
+def covering_index(collection: str, equality: Sequence[str], sort: Sequence[str],
+                   range_fields: Sequence[str],
+                   schema: Dict[str, List[IndexSpec]] = INDEX_SCHEMA):
+    """
+    The declared index that serves a query shape, or None
+
+    An index serves it when its leading fields are exactly the equality
+    fields (any order), followed by the sort fields or, without a sort,
+    the first range field.
+    """
+    if not (equality or sort or range_fields):
+        return None  # full scans by design (e.g. count of everything)
+    for spec in schema.get(collection, []):
+        fields = spec.fields
+        if set(fields[:len(equality)]) != set(equality):
+            continue
+        rest = fields[len(equality):]
+        wanted = list(sort) if sort else list(range_fields[:1])
+        if rest[:len(wanted)] == wanted:
+            return spec
+    return None
+
+
+def suggest_index(equality: Sequence[str], sort: Sequence[Tuple[str, int]],
+                  range_fields: Sequence[str]) -> List[Tuple[str, int]]:
+    """Equality, then sort, then range keys: the ESR compound index for a shape"""
+    keys = [(field, 1) for field in equality]
+    keys += [(field, direction) for field, direction in sort if field not in equality]
+    keys += [(field, 1) for field in range_fields
+             if field not in equality and all(field != f for f, _ in sort)]
+    return keys
@@ -0,0 +1,193 @@
+"""
+Lazy Imports & Cold-Start Profiling
+Defers the heavy analytics libraries (sklearn, joblib, ...) until the
+first attribute access, and measures how long the API and the worker take
+to import against a per-process budget.
+
+    python lazy_imports.py                  # check every budget in config
+    python lazy_imports.py bot_worker -v    # one target, with top offenders
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+from typing import Dict, List, Optional
+
+# Libraries that cost hundreds of ms to import; none of them should be
+# needed just to serve auth or payments
+HEAVY_MODULES = (
+    'sklearn', 'scipy', 'joblib', 'matplotlib', 'yfinance',
+    'textblob', 'vaderSentiment', 'ta', 'tensorflow', 'torch'
+)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module placeholder that imports the real module on first attribute access
+
+    Use it for libraries only needed on some code paths:
+
+        ensemble = lazy_import('sklearn.ensemble')
+        ...
+        model = ensemble.RandomForestClassifier()   # sklearn imported here
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str):
+    """Return the module if it's already imported, else a LazyModule for it"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def loaded_heavy_modules() -> List[str]:
+    """Heavy libraries already imported into this process"""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+# ============================================================================
+# IMPORT-TIME PROFILING
+# ============================================================================
+
+def parse_importtime(output: str) -> List[Dict]:
+    """Parse `python -X importtime` stderr into [{module, self_ms, cumulative_ms, depth}]"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        rows.append({
+            'module': name.strip(),
+            'self_ms': int(parts[0]) / 1000,
+            'cumulative_ms': int(parts[1]) / 1000,
+            'depth': (len(name) - len(name.lstrip())) // 2
+        })
+    return rows
+
+
+def profile_imports(target: str, top: int = 15, timeout: float = 300) -> Dict:
+    """
+    Import `target` in a fresh interpreter and report where the time went
+
+    Module-level side effects (database connections, exchange clients)
+    count too: that is what a restart actually waits for.
+    """
+    code = (
+        f"import sys, time; t = time.perf_counter(); import {target}; "
+        f"print('WALL_MS', (time.perf_counter() - t) * 1000); "
+        f"print('HEAVY', ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=REPO_DIR, capture_output=True, text=True, timeout=timeout
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    wall_ms = None
+    heavy = []
+    for line in proc.stdout.splitlines():
+        if line.startswith('WALL_MS '):
+            wall_ms = float(line.split()[1])
+        elif line.startswith('HEAVY '):
+            heavy = [m for m in line.split(' ', 1)[1].split(',') if m]
+
+    rows = parse_importtime(proc.stderr)
+    # Direct children of the target are what there is to make lazy
+    top_level = [r for r in rows if r['depth'] == 1 and r['module'] != target]
+    top_level.sort(key=lambda r: r['cumulative_ms'], reverse=True)
+
+    return {
+        'target': target,
+        'ok': proc.returncode == 0,
+        'import_ms': round(wall_ms, 1) if wall_ms is not None else None,
+        'process_ms': round(elapsed_ms, 1),
+        'heavy_modules': heavy,
+        'top': [(r['module'], round(r['cumulative_ms'], 1)) for r in top_level[:top]],
+        'error': proc.stderr.strip().splitlines()[-1] if proc.returncode else None
+    }
+
+
+def check_cold_start(budgets: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """Profile each target and compare its import time with its budget (ms)"""
+    if budgets is None:
+        import config
+        budgets = config.COLD_START_BUDGETS_MS
+
+    results = []
+    for target, budget_ms in budgets.items():
+        result = profile_imports(target)
+        result['budget_ms'] = budget_ms
+        result['within_budget'] = (
+            result['ok'] and result['import_ms'] is not None and result['import_ms'] <= budget_ms
+        )
+        results.append(result)
+    return results
+
+
+def main(argv=None) -> int:
+    import argparse
+    from colorama import Fore, Style
+    import config
+
+    parser = argparse.ArgumentParser(description='Measure cold-start import time against budget')
+    parser.add_argument('targets', nargs='*', help='modules to check (default: all budgets in config)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the slowest imports')
+    args = parser.parse_args(argv)
+
+    budgets = config.COLD_START_BUDGETS_MS
+    if args.targets:
+        budgets = {t: budgets.get(t, float('inf')) for t in args.targets}
+
+    failed = False
+    for result in check_cold_start(budgets):
+        color = Fore.GREEN if result['within_budget'] else Fore.RED
+        failed |= not result['within_budget']
+        print(f"{color}{result['target']}: {result['import_ms']} ms "
+              f"(budget {result['budget_ms']} ms){Style.RESET_ALL}")
+        if result['error']:
+            print(f"  {Fore.RED}{result['error']}{Style.RESET_ALL}")
+        if result['heavy_modules']:
+            print(f"  {Fore.YELLOW}heavy imports: {', '.join(result['heavy_modules'])}{Style.RESET_ALL}")
+        if args.verbose:
+            for module, ms in result['top']:
+                print(f"  {ms:>10.1f} ms  {module}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
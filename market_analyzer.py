@@ -12,109 +12,124 @@ import yfinance as yf
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import warnings
+from regime_service import regime_service
+from sentiment_service import SentimentService, BatchTextScorer
 warnings.filterwarnings('ignore')
 
 
+# Seconds between refreshes of each sentiment source
+SENTIMENT_REFRESH_INTERVALS = {
+    'news_sentiment': 900,
+    'social_sentiment': 300,
+    'fear_greed_index': 3600,
+    'market_momentum': 60
+}
+
+# Weighted composite sentiment
+SENTIMENT_WEIGHTS = {
+    'news_sentiment': 0.3,
+    'social_sentiment': 0.2,
+    'fear_greed_index': 0.3,
+    'market_momentum': 0.2
+}
+
+
 class MarketAnalyzer:
     def __init__(self):
         self.sentiment_analyzer = SentimentIntensityAnalyzer()
         self.market_regimes = {}
         self.volatility_clusters = {}
         
+        # Text scoring is memoized and batched across symbols
+        self.news_scorer = BatchTextScorer(lambda text: TextBlob(text).sentiment.polarity)
+        self.social_scorer = BatchTextScorer(
+            lambda text: self.sentiment_analyzer.polarity_scores(text)['compound']
+        )
+        
+        # Sources refresh in the background; reads are cache lookups
+        self.sentiment = SentimentService(SENTIMENT_WEIGHTS)
+        intervals = SENTIMENT_REFRESH_INTERVALS
+        self.sentiment.add_source('news_sentiment', self._get_news_sentiment, intervals['news_sentiment'])
+        self.sentiment.add_source('social_sentiment', self._get_social_sentiment, intervals['social_sentiment'])
+        self.sentiment.add_source('fear_greed_index', self._get_fear_greed_index,
+                                  intervals['fear_greed_index'], per_symbol=False)
+        self.sentiment.add_source('market_momentum', self._calculate_market_momentum, intervals['market_momentum'])
+        
     def analyze_market_sentiment(self, symbol):
-        """Comprehensive market sentiment analysis"""
+        """Comprehensive market sentiment analysis (cached, see SentimentService)"""
         try:
-            sentiment_scores = {
-                'news_sentiment': self._get_news_sentiment(symbol),
-                'social_sentiment': self._get_social_sentiment(symbol),
-                'fear_greed_index': self._get_fear_greed_index(),
-                'market_momentum': self._calculate_market_momentum(symbol)
-            }
-            
-            # Weighted composite sentiment
-            weights = {
-                'news_sentiment': 0.3,
-                'social_sentiment': 0.2,
-                'fear_greed_index': 0.3,
-                'market_momentum': 0.2
-            }
-            
-            composite_sentiment = sum(
-                sentiment_scores[key] * weights[key] 
-                for key in sentiment_scores if sentiment_scores[key] is not None
-            )
+            cached = self.sentiment.get(symbol)
+            composite_sentiment = cached['composite_sentiment']
             
             return {
                 'composite_sentiment': composite_sentiment,
-                'individual_scores': sentiment_scores,
-                'sentiment_strength': self._classify_sentiment_strength(composite_sentiment)
+                'individual_scores': cached['individual_scores'],
+                'sentiment_strength': self._classify_sentiment_strength(composite_sentiment),
+                'age_seconds': cached['age_seconds']
             }
             
         except Exception as e:
             print(f"Error analyzing sentiment for {symbol}: {e}")
             return {'composite_sentiment': 0.5, 'sentiment_strength': 'neutral'}
     
-    def _get_news_sentiment(self, symbol):
-        """Get sentiment from financial news"""
+    def _get_news_sentiment(self, symbols):
+        """Get sentiment from financial news, scored in one batch for all symbols"""
         try:
             # Simulate news sentiment analysis
             # In production, integrate with NewsAPI, Alpha Vantage, or similar
-            base_symbol = symbol.split('/')[0].lower()
-            
-            # Simulate news headlines analysis
-            sample_headlines = [
-                f"{base_symbol} shows strong technical breakout",
-                f"Institutional adoption of {base_symbol} increasing",
-                f"Market volatility affects {base_symbol} trading",
-                f"{base_symbol} reaches new support level"
-            ]
-            
-            sentiments = []
-            for headline in sample_headlines:
-                blob = TextBlob(headline)
-                sentiment = blob.sentiment.polarity
-                sentiments.append(sentiment)
-            
-            # Convert to 0-1 scale
-            avg_sentiment = np.mean(sentiments)
-            normalized_sentiment = (avg_sentiment + 1) / 2
+            headlines = {}
+            for symbol in symbols:
+                base_symbol = symbol.split('/')[0].lower()
+                
+                # Simulate news headlines analysis
+                headlines[symbol] = [
+                    f"{base_symbol} shows strong technical breakout",
+                    f"Institutional adoption of {base_symbol} increasing",
+                    f"Market volatility affects {base_symbol} trading",
+                    f"{base_symbol} reaches new support level"
+                ]
             
-            return normalized_sentiment
+            return self._score_batch(headlines, self.news_scorer)
             
         except Exception as e:
             print(f"Error getting news sentiment: {e}")
-            return 0.5
+            return {symbol: 0.5 for symbol in symbols}
     
-    def _get_social_sentiment(self, symbol):
-        """Get sentiment from social media"""
+    def _get_social_sentiment(self, symbols):
+        """Get sentiment from social media, scored in one batch for all symbols"""
         try:
             # Simulate social media sentiment
             # In production, integrate with Twitter API, Reddit API, etc.
-            base_symbol = symbol.split('/')[0].lower()
-            
-            # Simulate social posts
-            sample_posts = [
-                f"Bullish on {base_symbol} long term",
-                f"{base_symbol} looking strong today",
-                f"Uncertain about {base_symbol} short term",
-                f"{base_symbol} technical analysis looks good"
-            ]
-            
-            sentiments = []
-            for post in sample_posts:
-                scores = self.sentiment_analyzer.polarity_scores(post)
-                compound_score = scores['compound']
-                sentiments.append(compound_score)
-            
-            # Convert to 0-1 scale
-            avg_sentiment = np.mean(sentiments)
-            normalized_sentiment = (avg_sentiment + 1) / 2
+            posts = {}
+            for symbol in symbols:
+                base_symbol = symbol.split('/')[0].lower()
+                
+                # Simulate social posts
+                posts[symbol] = [
+                    f"Bullish on {base_symbol} long term",
+                    f"{base_symbol} looking strong today",
+                    f"Uncertain about {base_symbol} short term",
+                    f"{base_symbol} technical analysis looks good"
+                ]
             
-            return normalized_sentiment
+            return self._score_batch(posts, self.social_scorer)
             
         except Exception as e:
             print(f"Error getting social sentiment: {e}")
-            return 0.5
+            return {symbol: 0.5 for symbol in symbols}
+    
+    @staticmethod
+    def _score_batch(texts_by_symbol, scorer):
+        """Score every symbol's texts in one pass; returns {symbol: 0-1 score}"""
+        flat = [text for texts in texts_by_symbol.values() for text in texts]
+        scores = iter(scorer.score_many(flat))
+        
+        result = {}
+        for symbol, texts in texts_by_symbol.items():
+            # Convert to 0-1 scale
+            avg_sentiment = np.mean([next(scores) for _ in texts])
+            result[symbol] = (avg_sentiment + 1) / 2
+        return result
     
     def _get_fear_greed_index(self):
         """Get market fear & greed index"""
@@ -140,26 +155,27 @@ class MarketAnalyzer:
             print(f"Error getting fear & greed index: {e}")
             return 0.5
     
-    def _calculate_market_momentum(self, symbol):
-        """Calculate market momentum indicator"""
-        try:
-            # Use price momentum as proxy for market sentiment
-            # In production, could use more sophisticated momentum indicators
-            
-            # Simulate momentum calculation
-            # Positive momentum = bullish sentiment
-            momentum_score = np.random.normal(0.02, 0.05)  # 2% average with 5% volatility
-            
-            # Convert to 0-1 scale
-            # Assume momentum range of -20% to +20%
-            normalized_momentum = (momentum_score + 0.2) / 0.4
-            normalized_momentum = max(0, min(1, normalized_momentum))
-            
-            return normalized_momentum
-            
-        except Exception as e:
-            print(f"Error calculating market momentum: {e}")
-            return 0.5
+    def _calculate_market_momentum(self, symbols):
+        """Calculate market momentum indicator for each symbol"""
+        result = {}
+        for symbol in symbols:
+            try:
+                # Use price momentum as proxy for market sentiment
+                # In production, could use more sophisticated momentum indicators
+                
+                # Simulate momentum calculation
+                # Positive momentum = bullish sentiment
+                momentum_score = np.random.normal(0.02, 0.05)  # 2% average with 5% volatility
+                
+                # Convert to 0-1 scale
+                # Assume momentum range of -20% to +20%
+                normalized_momentum = (momentum_score + 0.2) / 0.4
+                result[symbol] = max(0, min(1, normalized_momentum))
+                
+            except Exception as e:
+                print(f"Error calculating market momentum: {e}")
+                result[symbol] = 0.5
+        return result
     
     def _classify_sentiment_strength(self, sentiment):
         """Classify sentiment strength"""
@@ -174,25 +190,21 @@ class MarketAnalyzer:
         else:
             return 'very_bearish'
     
-    def detect_market_regime(self, df, symbol):
+    def detect_market_regime(self, df, symbol, timeframe='1h'):
         """Detect current market regime using advanced analysis"""
         try:
             if len(df) < 50:
                 return 'insufficient_data'
             
-            # Calculate regime indicators
-            returns = df['close'].pct_change().dropna()
-            volatility = returns.rolling(20).std()
-            
-            # Trend indicators
-            sma_20 = df['close'].rolling(20).mean()
-            sma_50 = df['close'].rolling(50).mean()
-            
-            latest = df.iloc[-1]
+            # Rolling indicators come from the shared per-bar regime state
+            state = regime_service.get_state(symbol, timeframe, df)
+            close = state['close']
+            sma_20 = state['sma_20']
+            sma_50 = state['sma_50']
             
             # Volatility regime
-            current_vol = volatility.iloc[-1]
-            avg_vol = volatility.mean()
+            current_vol = state['current_vol']
+            avg_vol = state['avg_vol']
             
             if current_vol > avg_vol * 1.5:
                 vol_regime = 'high_volatility'
@@ -202,22 +214,19 @@ class MarketAnalyzer:
                 vol_regime = 'normal_volatility'
             
             # Trend regime
-            if latest['close'] > sma_20.iloc[-1] > sma_50.iloc[-1]:
+            if close > sma_20 > sma_50:
                 trend_regime = 'strong_uptrend'
-            elif latest['close'] < sma_20.iloc[-1] < sma_50.iloc[-1]:
+            elif close < sma_20 < sma_50:
                 trend_regime = 'strong_downtrend'
-            elif abs(latest['close'] - sma_20.iloc[-1]) / latest['close'] < 0.02:
+            elif abs(close - sma_20) / close < 0.02:
                 trend_regime = 'ranging'
             else:
                 trend_regime = 'weak_trend'
             
             # Market structure
-            highs = df['high'].rolling(10).max()
-            lows = df['low'].rolling(10).min()
-            
-            if latest['high'] >= highs.iloc[-2]:
+            if state['high'] >= state['prev_high_10']:
                 structure = 'breaking_resistance'
-            elif latest['low'] <= lows.iloc[-2]:
+            elif state['low'] <= state['prev_low_10']:
                 structure = 'breaking_support'
             else:
                 structure = 'within_range'
@@ -239,27 +248,15 @@ class MarketAnalyzer:
             print(f"Error detecting market regime for {symbol}: {e}")
             return 'unknown'
     
-    def analyze_volatility_clustering(self, df, symbol):
+    def analyze_volatility_clustering(self, df, symbol, timeframe='1h'):
         """Analyze volatility clustering patterns"""
         try:
             if len(df) < 100:
                 return {'cluster': 'insufficient_data', 'forecast': 0.02}
             
-            # Calculate returns and volatility
-            returns = df['close'].pct_change().dropna()
-            squared_returns = returns ** 2
-            
-            # Create features for clustering
-            features = []
-            window_sizes = [5, 10, 20]
-            
-            for window in window_sizes:
-                vol_ma = squared_returns.rolling(window).mean()
-                features.append(vol_ma.iloc[-1])
-            
-            # Add current volatility
-            current_vol = returns.rolling(20).std().iloc[-1]
-            features.append(current_vol)
+            # Current volatility and persistence from the shared regime state
+            state = regime_service.get_state(symbol, timeframe, df)
+            current_vol = state['current_vol']
             
             # Perform clustering (simplified)
             if symbol not in self.volatility_clusters:
@@ -287,30 +284,13 @@ class MarketAnalyzer:
                 'cluster': vol_cluster,
                 'current_volatility': current_vol,
                 'forecast': forecast_vol,
-                'persistence': self._calculate_volatility_persistence(squared_returns)
+                'persistence': state['persistence']
             }
             
         except Exception as e:
             print(f"Error analyzing volatility clustering for {symbol}: {e}")
             return {'cluster': 'unknown', 'forecast': 0.02}
     
-    def _calculate_volatility_persistence(self, squared_returns):
-        """Calculate volatility persistence (GARCH-like effect)"""
-        try:
-            # Simple volatility persistence measure
-            if len(squared_returns) < 20:
-                return 0.5
-            
-            # Calculate autocorrelation of squared returns
-            recent_vol = squared_returns.tail(10).mean()
-            historical_vol = squared_returns.tail(50).mean()
-            
-            persistence = min(recent_vol / historical_vol, 2.0) / 2.0
-            return persistence
-            
-        except Exception as e:
-            return 0.5
-    
     def calculate_market_microstructure(self, df, symbol):
         """Analyze market microstructure indicators"""
         try:
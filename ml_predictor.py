@@ -4,75 +4,115 @@ Uses multiple ML models to predict price movements
 """
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-import joblib
+import os
 from datetime import datetime, timedelta
 import logging
+from typing import Dict, Optional, Tuple
+import config
+from lazy_imports import lazy_import
+from model_registry import ModelRegistry
+from feature_store import FeatureStore
+from regime_service import regime_service
 
 logger = logging.getLogger(__name__)
 
+# sklearn costs ~1s to import; only load it once a model is trained
+ensemble = lazy_import('sklearn.ensemble')
+preprocessing = lazy_import('sklearn.preprocessing')
+model_selection = lazy_import('sklearn.model_selection')
+
+# Candles of history needed to reproduce a feature row: the 50-bar
+# volatility ratio over 20-bar volatility, plus EMA warm-up for MACD
+FEATURE_LOOKBACK = 400
+
 
 class MLPredictor:
-    def __init__(self):
-        self.models = {
-            'random_forest': RandomForestClassifier(n_estimators=100, random_state=42),
-            'gradient_boost': GradientBoostingClassifier(n_estimators=100, random_state=42)
-        }
-        self.scaler = StandardScaler()
+    def __init__(self, registry: ModelRegistry = None):
+        # Filled in by train() or load_models()
+        self.models = {}
+        self.scaler = None
         self.is_trained = False
         self.feature_columns = []
+        self.registry = registry or ModelRegistry(
+            os.path.join(config.MODEL_DIR, 'ml_predictor'),
+            max_in_memory=config.MODEL_CACHE_SIZE
+        )
+        # Same feature code for training (compute) and live signals (update)
+        self.features = FeatureStore(self._raw_features, lookback=FEATURE_LOOKBACK,
+                                     max_rows=50, fill=True)
+    
+    @staticmethod
+    def _new_models():
+        return {
+            'random_forest': ensemble.RandomForestClassifier(n_estimators=100, random_state=42),
+            'gradient_boost': ensemble.GradientBoostingClassifier(n_estimators=100, random_state=42)
+        }
         
     def prepare_features(self, df):
-        """Prepare features for ML model"""
-        features = pd.DataFrame()
+        """Prepare features for ML model over the whole history"""
+        return self.features.compute(df)
+    
+    def _raw_features(self, df):
+        """Feature definitions; gaps are filled by the feature store"""
+        # Columns are collected in a dict and framed once at the end:
+        # inserting 25 columns one by one costs more than computing them
+        close = df['close']
+        features = {}
         
         # Price features
-        features['returns'] = df['close'].pct_change()
-        features['log_returns'] = np.log(df['close'] / df['close'].shift(1))
+        features['returns'] = close.pct_change()
+        features['log_returns'] = np.log(close / close.shift(1))
         
         # Volatility features
-        features['volatility'] = df['close'].rolling(window=20).std()
-        features['volatility_ratio'] = features['volatility'] / features['volatility'].rolling(window=50).mean()
+        rolling_20 = close.rolling(window=20)
+        sma_20 = rolling_20.mean()
+        std_20 = rolling_20.std()
+        features['volatility'] = std_20
+        features['volatility_ratio'] = std_20 / std_20.rolling(window=50).mean()
         
         # Momentum features
-        features['momentum_5'] = df['close'] / df['close'].shift(5) - 1
-        features['momentum_10'] = df['close'] / df['close'].shift(10) - 1
-        features['momentum_20'] = df['close'] / df['close'].shift(20) - 1
+        features['momentum_5'] = close / close.shift(5) - 1
+        features['momentum_10'] = close / close.shift(10) - 1
+        features['momentum_20'] = close / close.shift(20) - 1
         
         # Moving averages
-        features['sma_5'] = df['close'].rolling(window=5).mean()
-        features['sma_20'] = df['close'].rolling(window=20).mean()
-        features['sma_50'] = df['close'].rolling(window=50).mean()
-        features['sma_ratio_5_20'] = features['sma_5'] / features['sma_20']
-        features['sma_ratio_20_50'] = features['sma_20'] / features['sma_50']
+        sma_5 = close.rolling(window=5).mean()
+        sma_50 = close.rolling(window=50).mean()
+        features['sma_5'] = sma_5
+        features['sma_20'] = sma_20
+        features['sma_50'] = sma_50
+        features['sma_ratio_5_20'] = sma_5 / sma_20
+        features['sma_ratio_20_50'] = sma_20 / sma_50
         
         # RSI
-        delta = df['close'].diff()
+        delta = close.diff()
         gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
         rs = gain / loss
         features['rsi'] = 100 - (100 / (1 + rs))
         
         # MACD
-        exp1 = df['close'].ewm(span=12, adjust=False).mean()
-        exp2 = df['close'].ewm(span=26, adjust=False).mean()
-        features['macd'] = exp1 - exp2
-        features['macd_signal'] = features['macd'].ewm(span=9, adjust=False).mean()
-        features['macd_diff'] = features['macd'] - features['macd_signal']
+        exp1 = close.ewm(span=12, adjust=False).mean()
+        exp2 = close.ewm(span=26, adjust=False).mean()
+        macd = exp1 - exp2
+        macd_signal = macd.ewm(span=9, adjust=False).mean()
+        features['macd'] = macd
+        features['macd_signal'] = macd_signal
+        features['macd_diff'] = macd - macd_signal
         
         # Bollinger Bands
-        features['bb_middle'] = df['close'].rolling(window=20).mean()
-        bb_std = df['close'].rolling(window=20).std()
-        features['bb_upper'] = features['bb_middle'] + (bb_std * 2)
-        features['bb_lower'] = features['bb_middle'] - (bb_std * 2)
-        features['bb_position'] = (df['close'] - features['bb_lower']) / (features['bb_upper'] - features['bb_lower'])
+        bb_upper = sma_20 + (std_20 * 2)
+        bb_lower = sma_20 - (std_20 * 2)
+        features['bb_middle'] = sma_20
+        features['bb_upper'] = bb_upper
+        features['bb_lower'] = bb_lower
+        features['bb_position'] = (close - bb_lower) / (bb_upper - bb_lower)
         
         # Volume features (if available)
         if 'volume' in df.columns:
-            features['volume_ratio'] = df['volume'] / df['volume'].rolling(window=20).mean()
-            features['volume_momentum'] = df['volume'] / df['volume'].shift(5)
+            volume = df['volume']
+            features['volume_ratio'] = volume / volume.rolling(window=20).mean()
+            features['volume_momentum'] = volume / volume.shift(5)
         
         # Time features
         if isinstance(df.index, pd.DatetimeIndex):
@@ -80,10 +120,7 @@ class MLPredictor:
             features['day_of_week'] = df.index.dayofweek
             features['day_of_month'] = df.index.day
         
-        # Drop NaN values
-        features = features.fillna(method='ffill').fillna(0)
-        
-        return features
+        return pd.DataFrame(features, index=df.index)
     
     def create_labels(self, df, forward_periods=5, threshold=0.02):
         """Create labels for training (1 = buy, 0 = hold, -1 = sell)"""
@@ -94,43 +131,58 @@ class MLPredictor:
         
         return labels
     
+    def _fit_bundle(self, historical_data):
+        """Fit fresh models on historical data; returns (bundle, scores)"""
+        # Prepare features and labels
+        features = self.prepare_features(historical_data)
+        labels = self.create_labels(historical_data)
+        
+        # Remove last few rows (no future data for labels)
+        features = features[:-5]
+        labels = labels[:-5]
+        
+        # Split data
+        X_train, X_test, y_train, y_test = model_selection.train_test_split(
+            features, labels, test_size=0.2, shuffle=False
+        )
+        
+        # Scale features
+        scaler = preprocessing.StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+        
+        # Train each model
+        models = self._new_models()
+        scores = {}
+        for name, model in models.items():
+            model.fit(X_train_scaled, y_train)
+            score = model.score(X_test_scaled, y_test)
+            scores[name] = score
+            logger.info(f"{name} accuracy: {score:.4f}")
+        
+        bundle = {
+            'models': models,
+            'scaler': scaler,
+            'feature_columns': features.columns.tolist()
+        }
+        return bundle, scores
+    
+    def _use_bundle(self, bundle):
+        self.models = bundle['models']
+        self.scaler = bundle['scaler']
+        self.feature_columns = bundle['feature_columns']
+        self.is_trained = True
+    
     def train(self, historical_data, symbol):
         """Train ML models on historical data"""
         try:
             logger.info(f"Training ML models for {symbol}...")
             
-            # Prepare features and labels
-            features = self.prepare_features(historical_data)
-            labels = self.create_labels(historical_data)
-            
-            # Remove last few rows (no future data for labels)
-            features = features[:-5]
-            labels = labels[:-5]
-            
-            # Store feature columns
-            self.feature_columns = features.columns.tolist()
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                features, labels, test_size=0.2, shuffle=False
-            )
-            
-            # Scale features
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
-            
-            # Train each model
-            scores = {}
-            for name, model in self.models.items():
-                model.fit(X_train_scaled, y_train)
-                score = model.score(X_test_scaled, y_test)
-                scores[name] = score
-                logger.info(f"{name} accuracy: {score:.4f}")
-            
-            self.is_trained = True
+            bundle, scores = self._fit_bundle(historical_data)
+            self._use_bundle(bundle)
             
             # Save models
-            self.save_models(symbol)
+            self.save_models(symbol, scores)
             
             return scores
             
@@ -138,55 +190,89 @@ class MLPredictor:
             logger.error(f"Error training ML models: {e}")
             return {}
     
-    def predict(self, current_data):
+    def train_async(self, historical_data, symbol):
+        """
+        Train on the registry's background worker
+        
+        Returns immediately; the new version is picked up by the next
+        load_models(symbol). Returns False if training is already queued.
+        """
+        data = historical_data.copy()
+        return self.registry.train_async(symbol, lambda: self._fit_bundle(data)[0])
+    
+    def latest_features(self, df, symbol=None):
+        """Feature row for the most recent candle (incremental when symbol is given)"""
+        return self.features.latest(symbol, df)
+    
+    def predict(self, current_data, symbol=None):
         """Predict next move using ensemble of models"""
+        return self.predict_batch({symbol: current_data})[symbol]
+    
+    def predict_batch(self, data_by_symbol: Dict) -> Dict[str, Tuple[Optional[str], float]]:
+        """
+        Predict next move for many symbols at once
+        
+        The latest feature row of every symbol is stacked into one matrix,
+        so each ensemble member is called once per batch instead of twice
+        per symbol. Returns {symbol: (signal, confidence)}; symbols whose
+        features can't be built get (None, 0.0).
+        """
+        results = {symbol: (None, 0.0) for symbol in data_by_symbol}
         if not self.is_trained:
-            return None, 0.0
+            return results
+        
+        symbols = []
+        rows = []
+        for symbol, df in data_by_symbol.items():
+            try:
+                rows.append(self.latest_features(df, symbol))
+                symbols.append(symbol)
+            except Exception as e:
+                logger.error(f"Error preparing features for {symbol}: {e}")
+        
+        if not rows:
+            return results
         
         try:
-            # Prepare features
-            features = self.prepare_features(current_data)
-            
-            # Get last row
-            X = features.iloc[-1:][self.feature_columns]
+            X = pd.DataFrame(rows).reindex(columns=self.feature_columns).fillna(0)
             X_scaled = self.scaler.transform(X)
             
-            # Get predictions from all models
+            # One call per model for the whole batch
             predictions = []
             probabilities = []
             
             for name, model in self.models.items():
-                pred = model.predict(X_scaled)[0]
-                predictions.append(pred)
-                
-                # Get probability if available
                 if hasattr(model, 'predict_proba'):
-                    proba = model.predict_proba(X_scaled)[0]
+                    proba = model.predict_proba(X_scaled)
                     probabilities.append(proba)
+                    # Same as model.predict, without a second pass over the trees
+                    predictions.append(model.classes_[np.argmax(proba, axis=1)])
+                else:
+                    predictions.append(model.predict(X_scaled))
             
-            # Ensemble prediction (majority vote)
-            ensemble_pred = np.sign(np.mean(predictions))
+            # Ensemble prediction (majority vote), per row
+            ensemble_pred = np.sign(np.mean(predictions, axis=0))
             
             # Average confidence
             if probabilities:
-                avg_proba = np.mean(probabilities, axis=0)
-                confidence = np.max(avg_proba)
+                confidence = np.max(np.mean(probabilities, axis=0), axis=1)
             else:
-                confidence = 0.6
+                confidence = np.full(len(symbols), 0.6)
             
-            # Convert to signal
-            if ensemble_pred > 0:
-                signal = 'buy'
-            elif ensemble_pred < 0:
-                signal = 'sell'
-            else:
-                signal = 'hold'
-            
-            return signal, confidence
+            for i, symbol in enumerate(symbols):
+                # Convert to signal
+                if ensemble_pred[i] > 0:
+                    signal = 'buy'
+                elif ensemble_pred[i] < 0:
+                    signal = 'sell'
+                else:
+                    signal = 'hold'
+                results[symbol] = (signal, float(confidence[i]))
             
         except Exception as e:
             logger.error(f"Error making prediction: {e}")
-            return None, 0.0
+        
+        return results
     
     def get_feature_importance(self):
         """Get feature importance from Random Forest"""
@@ -201,24 +287,26 @@ class MLPredictor:
         
         return importance
     
-    def save_models(self, symbol):
-        """Save trained models to disk"""
+    def save_models(self, symbol, scores=None):
+        """Save trained models as a new artifact version"""
         try:
-            joblib.dump(self.models, f'models/ml_models_{symbol}.pkl')
-            joblib.dump(self.scaler, f'models/scaler_{symbol}.pkl')
-            joblib.dump(self.feature_columns, f'models/features_{symbol}.pkl')
-            logger.info(f"Models saved for {symbol}")
+            version = self.registry.save(symbol, {
+                'models': self.models,
+                'scaler': self.scaler,
+                'feature_columns': self.feature_columns
+            }, {'scores': scores or {}})
+            logger.info(f"Models saved for {symbol} (v{version})")
         except Exception as e:
             logger.error(f"Error saving models: {e}")
     
     def load_models(self, symbol):
-        """Load trained models from disk"""
+        """Load trained models (memory cache, else memory-mapped from disk)"""
         try:
-            self.models = joblib.load(f'models/ml_models_{symbol}.pkl')
-            self.scaler = joblib.load(f'models/scaler_{symbol}.pkl')
-            self.feature_columns = joblib.load(f'models/features_{symbol}.pkl')
-            self.is_trained = True
-            logger.info(f"Models loaded for {symbol}")
+            bundle = self.registry.get(symbol)
+            if bundle is None:
+                return False
+            self._use_bundle(bundle)
+            logger.debug(f"Models loaded for {symbol}")
             return True
         except Exception as e:
             logger.error(f"Error loading models: {e}")
@@ -259,34 +347,29 @@ class MarketRegimeDetector:
     def __init__(self):
         self.regimes = ['trending_up', 'trending_down', 'ranging', 'volatile']
     
-    def detect_regime(self, df):
-        """Detect current market regime"""
-        # Calculate indicators
-        returns = df['close'].pct_change()
-        volatility = returns.rolling(window=20).std()
-        
-        # Trend strength (ADX-like)
-        high_low = df['high'] - df['low']
-        high_close = abs(df['high'] - df['close'].shift())
-        low_close = abs(df['low'] - df['close'].shift())
-        tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        atr = tr.rolling(window=14).mean()
+    def detect_regime(self, df, symbol=None, timeframe='1h'):
+        """
+        Detect current market regime
         
-        # Moving averages
-        sma_20 = df['close'].rolling(window=20).mean()
-        sma_50 = df['close'].rolling(window=50).mean()
+        With a symbol the rolling state comes from the shared regime
+        service (advanced once per bar); without one it is computed
+        from df.
+        """
+        state = regime_service.get_state(symbol, timeframe, df)
         
         # Current values
-        current_price = df['close'].iloc[-1]
-        current_vol = volatility.iloc[-1]
-        avg_vol = volatility.mean()
+        current_price = state['close']
+        current_vol = state['current_vol']
+        avg_vol = state['avg_vol']
+        sma_20 = state['sma_20']
+        sma_50 = state['sma_50']
         
         # Detect regime
         if current_vol > avg_vol * 1.5:
             regime = 'volatile'
-        elif current_price > sma_20.iloc[-1] > sma_50.iloc[-1]:
+        elif current_price > sma_20 > sma_50:
             regime = 'trending_up'
-        elif current_price < sma_20.iloc[-1] < sma_50.iloc[-1]:
+        elif current_price < sma_20 < sma_50:
             regime = 'trending_down'
         else:
             regime = 'ranging'
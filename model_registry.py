@@ -0,0 +1,235 @@
+"""
+Model Artifact Registry
+Versioned joblib artifacts per symbol on disk, lazily memory-mapped into
+a size-capped LRU, with training pushed to a background worker so a
+missing model never blocks the signal path.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from lazy_imports import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Only needed once a bundle is actually saved or loaded
+joblib = lazy_import('joblib')
+
+DEFAULT_MAX_IN_MEMORY = 16
+DEFAULT_KEEP_VERSIONS = 3
+DEFAULT_MISS_TTL = 60.0  # seconds before a missing artifact is looked for again
+BUNDLE_FILE = 'bundle.joblib'
+MANIFEST_FILE = 'manifest.json'
+
+
+def _safe_name(symbol: str) -> str:
+    """'BTC/USDT' -> 'BTC_USDT', usable as a directory name"""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', symbol)
+
+
+class ModelRegistry:
+    """
+    Per-symbol model bundles (any picklable dict: models, scaler, feature list)
+
+    Layout: <root>/<symbol>/v<N>/bundle.joblib plus <root>/<symbol>/manifest.json,
+    which names the latest version. A version directory is written under
+    a temporary name and renamed into place, so readers never see half a
+    model. Loading uses joblib's mmap_mode so the large numpy arrays
+    inside tree ensembles are paged in on demand and shared between
+    processes instead of copied.
+    """
+
+    def __init__(self, root: str = 'models', max_in_memory: int = DEFAULT_MAX_IN_MEMORY,
+                 keep_versions: int = DEFAULT_KEEP_VERSIONS, mmap_mode: Optional[str] = 'r',
+                 miss_ttl: float = DEFAULT_MISS_TTL, training_workers: int = 1):
+        self.root = root
+        self.max_in_memory = max_in_memory
+        self.keep_versions = keep_versions
+        self.mmap_mode = mmap_mode
+        self.miss_ttl = miss_ttl
+
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self._missing: Dict[str, float] = {}
+        self._training = set()
+        self._pool = ThreadPoolExecutor(max_workers=training_workers, thread_name_prefix='model-train')
+
+        self.stats = {'hits': 0, 'loads': 0, 'misses': 0, 'evictions': 0,
+                      'trained': 0, 'train_errors': 0}
+
+    # ------------------------------------------------------------------
+    # Disk
+    # ------------------------------------------------------------------
+
+    def _symbol_dir(self, symbol: str) -> str:
+        return os.path.join(self.root, _safe_name(symbol))
+
+    def _read_manifest(self, symbol: str) -> Optional[Dict]:
+        path = os.path.join(self._symbol_dir(symbol), MANIFEST_FILE)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def versions(self, symbol: str) -> List[int]:
+        """Versions on disk for a symbol, oldest first"""
+        try:
+            names = os.listdir(self._symbol_dir(symbol))
+        except OSError:
+            return []
+        return sorted(int(n[1:]) for n in names if re.fullmatch(r'v\d+', n))
+
+    def save(self, symbol: str, bundle: Dict, metadata: Optional[Dict] = None) -> int:
+        """Write a new version of a symbol's bundle and make it current"""
+        symbol_dir = self._symbol_dir(symbol)
+        os.makedirs(symbol_dir, exist_ok=True)
+
+        with self._lock:
+            version = (self.versions(symbol) or [0])[-1] + 1
+            tmp_dir = os.path.join(symbol_dir, f'.v{version}.tmp')
+            final_dir = os.path.join(symbol_dir, f'v{version}')
+
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            # Uncompressed so the arrays can be memory-mapped on load
+            joblib.dump(bundle, os.path.join(tmp_dir, BUNDLE_FILE))
+            os.rename(tmp_dir, final_dir)
+
+            manifest = {
+                'symbol': symbol,
+                'version': version,
+                'saved_at': time.time(),
+                'metadata': metadata or {},
+            }
+            manifest_tmp = os.path.join(symbol_dir, MANIFEST_FILE + '.tmp')
+            with open(manifest_tmp, 'w') as f:
+                json.dump(manifest, f, default=str)
+            os.replace(manifest_tmp, os.path.join(symbol_dir, MANIFEST_FILE))
+
+            self._missing.pop(symbol, None)
+            self._put(symbol, bundle)
+            self._prune(symbol)
+
+        logger.info(f"Saved model bundle {symbol} v{version}")
+        return version
+
+    def _prune(self, symbol: str):
+        for version in self.versions(symbol)[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self._symbol_dir(symbol), f'v{version}'), ignore_errors=True)
+
+    def _load(self, symbol: str, version: Optional[int] = None) -> Optional[Dict]:
+        if version is None:
+            manifest = self._read_manifest(symbol)
+            if not manifest:
+                return None
+            version = manifest['version']
+        path = os.path.join(self._symbol_dir(symbol), f'v{version}', BUNDLE_FILE)
+        if not os.path.exists(path):
+            return None
+        bundle = joblib.load(path, mmap_mode=self.mmap_mode)
+        self.stats['loads'] += 1
+        return bundle
+
+    # ------------------------------------------------------------------
+    # Memory (LRU)
+    # ------------------------------------------------------------------
+
+    def _put(self, symbol: str, bundle: Dict):
+        with self._lock:
+            self._cache[symbol] = bundle
+            self._cache.move_to_end(symbol)
+            while len(self._cache) > self.max_in_memory:
+                evicted, _ = self._cache.popitem(last=False)
+                self.stats['evictions'] += 1
+                logger.debug(f"Evicted model bundle {evicted} from memory")
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Current bundle for a symbol: memory, then disk, else None"""
+        with self._lock:
+            bundle = self._cache.get(symbol)
+            if bundle is not None:
+                self._cache.move_to_end(symbol)
+                self.stats['hits'] += 1
+                return bundle
+            if time.monotonic() - self._missing.get(symbol, float('-inf')) < self.miss_ttl:
+                self.stats['misses'] += 1
+                return None
+
+        try:
+            bundle = self._load(symbol)
+        except Exception as e:
+            logger.error(f"Error loading model bundle for {symbol}: {e}")
+            bundle = None
+
+        with self._lock:
+            if bundle is None:
+                # Remember the miss so the signal loop doesn't stat() every bar
+                self._missing[symbol] = time.monotonic()
+                self.stats['misses'] += 1
+                return None
+            self._put(symbol, bundle)
+        return bundle
+
+    def put(self, symbol: str, bundle: Dict):
+        """Hold a bundle in memory without writing it to disk"""
+        with self._lock:
+            self._missing.pop(symbol, None)
+            self._put(symbol, bundle)
+
+    def evict(self, symbol: str):
+        with self._lock:
+            self._cache.pop(symbol, None)
+
+    # ------------------------------------------------------------------
+    # Background training
+    # ------------------------------------------------------------------
+
+    def is_training(self, symbol: str) -> bool:
+        return symbol in self._training
+
+    def train_async(self, symbol: str, train_fn: Callable[[], Optional[Dict]],
+                    persist: bool = True) -> bool:
+        """
+        Queue train_fn on the training worker; its bundle becomes current
+
+        Returns False if a training run for the symbol is already queued.
+        train_fn returns the bundle (or None if there wasn't enough data).
+        """
+        with self._lock:
+            if symbol in self._training:
+                return False
+            self._training.add(symbol)
+        self._pool.submit(self._run_training, symbol, train_fn, persist)
+        return True
+
+    def _run_training(self, symbol: str, train_fn, persist: bool):
+        started = time.perf_counter()
+        try:
+            bundle = train_fn()
+            if bundle is None:
+                return
+            if persist:
+                self.save(symbol, bundle, {'train_seconds': round(time.perf_counter() - started, 3)})
+            else:
+                self.put(symbol, bundle)
+            self.stats['trained'] += 1
+        except Exception as e:
+            self.stats['train_errors'] += 1
+            logger.error(f"Background training failed for {symbol}: {e}")
+        finally:
+            with self._lock:
+                self._training.discard(symbol)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['in_memory'] = len(self._cache)
+        stats['training'] = len(self._training)
+        return stats
@@ -4,10 +4,22 @@ Much easier than SQL - no complex queries needed!
 Uses MongoDB Atlas (free cloud database) or local MongoDB
 """
 from pymongo import MongoClient
-from datetime import datetime
+from bson import ObjectId
+from datetime import datetime, timedelta
 import pandas as pd
 import os
 from colorama import Fore, Style
+from trade_rollups import TradeRollups, CLOSED_TRADE_MATCH, PNL_EXPR
+from trade_analytics import TradeAnalytics
+from pagination import fetch_page
+from write_behind import WriteBehindBuffer
+from timeseries_store import TimeSeriesStore
+from index_schema import ensure_indexes
+from query_profiler import ProfiledDatabase, query_profiler
+import config
+from data_export import (
+    DEFAULT_BATCH_SIZE, iter_mongo_batches, scan_schema, write_export, export_filename
+)
 
 
 class MongoTradingDatabase:
@@ -29,8 +41,15 @@ class MongoTradingDatabase:
             # Connect to MongoDB
             self.client = MongoClient(self.connection_string)
             
-            # Create/use database
+            # Create/use database; with the profiler on, every query
+            # shape is timed, and sampled with explain if QUERY_PROFILER_EXPLAIN
+            # is set (query_profiler.py)
             self.db = self.client['trading_bot']
+            self.profiler = query_profiler if config.QUERY_PROFILER_ENABLED else None
+            if self.profiler:
+                self.profiler.slow_ms = config.QUERY_PROFILER_SLOW_MS
+                self.profiler.explain = config.QUERY_PROFILER_EXPLAIN
+                self.db = ProfiledDatabase(self.db, self.profiler)
             
             # Collections (like tables in SQL, but easier!)
             self.trades = self.db['trades']
@@ -38,12 +57,41 @@ class MongoTradingDatabase:
             self.signals = self.db['signals']
             self.strategy_performance = self.db['strategy_performance']
             
+            # Pre-aggregated per-user / per-bot P&L counters
+            self.rollups = TradeRollups(self.db)
+            
+            # Per-user win/loss, hold-time, hour/symbol and drawdown
+            # aggregates updated on every close (trade_analytics.py)
+            self.analytics = TradeAnalytics(self.db)
+            
             # Test connection
             self.client.server_info()
             
             # Create indexes for faster queries
             self._create_indexes()
             
+            # Signals, snapshots and strategy counters are written in
+            # batches from a background thread (see write_behind.py)
+            self.writer = WriteBehindBuffer(self.db)
+            
+            # Signals, performance snapshots and price samples are
+            # time-series collections that expire by themselves
+            self.timeseries = TimeSeriesStore(
+                self.db,
+                self.writer,
+                signal_days=config.SIGNAL_RETENTION_DAYS,
+                snapshot_days=config.SNAPSHOT_RETENTION_DAYS,
+                price_days=config.PRICE_SAMPLE_RETENTION_DAYS
+            )
+            try:
+                self.timeseries.ensure()
+            except Exception as e:
+                print(f"{Fore.YELLOW}⚠️  Could not set up time-series collections: {e}{Style.RESET_ALL}")
+            # 1m/1h/1d bars are kept current in the background, so raw
+            # samples are rolled up before they expire and reads stay cheap
+            if config.TIMESERIES_ROLLUPS_ENABLED:
+                self.timeseries.start()
+            
             print(f"{Fore.GREEN}✅ MongoDB connected successfully!{Style.RESET_ALL}")
             
         except Exception as e:
@@ -52,16 +100,10 @@ class MongoTradingDatabase:
             raise
     
     def _create_indexes(self):
-        """Create indexes for faster queries"""
-        # Index on symbol for faster lookups
-        self.trades.create_index('symbol')
-        self.trades.create_index('status')
-        self.trades.create_index('entry_time')
-        
-        self.signals.create_index('symbol')
-        self.signals.create_index('timestamp')
-        
-        self.performance.create_index('date', unique=True)
+        """Create every index declared in index_schema.py"""
+        result = ensure_indexes(self.db)
+        if result['failed']:
+            print(f"{Fore.YELLOW}⚠️  {result['failed']} index(es) could not be created{Style.RESET_ALL}")
     
     def save_trade(self, trade_data):
         """
@@ -113,18 +155,17 @@ class MongoTradingDatabase:
             print(f"{Fore.RED}❌ Error updating trade: {e}{Style.RESET_ALL}")
             return False
     
-    def get_trades(self, limit=100, status=None):
+    def get_trades(self, limit=100, status=None, projection=None, cursor=None):
         """
         Get trades - Super simple!
+        
+        Newest first by entry_time. Pass the cursor from get_trades_page
+        to continue where the previous page stopped.
         """
         try:
-            # Build query
-            query = {}
-            if status:
-                query['status'] = status
-            
-            # Get trades (sorted by newest first)
-            trades = list(self.trades.find(query).sort('entry_time', -1).limit(limit))
+            trades, _ = self.get_trades_page(
+                limit=limit, status=status, projection=projection, cursor=cursor
+            )
             
             # Convert to DataFrame for easy viewing
             if trades:
@@ -140,6 +181,27 @@ class MongoTradingDatabase:
             print(f"{Fore.RED}❌ Error getting trades: {e}{Style.RESET_ALL}")
             return pd.DataFrame()
     
+    def get_trades_page(self, limit=100, status=None, projection=None, cursor=None,
+                        sort_field='entry_time', **filters):
+        """
+        Get one keyset-paginated page of trades
+        
+        Returns (trades, next_cursor); next_cursor is None on the last page.
+        Extra keyword arguments are added to the query (e.g. user_id=...).
+        """
+        query = dict(filters)
+        if status:
+            query['status'] = status
+        
+        return fetch_page(
+            self.trades,
+            query,
+            projection=projection,
+            limit=limit,
+            cursor=cursor,
+            sort_field=sort_field
+        )
+    
     def get_open_trades(self):
         """Get all open trades"""
         return self.get_trades(status='open')
@@ -156,8 +218,9 @@ class MongoTradingDatabase:
             # MongoDB needs datetime, not date!
             today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
             
-            # Upsert (update if exists, insert if not)
-            self.performance.update_one(
+            # Upsert (update if exists, insert if not) - queued, not blocking
+            self.writer.update(
+                'performance',
                 {'date': today},
                 {
                     '$set': {
@@ -174,6 +237,14 @@ class MongoTradingDatabase:
                 upsert=True
             )
             
+            # Intraday history; the daily document above is its 1d rollup
+            self.timeseries.record_snapshot({
+                'capital': stats['current_capital'],
+                'daily_pnl': stats['daily_pnl'],
+                'total_trades': stats['total_trades'],
+                'win_rate': stats['win_rate']
+            })
+            
         except Exception as e:
             print(f"{Fore.RED}❌ Error saving performance: {e}{Style.RESET_ALL}")
     
@@ -202,16 +273,33 @@ class MongoTradingDatabase:
     def save_signal(self, signal_data):
         """
         Save trading signal - Just pass a dictionary!
+        
+        The insert is queued and written in the next batch; the id is
+        assigned up front so callers still get it back immediately.
         """
         try:
-            signal_data['timestamp'] = datetime.now()
-            result = self.signals.insert_one(signal_data)
-            return str(result.inserted_id)
+            # Queue a copy: the caller's dict may be reused or mutated
+            # before the flusher gets to it
+            document = {**signal_data, 'timestamp': datetime.now()}
+            document.setdefault('_id', ObjectId())
+            self.writer.insert('signals', document)
+            return str(document['_id'])
             
         except Exception as e:
             print(f"{Fore.RED}❌ Error saving signal: {e}{Style.RESET_ALL}")
             return None
     
+    def record_price(self, symbol, price, timestamp=None):
+        """Queue a price sample for the 1m/1h/1d chart rollups"""
+        try:
+            self.timeseries.record_price(symbol, price, timestamp)
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error recording price: {e}{Style.RESET_ALL}")
+    
+    def get_price_history(self, symbol, interval='1h', limit=168):
+        """OHLC bars for charts from the rollup tier matching interval (1m, 1h, 1d)"""
+        return self.timeseries.history(symbol, interval, limit)
+    
     def get_signals(self, symbol=None, limit=100):
         """Get trading signals"""
         try:
@@ -238,45 +326,44 @@ class MongoTradingDatabase:
             return pd.DataFrame()
     
     def update_strategy_performance(self, strategy_name, symbol, success):
-        """Update strategy performance metrics"""
+        """
+        Update strategy performance metrics
+        
+        One queued upsert: counters are incremented and win_rate derived
+        server-side, so no read is needed first.
+        """
         try:
-            # Find existing record
-            existing = self.strategy_performance.find_one({
-                'strategy_name': strategy_name,
-                'symbol': symbol
-            })
-            
-            if existing:
-                # Update existing
-                total = existing['total_signals'] + 1
-                successful = existing['successful_signals'] + (1 if success else 0)
-                win_rate = (successful / total) * 100
-                
-                self.strategy_performance.update_one(
-                    {'strategy_name': strategy_name, 'symbol': symbol},
-                    {
-                        '$set': {
-                            'total_signals': total,
-                            'successful_signals': successful,
-                            'win_rate': win_rate,
-                            'last_updated': datetime.now()
-                        }
-                    }
-                )
-            else:
-                # Create new
-                self.strategy_performance.insert_one({
-                    'strategy_name': strategy_name,
-                    'symbol': symbol,
-                    'total_signals': 1,
-                    'successful_signals': 1 if success else 0,
-                    'win_rate': 100 if success else 0,
-                    'last_updated': datetime.now()
-                })
+            successful_inc = 1 if success else 0
+            self.writer.update(
+                'strategy_performance',
+                {'strategy_name': strategy_name, 'symbol': symbol},
+                [
+                    {'$set': {
+                        'total_signals': {'$add': [{'$ifNull': ['$total_signals', 0]}, 1]},
+                        'successful_signals': {'$add': [{'$ifNull': ['$successful_signals', 0]}, successful_inc]},
+                        'last_updated': datetime.now()
+                    }},
+                    {'$set': {
+                        'win_rate': {'$multiply': [
+                            {'$divide': ['$successful_signals', '$total_signals']}, 100
+                        ]}
+                    }}
+                ],
+                upsert=True
+            )
                 
         except Exception as e:
             print(f"{Fore.RED}❌ Error updating strategy: {e}{Style.RESET_ALL}")
     
+    def flush_writes(self):
+        """Write any queued signals / snapshots / strategy updates now"""
+        return self.writer.flush()
+    
+    @property
+    def write_queue_depth(self):
+        """Number of queued writes not yet sent to MongoDB"""
+        return self.writer.queue_depth
+    
     def get_strategy_performance(self):
         """Get strategy performance metrics"""
         try:
@@ -297,91 +384,154 @@ class MongoTradingDatabase:
             print(f"{Fore.RED}❌ Error getting strategy performance: {e}{Style.RESET_ALL}")
             return pd.DataFrame()
     
-    def get_statistics(self):
+    def get_statistics(self, user_id=None, bot_id=None, start=None, end=None,
+                       time_field='timestamp'):
         """
-        Get comprehensive statistics - MongoDB makes this easy!
+        Get comprehensive statistics - one aggregation, computed server-side!
+        
+        Everything (totals, gross wins/losses, profit factor, per-symbol and
+        per-strategy breakdowns) comes out of a single $facet pass, so memory
+        use doesn't grow with the number of trades.
+        
+        Filters: user_id, bot_id and a [start, end] range on time_field.
+        Round trips are counted once (CLOSED_TRADE_MATCH) with P&L derived
+        from prices where the trade has no `pnl` (PNL_EXPR), as in rollups.
         """
+        empty = {
+            'total_trades': 0,
+            'winning_trades': 0,
+            'losing_trades': 0,
+            'win_rate': 0,
+            'total_pnl': 0,
+            'avg_win': 0,
+            'avg_loss': 0,
+            'gross_profit': 0,
+            'gross_loss': 0,
+            'profit_factor': 0,
+            'by_symbol': [],
+            'by_strategy': []
+        }
+        
         try:
-            # Use MongoDB aggregation (powerful but simple)
-            pipeline = [
-                {'$match': {'status': 'closed'}},
-                {'$group': {
-                    '_id': None,
+            match = dict(CLOSED_TRADE_MATCH)
+            if user_id:
+                match['user_id'] = str(user_id)
+            if bot_id:
+                match['bot_id'] = str(bot_id)
+            if start or end:
+                match[time_field] = {}
+                if start:
+                    match[time_field]['$gte'] = start
+                if end:
+                    match[time_field]['$lte'] = end
+            
+            def group_stats(key):
+                return {
+                    '_id': key,
                     'total_trades': {'$sum': 1},
                     'total_pnl': {'$sum': '$pnl'},
                     'winning_trades': {
                         '$sum': {'$cond': [{'$gt': ['$pnl', 0]}, 1, 0]}
                     },
+                    'gross_profit': {
+                        '$sum': {'$cond': [{'$gt': ['$pnl', 0]}, '$pnl', 0]}
+                    },
+                    'gross_loss': {
+                        '$sum': {'$cond': [{'$lt': ['$pnl', 0]}, {'$abs': '$pnl'}, 0]}
+                    },
                     'avg_win': {
                         '$avg': {'$cond': [{'$gt': ['$pnl', 0]}, '$pnl', None]}
                     },
                     'avg_loss': {
                         '$avg': {'$cond': [{'$lt': ['$pnl', 0]}, '$pnl', None]}
                     }
+                }
+            
+            pipeline = [
+                {'$match': match},
+                {'$project': {'pnl': PNL_EXPR, 'symbol': 1, 'strategy': 1}},
+                {'$facet': {
+                    'overall': [{'$group': group_stats(None)}],
+                    'by_symbol': [
+                        {'$group': group_stats('$symbol')},
+                        {'$sort': {'total_pnl': -1}}
+                    ],
+                    'by_strategy': [
+                        {'$group': group_stats({'$ifNull': ['$strategy', 'unknown']})},
+                        {'$sort': {'total_pnl': -1}}
+                    ]
                 }}
             ]
             
             result = list(self.trades.aggregate(pipeline))
+            facets = result[0] if result else {}
             
-            if result:
-                stats = result[0]
-                total_trades = stats['total_trades']
-                winning_trades = stats['winning_trades']
-                losing_trades = total_trades - winning_trades
-                
-                # Calculate profit factor
-                wins = list(self.trades.find({'status': 'closed', 'pnl': {'$gt': 0}}))
-                losses = list(self.trades.find({'status': 'closed', 'pnl': {'$lt': 0}}))
-                
-                total_wins = sum(t['pnl'] for t in wins) if wins else 0
-                total_losses = abs(sum(t['pnl'] for t in losses)) if losses else 1
-                
-                return {
-                    'total_trades': total_trades,
-                    'winning_trades': winning_trades,
-                    'losing_trades': losing_trades,
-                    'win_rate': (winning_trades / total_trades * 100) if total_trades > 0 else 0,
-                    'total_pnl': stats['total_pnl'],
-                    'avg_win': stats['avg_win'] or 0,
-                    'avg_loss': stats['avg_loss'] or 0,
-                    'profit_factor': total_wins / total_losses if total_losses > 0 else 0
-                }
-            else:
-                return {
-                    'total_trades': 0,
-                    'winning_trades': 0,
-                    'losing_trades': 0,
-                    'win_rate': 0,
-                    'total_pnl': 0,
-                    'avg_win': 0,
-                    'avg_loss': 0,
-                    'profit_factor': 0
-                }
+            if not facets.get('overall'):
+                return empty
+            
+            stats = self._format_statistics(facets['overall'][0])
+            stats['by_symbol'] = [
+                dict(self._format_statistics(row), symbol=row['_id'])
+                for row in facets.get('by_symbol', [])
+            ]
+            stats['by_strategy'] = [
+                dict(self._format_statistics(row), strategy=row['_id'])
+                for row in facets.get('by_strategy', [])
+            ]
+            return stats
                 
         except Exception as e:
             print(f"{Fore.RED}❌ Error getting statistics: {e}{Style.RESET_ALL}")
             return {}
     
+    @staticmethod
+    def _format_statistics(row):
+        """Turn one $group row into the public statistics shape"""
+        total_trades = row['total_trades']
+        winning_trades = row['winning_trades']
+        gross_profit = row.get('gross_profit') or 0
+        gross_loss = row.get('gross_loss') or 0
+        
+        return {
+            'total_trades': total_trades,
+            'winning_trades': winning_trades,
+            'losing_trades': total_trades - winning_trades,
+            'win_rate': (winning_trades / total_trades * 100) if total_trades > 0 else 0,
+            'total_pnl': row.get('total_pnl') or 0,
+            'avg_win': row.get('avg_win') or 0,
+            'avg_loss': row.get('avg_loss') or 0,
+            'gross_profit': gross_profit,
+            'gross_loss': gross_loss,
+            # No losing trades yet: profit factor falls back to gross profit
+            'profit_factor': gross_profit / (gross_loss or 1)
+        }
+    
     def export_to_csv(self, collection_name, filename=None):
         """Export collection to CSV"""
+        return self.export(collection_name, filename=filename, fmt='csv')
+    
+    def export(self, collection_name, filename=None, fmt='csv', query=None,
+               batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Export a collection to CSV or Parquet
+        
+        Reads the collection in batches and writes each batch as it
+        arrives, so memory stays flat regardless of collection size.
+        """
         try:
             if filename is None:
-                filename = f"{collection_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                filename = export_filename(collection_name, fmt)
             
-            # Get collection
-            collection = self.db[collection_name]
-            data = list(collection.find())
+            # One pass for the columns and their types, one to write
+            def batches():
+                return iter_mongo_batches(self.db[collection_name], query, batch_size=batch_size)
+            written = write_export(batches(), filename, fmt, schema=scan_schema(batches()))
             
-            if data:
-                df = pd.DataFrame(data)
-                # Convert ObjectId to string
-                if '_id' in df.columns:
-                    df['_id'] = df['_id'].astype(str)
-                
-                df.to_csv(filename, index=False)
+            if written:
                 print(f"{Fore.GREEN}✅ Exported {collection_name} to {filename}{Style.RESET_ALL}")
                 return filename
             else:
+                os.remove(filename)
                 print(f"{Fore.YELLOW}⚠️  No data to export{Style.RESET_ALL}")
                 return None
                 
@@ -390,14 +540,20 @@ class MongoTradingDatabase:
             return None
     
     def cleanup_old_data(self, days=90):
-        """Clean up old signals"""
+        """
+        Clean up signals older than `days`
+        
+        MongoDB already expires signals after the configured retention
+        (TTL), so this only deletes anything when `days` is shorter.
+        Use set_signal_retention() to change the retention itself.
+        """
         try:
-            from datetime import timedelta
-            cutoff_date = datetime.now() - timedelta(days=days)
+            retention = next(spec.ttl_days for spec in self.timeseries.specs if spec.name == 'signals')
+            if retention and days >= retention:
+                return 0
             
-            result = self.signals.delete_many({
-                'timestamp': {'$lt': cutoff_date}
-            })
+            cutoff_date = datetime.now() - timedelta(days=days)
+            result = self.signals.delete_many({'timestamp': {'$lt': cutoff_date}})
             
             print(f"{Fore.YELLOW}🗑️  Cleaned up {result.deleted_count} old signals{Style.RESET_ALL}")
             return result.deleted_count
@@ -406,8 +562,18 @@ class MongoTradingDatabase:
             print(f"{Fore.RED}❌ Error cleaning up: {e}{Style.RESET_ALL}")
             return 0
     
+    def set_signal_retention(self, days):
+        """Keep signals for `days` from now on (MongoDB expires them via TTL)"""
+        try:
+            self.timeseries.set_retention('signals', days)
+            print(f"{Fore.YELLOW}🗑️  Signals now expire after {days} days{Style.RESET_ALL}")
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error setting signal retention: {e}{Style.RESET_ALL}")
+    
     def close(self):
-        """Close MongoDB connection"""
+        """Close MongoDB connection (after flushing queued writes)"""
+        self.timeseries.close()
+        self.writer.close()
         self.client.close()
         print(f"{Fore.YELLOW}MongoDB connection closed{Style.RESET_ALL}")
 
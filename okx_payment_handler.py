@@ -9,6 +9,9 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, List
 import config
 from mongodb_database import MongoTradingDatabase
+from deposit_reconciler import DepositReconciler
+from price_quotes import PriceQuoteService
+from principal_cache import principal_cache
 
 class OKXPaymentHandler:
     """Handle crypto payments through admin OKX account"""
@@ -30,6 +33,18 @@ class OKXPaymentHandler:
         
         # Supported cryptocurrencies
         self.supported_cryptos = ['BTC', 'ETH', 'USDT', 'USDC', 'SOL', 'BNB']
+        
+        # Matches all pending payments against one deposit fetch per currency
+        self.reconciler = DepositReconciler(
+            self.exchange,
+            self.db.db['payments'],
+            self.db.db['payment_reconciliation'],
+            confirm=self._confirm_payment,
+            is_match=self._is_matching_deposit
+        )
+        
+        # All payment-currency prices, refreshed in one fetch_tickers call
+        self.quotes = PriceQuoteService(self.exchange, self.supported_cryptos)
     
     def generate_payment_id(self, user_id: str, plan: str) -> str:
         """Generate unique payment ID"""
@@ -38,24 +53,8 @@ class OKXPaymentHandler:
         return hashlib.sha256(data.encode()).hexdigest()[:16]
     
     def get_crypto_price(self, crypto: str) -> float:
-        """Get current crypto price in USD"""
-        # Stablecoins are always $1
-        if crypto in ['USDT', 'USDC', 'DAI', 'BUSD']:
-            return 1.0
-            
-        try:
-            ticker = self.exchange.fetch_ticker(f'{crypto}/USDT')
-            return ticker['last']
-        except Exception as e:
-            print(f"Error fetching {crypto} price: {e}")
-            # Fallback prices
-            fallback_prices = {
-                'BTC': 45000,
-                'ETH': 3000,
-                'SOL': 100,
-                'BNB': 300,
-            }
-            return fallback_prices.get(crypto, 1)
+        """Get current crypto price in USD (from the in-memory quote cache)"""
+        return self.quotes.get_price(crypto)
     
     def calculate_crypto_amount(self, plan: str, crypto: str) -> float:
         """Calculate how much crypto user needs to send"""
@@ -330,6 +329,7 @@ class OKXPaymentHandler:
                 'last_payment_amount': payment['amount_usd']
             }}
         )
+        principal_cache.invalidate(user_id=payment['user_id'])
         
         return {
             'status': 'completed',
@@ -339,22 +339,18 @@ class OKXPaymentHandler:
         }
     
     def check_all_pending_payments(self):
-        """Background job to check all pending payments"""
-        
-        pending_payments = self.db.db['payments'].find({
-            'status': 'pending',
-            'expires_at': {'$gt': datetime.utcnow()}
-        })
+        """
+        Background job to check all pending payments
         
-        confirmed_count = 0
+        Deposits are fetched once per currency and matched against every
+        pending payment (see DepositReconciler).
+        """
+        result = self.reconciler.reconcile()
         
-        for payment in pending_payments:
-            result = self.check_payment_status(payment['payment_id'])
-            if result['status'] == 'completed':
-                confirmed_count += 1
-                print(f"✅ Payment confirmed: {payment['payment_id']}")
+        if result['errors']:
+            print(f"⚠️ Reconciliation finished with {result['errors']} currency error(s)")
         
-        return confirmed_count
+        return result['confirmed']
     
     def get_payment_history(self, user_id: str) -> list:
         """Get user's payment history"""
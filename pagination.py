@@ -0,0 +1,146 @@
+"""
+Keyset Pagination for MongoDB collections
+Pages are addressed by an opaque cursor holding the (sort field, _id) of
+the last row returned, so page N costs the same as page 1 and the API
+never skips over (or holds) the rows in front of it.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we didn't issue"""
+
+
+def encode_cursor(sort_value, doc_id) -> str:
+    """Pack the last row's (sort value, _id) into a URL-safe token"""
+    if isinstance(sort_value, datetime):
+        value = {'t': 'dt', 'v': sort_value.isoformat()}
+    else:
+        value = {'t': 'raw', 'v': sort_value}
+    raw = json.dumps({'s': value, 'id': str(doc_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[object, ObjectId]:
+    """Inverse of encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        value = data['s']
+        sort_value = datetime.fromisoformat(value['v']) if value['t'] == 'dt' else value['v']
+        return sort_value, ObjectId(data['id'])
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def keyset_filter(query: Dict, sort_field: str, cursor: Optional[str]) -> Dict:
+    """
+    Add the "after this cursor" condition to a query
+
+    Rows are walked newest-first on (sort_field, _id), so the next page
+    is everything strictly older than the last row, with _id breaking ties.
+    """
+    if not cursor:
+        return query
+
+    last_value, last_id = decode_cursor(cursor)
+    if last_value is None:
+        # Rows without a sort value sort last; only _id is left to page on
+        after = {sort_field: None, '_id': {'$lt': last_id}}
+    else:
+        after = {'$or': [
+            {sort_field: {'$lt': last_value}},
+            {sort_field: last_value, '_id': {'$lt': last_id}},
+            {sort_field: None}
+        ]}
+
+    return {'$and': [query, after]} if query else after
+
+
+def _page_cursor(collection, query, projection, limit, cursor, sort_field):
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+    if projection is not None:
+        # The cursor needs the sort key even if the caller doesn't return it
+        projection = dict(projection, **{sort_field: 1})
+
+    # One extra row tells us whether there is a next page
+    mongo_cursor = (
+        collection.find(keyset_filter(query, sort_field, cursor), projection)
+        .sort([(sort_field, -1), ('_id', -1)])
+        .limit(limit + 1)
+    )
+    return mongo_cursor, limit
+
+
+def fetch_page(collection, query: Dict, projection: Optional[Dict] = None,
+               limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+               sort_field: str = 'timestamp') -> Tuple[List[Dict], Optional[str]]:
+    """
+    Fetch one page of documents, newest first
+
+    Returns (documents, next_cursor); next_cursor is None on the last page.
+    """
+    mongo_cursor, limit = _page_cursor(collection, query, projection, limit, cursor, sort_field)
+    docs = list(mongo_cursor)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last['_id'])
+
+    return docs, next_cursor
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value) -> str:
+    """json.dumps that understands datetimes and ObjectIds"""
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def stream_json_page(collection, query: Dict, items_key: str,
+                     projection: Optional[Dict] = None,
+                     limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                     sort_field: str = 'timestamp',
+                     transform: Optional[Callable[[Dict], Dict]] = None) -> Iterator[str]:
+    """
+    Stream {items_key: [...], "count": n, "next_cursor": ...} row by row
+
+    Documents are pulled from the Mongo cursor and encoded one at a time,
+    so only a single row is held in memory. Meant for StreamingResponse.
+    Bad cursors raise InvalidCursor before the first chunk is produced.
+    """
+    mongo_cursor, limit = _page_cursor(collection, query, projection, limit, cursor, sort_field)
+
+    def generate():
+        count = 0
+        last = None
+        next_cursor = None
+        yield '{"' + items_key + '":['
+        for doc in mongo_cursor:
+            if count == limit:
+                # The extra row exists: there is a next page
+                next_cursor = encode_cursor(last.get(sort_field), last['_id'])
+                break
+            last = doc
+            out = transform(dict(doc)) if transform else doc
+            yield (',' if count else '') + dumps(out)
+            count += 1
+        mongo_cursor.close()
+        yield '],"count":' + str(count) + ',"next_cursor":' + dumps(next_cursor) + '}'
+
+    return generate()
@@ -1,12 +1,13 @@
 """
 Advanced Performance Analytics and Reporting
 """
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
 import logging
 
+from trade_analytics import return_percentile
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,49 +20,43 @@ class PerformanceAnalytics:
         self.db = database
         
     def get_performance_summary(self, user_id=None, days=30):
-        """Get comprehensive performance summary"""
-        # Get trades
-        if user_id:
-            trades = list(self.db.trades.find({
-                'user_id': user_id,
-                'status': 'closed',
-                'exit_time': {'$gte': datetime.now() - timedelta(days=days)}
-            }))
-        else:
-            trades = list(self.db.trades.find({
-                'status': 'closed',
-                'exit_time': {'$gte': datetime.now() - timedelta(days=days)}
-            }))
-        
-        if not trades:
-            return self._empty_summary()
+        """
+        Get comprehensive performance summary
+        
+        Built from the per-day analytics buckets every trade close
+        updates (trade_analytics.py); only the 10 most recent trades
+        are read from the trades collection.
+        """
+        stats = self.db.analytics.get_window(user_id, days)
         
-        df = pd.DataFrame(trades)
+        if not stats.get('trades'):
+            return self._empty_summary()
         
         # Calculate metrics
         summary = {
-            'overview': self._calculate_overview(df),
-            'profitability': self._calculate_profitability(df),
-            'risk_metrics': self._calculate_risk_metrics(df),
-            'strategy_performance': self._calculate_strategy_performance(df),
-            'time_analysis': self._calculate_time_analysis(df),
-            'symbol_performance': self._calculate_symbol_performance(df),
-            'recent_trades': self._get_recent_trades(df, limit=10)
+            'overview': self._calculate_overview(stats),
+            'profitability': self._calculate_profitability(stats),
+            'risk_metrics': self._calculate_risk_metrics(stats),
+            'strategy_performance': self._calculate_strategy_performance(stats),
+            'time_analysis': self._calculate_time_analysis(stats),
+            'symbol_performance': self._calculate_symbol_performance(stats),
+            'recent_trades': self._get_recent_trades(user_id, days, limit=10)
         }
         
         return summary
     
-    def _calculate_overview(self, df):
+    def _calculate_overview(self, stats):
         """Calculate overview metrics"""
-        total_trades = len(df)
-        winning_trades = len(df[df['pnl'] > 0])
-        losing_trades = len(df[df['pnl'] <= 0])
+        total_trades = stats['trades']
+        winning_trades = stats.get('wins', 0)
+        losing_trades = total_trades - winning_trades
         
-        total_pnl = df['pnl'].sum()
-        total_fees = df['fees'].sum() if 'fees' in df.columns else 0
+        total_pnl = stats.get('pnl', 0)
+        total_fees = stats.get('fees', 0)
         net_pnl = total_pnl - total_fees
         
-        avg_trade_duration = (df['exit_time'] - df['entry_time']).mean()
+        hold_count = stats.get('hold_count', 0)
+        avg_trade_seconds = stats.get('hold_seconds', 0) / hold_count if hold_count else 0
         
         return {
             'total_trades': total_trades,
@@ -71,42 +66,25 @@ class PerformanceAnalytics:
             'total_pnl': float(total_pnl),
             'net_pnl': float(net_pnl),
             'total_fees': float(total_fees),
-            'avg_trade_duration_hours': avg_trade_duration.total_seconds() / 3600 if not pd.isna(avg_trade_duration) else 0
+            'avg_trade_duration_hours': avg_trade_seconds / 3600
         }
     
-    def _calculate_profitability(self, df):
+    def _calculate_profitability(self, stats):
         """Calculate profitability metrics"""
-        winning_trades = df[df['pnl'] > 0]
-        losing_trades = df[df['pnl'] <= 0]
+        winning_trades = stats.get('wins', 0)
+        losing_trades = stats['trades'] - winning_trades
         
-        total_wins = winning_trades['pnl'].sum() if len(winning_trades) > 0 else 0
-        total_losses = abs(losing_trades['pnl'].sum()) if len(losing_trades) > 0 else 0
+        total_wins = stats.get('gross_profit', 0)
+        total_losses = stats.get('gross_loss', 0)
         
-        avg_win = winning_trades['pnl'].mean() if len(winning_trades) > 0 else 0
-        avg_loss = abs(losing_trades['pnl'].mean()) if len(losing_trades) > 0 else 0
+        avg_win = total_wins / winning_trades if winning_trades > 0 else 0
+        avg_loss = total_losses / losing_trades if losing_trades > 0 else 0
         
-        largest_win = winning_trades['pnl'].max() if len(winning_trades) > 0 else 0
-        largest_loss = abs(losing_trades['pnl'].min()) if len(losing_trades) > 0 else 0
+        largest_win = stats.get('best_trade', 0) if winning_trades > 0 else 0
+        largest_loss = abs(stats.get('worst_trade', 0)) if losing_trades > 0 else 0
         
         profit_factor = total_wins / total_losses if total_losses > 0 else float('inf')
         
-        # Calculate consecutive wins/losses
-        df_sorted = df.sort_values('exit_time')
-        win_streak = 0
-        loss_streak = 0
-        max_win_streak = 0
-        max_loss_streak = 0
-        
-        for pnl in df_sorted['pnl']:
-            if pnl > 0:
-                win_streak += 1
-                loss_streak = 0
-                max_win_streak = max(max_win_streak, win_streak)
-            else:
-                loss_streak += 1
-                win_streak = 0
-                max_loss_streak = max(max_loss_streak, loss_streak)
-        
         return {
             'total_wins': float(total_wins),
             'total_losses': float(total_losses),
@@ -116,35 +94,45 @@ class PerformanceAnalytics:
             'largest_loss': float(largest_loss),
             'profit_factor': float(profit_factor) if profit_factor != float('inf') else 999,
             'win_loss_ratio': float(avg_win / avg_loss) if avg_loss > 0 else 0,
-            'max_consecutive_wins': max_win_streak,
-            'max_consecutive_losses': max_loss_streak
+            # Streaks are lifetime; they don't split into day buckets
+            'max_consecutive_wins': stats.get('max_win_streak', 0),
+            'max_consecutive_losses': stats.get('max_loss_streak', 0)
         }
     
-    def _calculate_risk_metrics(self, df):
+    @staticmethod
+    def _std(count, total, squares):
+        """Sample standard deviation from count / sum / sum of squares"""
+        if count < 2:
+            return 0
+        mean = total / count
+        return np.sqrt(max(squares - count * mean ** 2, 0) / (count - 1))
+    
+    def _calculate_risk_metrics(self, stats):
         """Calculate risk-adjusted metrics"""
-        returns = df['pnl_pct'] if 'pnl_pct' in df.columns else df['pnl'] / df['entry_value']
+        count = stats.get('return_count', 0)
+        if not count:
+            return {}
+        mean_return = stats['return_sum'] / count
+        std = self._std(count, stats['return_sum'], stats['return_sq_sum'])
         
         # Sharpe Ratio (assuming 2% risk-free rate)
         risk_free_rate = 0.02 / 252  # Daily risk-free rate
-        excess_returns = returns - risk_free_rate
-        sharpe_ratio = (excess_returns.mean() / returns.std()) * np.sqrt(252) if returns.std() > 0 else 0
+        excess_mean = mean_return - risk_free_rate
+        sharpe_ratio = (excess_mean / std) * np.sqrt(252) if std > 0 else 0
         
         # Sortino Ratio (only downside deviation)
-        downside_returns = returns[returns < 0]
-        downside_std = downside_returns.std() if len(downside_returns) > 0 else 0
-        sortino_ratio = (excess_returns.mean() / downside_std) * np.sqrt(252) if downside_std > 0 else 0
+        downside_std = self._std(stats.get('downside_count', 0), stats.get('downside_sum', 0),
+                                 stats.get('downside_sq_sum', 0))
+        sortino_ratio = (excess_mean / downside_std) * np.sqrt(252) if downside_std > 0 else 0
         
-        # Maximum Drawdown
-        cumulative_returns = (1 + returns).cumprod()
-        running_max = cumulative_returns.expanding().max()
-        drawdown = (cumulative_returns - running_max) / running_max
-        max_drawdown = drawdown.min()
+        # Maximum Drawdown (compounded daily equity curve, %)
+        max_drawdown = stats.get('max_drawdown_pct', 0) / 100
         
         # Value at Risk (95% confidence)
-        var_95 = np.percentile(returns, 5)
+        var_95 = return_percentile(stats.get('return_hist', {}), count, 5)
         
         # Calmar Ratio
-        annual_return = returns.mean() * 252
+        annual_return = mean_return * 252
         calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else 0
         
         return {
@@ -153,98 +141,89 @@ class PerformanceAnalytics:
             'max_drawdown': float(max_drawdown * 100),
             'var_95': float(var_95 * 100),
             'calmar_ratio': float(calmar_ratio),
-            'volatility': float(returns.std() * np.sqrt(252) * 100)
+            'volatility': float(std * np.sqrt(252) * 100)
         }
     
-    def _calculate_strategy_performance(self, df):
+    def _calculate_strategy_performance(self, stats):
         """Calculate performance by strategy"""
-        if 'strategy' not in df.columns:
-            return {}
-        
         strategy_stats = {}
-        for strategy in df['strategy'].unique():
-            strategy_df = df[df['strategy'] == strategy]
-            
-            total_trades = len(strategy_df)
-            winning_trades = len(strategy_df[strategy_df['pnl'] > 0])
-            total_pnl = strategy_df['pnl'].sum()
+        for strategy, bucket in stats.get('strategies', {}).items():
+            total_trades = bucket['trades']
             
             strategy_stats[strategy] = {
                 'total_trades': total_trades,
-                'win_rate': (winning_trades / total_trades * 100) if total_trades > 0 else 0,
-                'total_pnl': float(total_pnl),
-                'avg_pnl': float(strategy_df['pnl'].mean())
+                'win_rate': (bucket['wins'] / total_trades * 100) if total_trades > 0 else 0,
+                'total_pnl': float(bucket['pnl']),
+                'avg_pnl': float(bucket['pnl'] / total_trades) if total_trades > 0 else 0
             }
         
         return strategy_stats
     
-    def _calculate_time_analysis(self, df):
+    def _calculate_time_analysis(self, stats):
         """Analyze performance by time periods"""
-        df['hour'] = pd.to_datetime(df['entry_time']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['entry_time']).dt.dayofweek
-        
-        # Performance by hour
-        hourly_performance = df.groupby('hour')['pnl'].agg(['sum', 'count', 'mean']).to_dict('index')
+        def periods(buckets):
+            return {int(k): {
+                'total_pnl': float(v['pnl']),
+                'trades': int(v['trades']),
+                'avg_pnl': float(v['pnl'] / v['trades'])
+            } for k, v in buckets.items() if v.get('trades')}
         
-        # Performance by day of week
-        daily_performance = df.groupby('day_of_week')['pnl'].agg(['sum', 'count', 'mean']).to_dict('index')
+        # Performance by hour / day of week (of entry)
+        hourly_performance = periods(stats.get('hours', {}))
+        daily_performance = periods(stats.get('weekdays', {}))
         
         # Best and worst hours
-        best_hour = df.groupby('hour')['pnl'].sum().idxmax()
-        worst_hour = df.groupby('hour')['pnl'].sum().idxmin()
+        by_total = sorted(hourly_performance, key=lambda hour: hourly_performance[hour]['total_pnl'])
         
         return {
-            'hourly_performance': {int(k): {
-                'total_pnl': float(v['sum']),
-                'trades': int(v['count']),
-                'avg_pnl': float(v['mean'])
-            } for k, v in hourly_performance.items()},
-            'daily_performance': {int(k): {
-                'total_pnl': float(v['sum']),
-                'trades': int(v['count']),
-                'avg_pnl': float(v['mean'])
-            } for k, v in daily_performance.items()},
-            'best_trading_hour': int(best_hour),
-            'worst_trading_hour': int(worst_hour)
+            'hourly_performance': hourly_performance,
+            'daily_performance': daily_performance,
+            'best_trading_hour': by_total[-1] if by_total else None,
+            'worst_trading_hour': by_total[0] if by_total else None
         }
     
-    def _calculate_symbol_performance(self, df):
+    def _calculate_symbol_performance(self, stats):
         """Calculate performance by trading symbol"""
         symbol_stats = {}
         
-        for symbol in df['symbol'].unique():
-            symbol_df = df[df['symbol'] == symbol]
-            
-            total_trades = len(symbol_df)
-            winning_trades = len(symbol_df[symbol_df['pnl'] > 0])
-            total_pnl = symbol_df['pnl'].sum()
+        for symbol, bucket in stats.get('symbols', {}).items():
+            total_trades = bucket['trades']
             
             symbol_stats[symbol] = {
                 'total_trades': total_trades,
-                'win_rate': (winning_trades / total_trades * 100) if total_trades > 0 else 0,
-                'total_pnl': float(total_pnl),
-                'avg_pnl': float(symbol_df['pnl'].mean()),
-                'best_trade': float(symbol_df['pnl'].max()),
-                'worst_trade': float(symbol_df['pnl'].min())
+                'win_rate': (bucket['wins'] / total_trades * 100) if total_trades > 0 else 0,
+                'total_pnl': float(bucket['pnl']),
+                'avg_pnl': float(bucket['pnl'] / total_trades) if total_trades > 0 else 0,
+                'best_trade': float(bucket['best']),
+                'worst_trade': float(bucket['worst'])
             }
         
         return symbol_stats
     
-    def _get_recent_trades(self, df, limit=10):
+    def _get_recent_trades(self, user_id=None, days=30, limit=10):
         """Get recent trades"""
-        recent = df.sort_values('exit_time', ascending=False).head(limit)
+        query = {
+            'status': 'closed',
+            'exit_time': {'$gte': datetime.now() - timedelta(days=days)}
+        }
+        if user_id:
+            query['user_id'] = user_id
+        recent = self.db.trades.find(query).sort('exit_time', -1).limit(limit)
+        
+        def iso(value):
+            return value.isoformat() if isinstance(value, datetime) else str(value)
         
         trades = []
-        for _, trade in recent.iterrows():
+        for trade in recent:
             trades.append({
-                'symbol': trade['symbol'],
-                'signal': trade['signal'],
-                'entry_price': float(trade['entry_price']),
-                'exit_price': float(trade['exit_price']),
-                'pnl': float(trade['pnl']),
+                'symbol': trade.get('symbol'),
+                'signal': trade.get('signal'),
+                'entry_price': float(trade.get('entry_price') or 0),
+                'exit_price': float(trade.get('exit_price') or 0),
+                'pnl': float(trade.get('pnl') or 0),
                 'pnl_pct': float(trade.get('pnl_pct', 0)),
-                'entry_time': trade['entry_time'].isoformat() if isinstance(trade['entry_time'], datetime) else str(trade['entry_time']),
-                'exit_time': trade['exit_time'].isoformat() if isinstance(trade['exit_time'], datetime) else str(trade['exit_time']),
+                'entry_time': iso(trade.get('entry_time')),
+                'exit_time': iso(trade.get('exit_time')),
                 'strategy': trade.get('strategy', 'unknown')
             })
         
@@ -0,0 +1,221 @@
+"""
+Position & PnL Stream
+Open positions of the bots running in this process, marked to market
+from ONE shared fetch_tickers call per interval and pushed to websocket
+subscribers as deltas, so dashboards stop polling Mongo and the exchange
+for positions and PnL.
+
+Events (all carry bot_id / user_id so clients can merge them):
+    position_opened  full position when a bot enters
+    position         mark_price / unrealized_pnl / pnl_percent, only when the mark moved
+    position_closed  when a bot exits or stops
+    pnl              the user's total unrealized PnL, only when it changed
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import config
+from broadcaster import broadcaster, user_topic, bot_topic, ADMIN_TOPIC
+
+logger = logging.getLogger(__name__)
+
+
+class PositionStream:
+    """
+    In-memory position book plus a background marker thread
+
+    Bots report opens and closes; the marker prices every open symbol in
+    one call and publishes only positions whose mark changed. Any price a
+    bot already fetched can be fed in with mark() at no extra cost.
+    """
+
+    def __init__(self, exchange=None, interval: float = 1.0, publisher=None):
+        self.exchange = exchange
+        self.interval = interval
+        self.publisher = publisher or broadcaster
+
+        self._positions: Dict[str, Dict] = {}    # bot_id -> position
+        self._prices: Dict[str, tuple] = {}      # symbol -> (price, monotonic time)
+        self._user_pnl: Dict[str, float] = {}    # user_id -> last published total
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {'ticks': 0, 'tick_errors': 0, 'deltas': 0, 'unchanged': 0, 'last_tick_ms': 0.0}
+
+    # ------------------------------------------------------------------
+    # Position book
+    # ------------------------------------------------------------------
+
+    def open(self, bot_id: str, user_id: str, symbol: str, entry: float, amount: float, **extra) -> Dict:
+        """Track a new position and announce it"""
+        position = {
+            'bot_id': bot_id,
+            'user_id': str(user_id),
+            'symbol': symbol,
+            'entry': entry,
+            'amount': amount,
+            **extra,
+            'mark_price': entry,
+            'unrealized_pnl': 0.0,
+            'pnl_percent': 0.0,
+        }
+        with self._lock:
+            self._positions[bot_id] = position
+            self._prices.setdefault(symbol, (entry, time.monotonic()))
+        self._emit('position_opened', position)
+        self.start()
+        return dict(position)
+
+    def close(self, bot_id: str, **extra):
+        """Stop tracking a bot's position; a no-op if it has none"""
+        with self._lock:
+            position = self._positions.pop(bot_id, None)
+        if position is None:
+            return
+        self._emit('position_closed', {
+            'bot_id': bot_id, 'user_id': position['user_id'], 'symbol': position['symbol'], **extra
+        })
+        self._publish_totals({position['user_id']})
+
+    def snapshot(self, user_id: Optional[str] = None) -> Dict:
+        """Current positions (one user's, or everyone's) for a client's first frame"""
+        with self._lock:
+            positions = [dict(p) for p in self._positions.values()
+                         if user_id is None or p['user_id'] == str(user_id)]
+        return {
+            'positions': positions,
+            'count': len(positions),
+            'unrealized_pnl': sum(p['unrealized_pnl'] for p in positions),
+        }
+
+    def price(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """Latest mark for symbol, None if unknown or older than max_age seconds"""
+        quote = self._prices.get(symbol)
+        if quote is None or (max_age is not None and time.monotonic() - quote[1] > max_age):
+            return None
+        return quote[0]
+
+    # ------------------------------------------------------------------
+    # Marking
+    # ------------------------------------------------------------------
+
+    def mark(self, symbol: str, price: float):
+        """Feed in a price seen elsewhere (e.g. a bot's own ticker fetch)"""
+        if price and price > 0:
+            self._apply({symbol: float(price)})
+
+    def tick(self) -> int:
+        """Price every open symbol in one call and publish what moved; returns deltas sent"""
+        with self._lock:
+            symbols = sorted({p['symbol'] for p in self._positions.values()})
+        if not symbols or self.exchange is None:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            tickers = self.exchange.fetch_tickers(symbols)
+        except Exception as e:
+            self.stats['tick_errors'] += 1
+            logger.warning(f"Position mark refresh failed: {e}")
+            return 0
+
+        prices = {}
+        for symbol in symbols:
+            ticker = tickers.get(symbol) or {}
+            price = ticker.get('last') or ticker.get('close')
+            if price and price > 0:
+                prices[symbol] = float(price)
+
+        sent = self._apply(prices)
+        self.stats['ticks'] += 1
+        self.stats['last_tick_ms'] = (time.perf_counter() - started) * 1000
+        return sent
+
+    def _apply(self, prices: Dict[str, float]) -> int:
+        now = time.monotonic()
+        changed: List[Dict] = []
+        with self._lock:
+            for symbol, price in prices.items():
+                self._prices[symbol] = (price, now)
+            for position in self._positions.values():
+                price = prices.get(position['symbol'])
+                if price is None:
+                    continue
+                if price == position['mark_price']:
+                    self.stats['unchanged'] += 1
+                    continue
+                entry = position['entry']
+                position['mark_price'] = price
+                position['unrealized_pnl'] = (price - entry) * position['amount']
+                position['pnl_percent'] = (price - entry) / entry * 100 if entry else 0.0
+                changed.append({k: position[k] for k in
+                                ('bot_id', 'user_id', 'symbol', 'mark_price', 'unrealized_pnl', 'pnl_percent')})
+
+        for delta in changed:
+            self._emit('position', delta)
+        if changed:
+            self._publish_totals({d['user_id'] for d in changed})
+        self.stats['deltas'] += len(changed)
+        return len(changed)
+
+    def _publish_totals(self, user_ids: Iterable[str]):
+        for user_id in user_ids:
+            totals = self.snapshot(user_id)
+            pnl = totals['unrealized_pnl']
+            if self._user_pnl.get(user_id) == pnl and totals['count']:
+                continue
+            if totals['count']:
+                self._user_pnl[user_id] = pnl
+            else:
+                self._user_pnl.pop(user_id, None)
+            self.publisher.publish([user_topic(user_id)], {
+                'type': 'pnl',
+                'data': {'user_id': user_id, 'unrealized_pnl': pnl, 'open_positions': totals['count']}
+            })
+
+    def _emit(self, event_type: str, data: Dict):
+        try:
+            self.publisher.publish(
+                [user_topic(data['user_id']), bot_topic(data['bot_id']), ADMIN_TOPIC],
+                {'type': event_type, 'data': data}
+            )
+        except Exception as e:
+            logger.debug(f"Position event publish failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Background marker
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        if self.exchange is None:
+            import ccxt
+            self.exchange = ccxt.okx({'enableRateLimit': True})
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='position-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Position stream error: {e}")
+            self._stop.wait(self.interval)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['open_positions'] = len(self._positions)
+        stats['symbols'] = len({p['symbol'] for p in list(self._positions.values())})
+        return stats
+
+
+# Shared by the bot engine and the API it runs inside
+position_stream = PositionStream(interval=config.POSITION_STREAM_INTERVAL)
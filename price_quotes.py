@@ -0,0 +1,201 @@
+"""
+Crypto Price Quote Service
+Keeps USD prices for every payment currency in memory, refreshed by ONE
+fetch_tickers call on an interval from a background thread, so pricing
+an invoice is a dict lookup instead of a live exchange request.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+STABLECOINS = ('USDT', 'USDC', 'DAI', 'BUSD')
+
+DEFAULT_REFRESH_INTERVAL = 30.0   # seconds between fetch_tickers calls
+DEFAULT_TTL = 120.0               # quote is "fresh" for this long
+DEFAULT_MAX_STALENESS = 600.0     # never price an invoice off anything older
+DEFAULT_WARMUP_TIMEOUT = 5.0      # how long a lookup waits for the first refresh
+
+
+class QuoteUnavailable(RuntimeError):
+    """Raised when there is no quote fresh enough to price an invoice"""
+
+
+class PriceQuoteService:
+    """
+    In-memory USD quotes for a fixed set of currencies
+
+    A quote older than `ttl` is still served (and counted as stale) while
+    the next refresh is pending; past `max_staleness` it is refused with
+    QuoteUnavailable rather than silently pricing an invoice off an old
+    number. Stablecoins are pinned at 1.0 and never fetched.
+    """
+
+    def __init__(self, exchange, currencies: Iterable[str], quote_currency: str = 'USDT',
+                 refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+                 ttl: float = DEFAULT_TTL,
+                 max_staleness: float = DEFAULT_MAX_STALENESS,
+                 warmup_timeout: float = DEFAULT_WARMUP_TIMEOUT,
+                 start: bool = True):
+        self.exchange = exchange
+        self.quote_currency = quote_currency
+        self.currencies = [c for c in dict.fromkeys(currencies) if c not in STABLECOINS]
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self.warmup_timeout = warmup_timeout
+
+        # currency -> (price, fetched_at monotonic)
+        self._quotes: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            'lookups': 0,
+            'stale_served': 0,
+            'refused': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'last_refresh_ms': 0.0,
+        }
+
+        if start:
+            self.start()
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def symbol(self, currency: str) -> str:
+        return f'{currency}/{self.quote_currency}'
+
+    def refresh(self) -> int:
+        """Fetch every currency's ticker in one call; returns quotes updated"""
+        if not self.currencies:
+            self._ready.set()
+            return 0
+
+        with self._refresh_lock:
+            started = time.perf_counter()
+            symbols = [self.symbol(c) for c in self.currencies]
+            try:
+                tickers = self.exchange.fetch_tickers(symbols)
+            except Exception as e:
+                self.stats['refresh_errors'] += 1
+                logger.error(f"Price quote refresh failed: {e}")
+                return 0
+
+            fetched_at = time.monotonic()
+            updated = {}
+            for currency in self.currencies:
+                ticker = tickers.get(self.symbol(currency)) or {}
+                price = ticker.get('last') or ticker.get('close')
+                if price and price > 0:
+                    updated[currency] = (float(price), fetched_at)
+
+            with self._lock:
+                self._quotes.update(updated)
+
+            self.stats['refreshes'] += 1
+            self.stats['last_refresh_ms'] = (time.perf_counter() - started) * 1000
+            self._ready.set()
+
+            missing = set(self.currencies) - set(updated)
+            if missing:
+                logger.warning(f"No ticker for {', '.join(sorted(missing))} in quote refresh")
+            return len(updated)
+
+    def start(self):
+        """Start the background refresher (first refresh happens immediately)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='price-quotes', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def age(self, currency: str) -> Optional[float]:
+        """Seconds since the currency was last quoted, None if never"""
+        quote = self._quotes.get(currency)
+        return time.monotonic() - quote[1] if quote else None
+
+    def get_price(self, currency: str) -> float:
+        """USD price of one unit of currency, from memory"""
+        self.stats['lookups'] += 1
+        if currency in STABLECOINS:
+            return 1.0
+
+        if not self._ready.is_set():
+            # Cold start: wait for the refresher instead of fetching here
+            self._ready.wait(self.warmup_timeout)
+
+        quote = self._quotes.get(currency)
+        if quote is None:
+            self.stats['refused'] += 1
+            raise QuoteUnavailable(f"No price quote for {currency}")
+
+        price, fetched_at = quote
+        age = time.monotonic() - fetched_at
+        if age > self.max_staleness:
+            self.stats['refused'] += 1
+            raise QuoteUnavailable(f"{currency} price quote is {age:.0f}s old")
+        if age > self.ttl:
+            self.stats['stale_served'] += 1
+        return price
+
+    def get_quotes(self) -> Dict[str, Dict]:
+        """All current quotes with their age, for health/admin views"""
+        now = time.monotonic()
+        with self._lock:
+            quotes = dict(self._quotes)
+        return {
+            currency: {
+                'price': price,
+                'age_seconds': round(now - fetched_at, 1),
+                'fresh': now - fetched_at <= self.ttl,
+            }
+            for currency, (price, fetched_at) in quotes.items()
+        }
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['quotes'] = len(self._quotes)
+        return stats
+
+
+_default_service: Optional[PriceQuoteService] = None
+_default_lock = threading.Lock()
+
+
+def get_quote_service(currencies: Iterable[str] = ()) -> PriceQuoteService:
+    """
+    Process-wide quote service backed by a public (keyless) OKX client
+
+    Currencies passed on later calls are added to the refresh set.
+    """
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            import ccxt
+            _default_service = PriceQuoteService(ccxt.okx({'enableRateLimit': True}), currencies)
+        else:
+            for currency in currencies:
+                if currency not in STABLECOINS and currency not in _default_service.currencies:
+                    _default_service.currencies.append(currency)
+        return _default_service
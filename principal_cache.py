@@ -0,0 +1,161 @@
+"""
+Authenticated Principal Cache
+TTL + LRU cache of user documents keyed by token subject (email), so
+steady-state auth for polling clients doesn't read the users collection
+on every request.
+
+Writes made through InvalidatingCollection drop the affected entries
+immediately; writes from other processes (workers, payment checker) are
+picked up when the TTL expires.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class PrincipalCache:
+    """
+    subject -> user document, expiring after `ttl` seconds
+
+    Only found users are cached; an unknown subject always goes to the
+    database. Callers get a deep copy, so endpoints that modify the user
+    dict can't leak changes into the cache.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # subject -> (expires_at, user)
+        self._ids: Dict[str, str] = {}               # str(_id) -> subject
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0}
+
+    def get(self, subject: str, loader: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(subject)
+                    self.stats['hits'] += 1
+                    return copy.deepcopy(entry[1])
+                self._drop(subject)
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            generation = self._generation
+
+        user = loader(subject)
+        if user is None:
+            return None
+
+        with self._lock:
+            # Skip the store if a write invalidated anything while we were
+            # reading; what we loaded may predate it
+            if generation == self._generation:
+                self._entries[subject] = (time.time() + self.ttl, copy.deepcopy(user))
+                self._entries.move_to_end(subject)
+                if '_id' in user:
+                    self._ids[str(user['_id'])] = subject
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._forget_id(evicted)
+        return user
+
+    def _drop(self, subject):
+        if self._entries.pop(subject, None) is not None:
+            self._forget_id(subject)
+
+    def _forget_id(self, subject):
+        for user_id in [i for i, s in self._ids.items() if s == subject]:
+            del self._ids[user_id]
+
+    def invalidate(self, subject: Optional[str] = None, user_id=None):
+        """Drop one principal by subject and/or _id"""
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += 1
+            if user_id is not None:
+                subject_for_id = self._ids.pop(str(user_id), None)
+                if subject_for_id is not None:
+                    self._entries.pop(subject_for_id, None)
+            if subject is not None:
+                self._drop(subject)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += 1
+            self._entries.clear()
+            self._ids.clear()
+
+    def invalidate_filter(self, query):
+        """Drop whatever a users-collection write with this filter may touch"""
+        query = query or {}
+        email = query.get('email')
+        user_id = query.get('_id')
+        if isinstance(email, str) or (user_id is not None and not isinstance(user_id, dict)):
+            self.invalidate(subject=email if isinstance(email, str) else None,
+                            user_id=user_id if not isinstance(user_id, dict) else None)
+        else:
+            # Operators, other fields, bulk updates: can't tell who changed
+            self.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class InvalidatingCollection:
+    """
+    Drop-in wrapper for the users collection
+
+    Reads pass straight through; every write invalidates the principals
+    its filter matches after the write completes.
+    """
+
+    WRITE_METHODS = frozenset((
+        'update_one', 'update_many', 'replace_one', 'delete_one', 'delete_many',
+        'find_one_and_update', 'find_one_and_replace', 'find_one_and_delete'
+    ))
+
+    def __init__(self, collection, cache: PrincipalCache):
+        self._collection = collection
+        self._cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in self.WRITE_METHODS:
+            def write(filter, *args, **kwargs):
+                try:
+                    return attr(filter, *args, **kwargs)
+                finally:
+                    self._cache.invalidate_filter(filter)
+            return write
+        if name == 'bulk_write':
+            def bulk_write(*args, **kwargs):
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    self._cache.clear()
+            return bulk_write
+        return attr
+
+    def __getitem__(self, name):
+        return self._collection[name]
+
+
+# Shared by the API process
+principal_cache = PrincipalCache()
@@ -0,0 +1,388 @@
+"""
+Query Profiler
+Wraps the Mongo database handle so every find / find_one / count /
+aggregate / update / delete is recorded by query *shape* (fields and
+operators, no values) with its call count and latency.
+
+With explain sampling on, new shapes (and each shape again every
+`explain_interval` seconds) are explained in a background thread for docs
+examined vs returned and the winning plan; collection scans and shapes the declared index schema
+doesn't cover are flagged with a suggested compound index.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.collection import Collection
+
+from index_schema import covering_index, suggest_index
+
+logger = logging.getLogger(__name__)
+
+# Operators that pin a field to one or a few values (index equality prefix)
+EQUALITY_OPS = {'$eq', '$in'}
+
+
+def query_shape(filter: Optional[Dict]) -> Dict:
+    """Filter with values replaced by 1, keeping fields and operators"""
+    def shape(value):
+        if isinstance(value, dict):
+            return {k: shape(v) for k, v in sorted(value.items())}
+        if isinstance(value, list):
+            return [shape(v) for v in value[:1]] if value and isinstance(value[0], dict) else 1
+        return 1
+    return shape(filter or {})
+
+
+def classify(filter: Optional[Dict]) -> Tuple[List[str], List[str]]:
+    """(equality fields, range fields) of a filter's top-level conditions"""
+    equality, range_fields = [], []
+    for field, condition in (filter or {}).items():
+        if field.startswith('$'):
+            continue  # $or / $and etc. - left to the planner
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            if set(condition) <= EQUALITY_OPS:
+                equality.append(field)
+            else:
+                range_fields.append(field)
+        else:
+            equality.append(field)
+    return equality, range_fields
+
+
+def normalize_sort(sort) -> List[Tuple[str, int]]:
+    if not sort:
+        return []
+    if isinstance(sort, str):
+        return [(sort, 1)]
+    if isinstance(sort, dict):
+        return list(sort.items())
+    return [tuple(item) for item in sort]
+
+
+def _stages(plan) -> List[str]:
+    """All stage names in an explain plan tree"""
+    found = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            found.append(plan['stage'])
+        for value in plan.values():
+            found += _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            found += _stages(item)
+    return found
+
+
+class QueryProfiler:
+    """Per-shape query statistics plus sampled explain plans"""
+
+    def __init__(self, slow_ms: float = 100.0, explain: bool = False,
+                 explain_interval: float = 300.0, max_shapes: int = 2000):
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.max_shapes = max_shapes
+
+        self._shapes: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+        self._explain_queue: queue.Queue = queue.Queue(maxsize=100)
+        self._thread = None
+
+        self.stats = {'queries': 0, 'slow': 0, 'explained': 0, 'explain_errors': 0, 'untracked': 0}
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record(self, collection, op: str, filter: Optional[Dict], sort, elapsed_ms: float,
+               returned: int = 0):
+        sort = normalize_sort(sort)
+        key = (collection.name, op, repr(query_shape(filter)), repr(sort))
+        now = time.monotonic()
+        explain_due = False
+
+        with self._lock:
+            self.stats['queries'] += 1
+            entry = self._shapes.get(key)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    self.stats['untracked'] += 1
+                    return
+                equality, range_fields = classify(filter)
+                entry = self._shapes[key] = {
+                    'collection': collection.name,
+                    'op': op,
+                    'shape': query_shape(filter),
+                    'sort': sort,
+                    'equality': equality,
+                    'range': range_fields,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'returned': 0,
+                    'explain': None,
+                    'explained_at': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['returned'] += returned
+            if self.explain and (entry['explained_at'] is None or now - entry['explained_at'] > self.explain_interval):
+                entry['explained_at'] = now
+                explain_due = True
+
+        if elapsed_ms > self.slow_ms:
+            self.stats['slow'] += 1
+            logger.warning(f"Slow query {elapsed_ms:.0f}ms on {collection.name}.{op}: {query_shape(filter)} sort={sort}")
+
+        if explain_due:
+            self._queue_explain(key, collection, filter, sort)
+
+    # ------------------------------------------------------------------
+    # Explain sampling (background)
+    # ------------------------------------------------------------------
+
+    def _queue_explain(self, key, collection, filter, sort):
+        try:
+            self._explain_queue.put_nowait((key, collection, filter or {}, sort))
+        except queue.Full:
+            with self._lock:
+                self._shapes[key]['explained_at'] = None  # try again next time
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run_explains, name='query-explain', daemon=True)
+            self._thread.start()
+
+    def _run_explains(self):
+        while True:
+            key, collection, filter, sort = self._explain_queue.get()
+            try:
+                self.explain_now(key, collection, filter, sort)
+            except Exception as e:
+                self.stats['explain_errors'] += 1
+                logger.debug(f"Explain failed for {collection.name}: {e}")
+
+    def explain_now(self, key, collection, filter: Dict, sort: List[Tuple[str, int]]):
+        command = {'find': collection.name, 'filter': filter}
+        if sort:
+            command['sort'] = dict(sort)
+        result = collection.database.command('explain', command, verbosity='executionStats')
+
+        execution = result.get('executionStats', {})
+        stages = _stages(result.get('queryPlanner', {}).get('winningPlan', {}))
+        summary = {
+            'docs_examined': execution.get('totalDocsExamined', 0),
+            'keys_examined': execution.get('totalKeysExamined', 0),
+            'n_returned': execution.get('nReturned', 0),
+            'collection_scan': 'COLLSCAN' in stages,
+            'in_memory_sort': 'SORT' in stages,
+            'stages': stages,
+        }
+        with self._lock:
+            if key in self._shapes:
+                self._shapes[key]['explain'] = summary
+        self.stats['explained'] += 1
+        if summary['collection_scan'] and summary['docs_examined']:
+            logger.warning(f"Unindexed scan on {collection.name}: {query_shape(filter)} "
+                           f"examined {summary['docs_examined']} docs for {summary['n_returned']}")
+        return summary
+
+    # ------------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------------
+
+    def report(self, limit: int = 50) -> List[Dict]:
+        """Shapes by total time, with examine ratio, flags and index advice"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._shapes.values()]
+
+        rows = []
+        for entry in sorted(entries, key=lambda e: e['total_ms'], reverse=True)[:limit]:
+            sort_fields = [field for field, _ in entry['sort']]
+            covered = covering_index(entry['collection'], entry['equality'], sort_fields, entry['range'])
+            explain = entry['explain'] or {}
+            ratio = None
+            if explain:
+                ratio = round(explain['docs_examined'] / max(explain['n_returned'], 1), 1)
+            needs_index = bool(
+                explain.get('collection_scan') and explain.get('docs_examined')
+                or (covered is None and (entry['equality'] or entry['sort'] or entry['range']))
+            )
+            rows.append({
+                'collection': entry['collection'],
+                'op': entry['op'],
+                'shape': entry['shape'],
+                'sort': entry['sort'],
+                'count': entry['count'],
+                'avg_ms': round(entry['total_ms'] / entry['count'], 2),
+                'max_ms': round(entry['max_ms'], 2),
+                'total_ms': round(entry['total_ms'], 1),
+                'examined_per_returned': ratio,
+                'explain': explain or None,
+                'declared_index': [list(k) for k in covered.keys] if covered else None,
+                'suggested_index': suggest_index(entry['equality'], entry['sort'], entry['range'])
+                                   if needs_index else None,
+            })
+        return rows
+
+    def unindexed(self) -> List[Dict]:
+        return [row for row in self.report(limit=self.max_shapes) if row['suggested_index']]
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['shapes'] = len(self._shapes)
+        return stats
+
+
+class ProfiledCursor:
+    """
+    Cursor proxy timing the query from creation until it is exhausted
+
+    Cursors that are closed, left by a `with` block or garbage collected
+    before the end (find(...).limit() loops that break early) are
+    recorded at that point with what they returned so far.
+    """
+
+    def __init__(self, cursor, collection, profiler, filter, sort):
+        self._cursor = cursor
+        self._collection = collection
+        self._profiler = profiler
+        self._filter = filter
+        self._sort = sort
+        self._started = time.perf_counter()
+        self._returned = 0
+        self._recorded = False
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else key_or_list
+        self._cursor = self._cursor.sort(key_or_list, direction)
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            document = next(self._cursor)
+        except StopIteration:
+            self._record()
+            raise
+        self._returned += 1
+        return document
+
+    def close(self):
+        self._record()
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        try:
+            self._record()
+        except Exception:
+            pass  # interpreter shutdown, half-built proxy
+
+    def _record(self):
+        if not self._recorded:
+            self._recorded = True
+            elapsed_ms = (time.perf_counter() - self._started) * 1000
+            self._profiler.record(self._collection, 'find', self._filter, self._sort, elapsed_ms, self._returned)
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if result is self._cursor:
+                return self  # limit(), skip(), batch_size() ... stay profiled
+            return result
+        return chained
+
+
+class ProfiledCollection:
+    """Collection proxy recording read/update/delete query shapes"""
+
+    WRITE_METHODS = frozenset((
+        'update_one', 'update_many', 'replace_one', 'delete_one', 'delete_many',
+        'find_one_and_update', 'find_one_and_replace', 'find_one_and_delete'
+    ))
+
+    def __init__(self, collection, profiler: QueryProfiler):
+        self._collection = collection
+        self._profiler = profiler
+
+    def _timed(self, op, filter, sort, call, returned=None):
+        started = time.perf_counter()
+        result = call()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        count = returned(result) if returned else 0
+        self._profiler.record(self._collection, op, filter, sort, elapsed_ms, count)
+        return result
+
+    def find(self, filter=None, *args, **kwargs):
+        cursor = self._collection.find(filter, *args, **kwargs)
+        return ProfiledCursor(cursor, self._collection, self._profiler, filter, kwargs.get('sort'))
+
+    def find_one(self, filter=None, *args, **kwargs):
+        return self._timed('find_one', filter, kwargs.get('sort'),
+                           lambda: self._collection.find_one(filter, *args, **kwargs),
+                           lambda doc: 1 if doc else 0)
+
+    def count_documents(self, filter, *args, **kwargs):
+        return self._timed('count', filter, None,
+                           lambda: self._collection.count_documents(filter, *args, **kwargs))
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        first = pipeline[0] if pipeline else {}
+        match = first.get('$match') if isinstance(first, dict) else None
+        return self._timed('aggregate', match, None,
+                           lambda: self._collection.aggregate(pipeline, *args, **kwargs))
+
+    def _write(self, op):
+        method = getattr(self._collection, op)
+
+        def call(filter, *args, **kwargs):
+            return self._timed(op, filter, kwargs.get('sort'), lambda: method(filter, *args, **kwargs))
+        return call
+
+    def __getattr__(self, name):
+        if name in self.WRITE_METHODS:
+            return self._write(name)
+        return getattr(self._collection, name)
+
+
+class ProfiledDatabase:
+    """Database proxy handing out profiled collections"""
+
+    def __init__(self, database, profiler: QueryProfiler):
+        self._database = database
+        self.profiler = profiler
+
+    def __getitem__(self, name):
+        return ProfiledCollection(self._database[name], self.profiler)
+
+    def get_collection(self, name, **kwargs):
+        return ProfiledCollection(self._database.get_collection(name, **kwargs), self.profiler)
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if isinstance(attr, Collection):
+            return ProfiledCollection(attr, self.profiler)
+        return attr
+
+
+# Shared by every MongoTradingDatabase in the process
+query_profiler = QueryProfiler()
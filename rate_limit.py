@@ -0,0 +1,230 @@
+"""
+Rate Limiting Engine
+GCRA (generic cell rate algorithm) limits shared by the security
+middleware and the public API: O(1) per request and one timestamp per
+(key, limit) instead of a list of every request in the window.
+
+State lives in process memory by default. With REDIS_URL set it lives
+in Redis, so limits hold across uvicorn workers and instances.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import config
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# A limit is (max requests, window seconds)
+Limit = Tuple[int, float]
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: int            # the tightest limit checked
+    remaining: int        # requests left under that limit right now
+    retry_after: float    # seconds until a request would be allowed (0 if allowed)
+    reset_after: float    # seconds until every limit is back to full
+
+
+def _gcra(tat: Optional[float], now: float, limit: int, window: float):
+    """
+    One GCRA step for a single limit
+
+    `tat` is the theoretical arrival time: when the key's budget would be
+    full again. Returns (allowed, new_tat, remaining, retry_after).
+    """
+    interval = window / limit
+    tat = max(tat or now, now)
+    new_tat = tat + interval
+    allow_at = new_tat - window
+    if allow_at > now:
+        return False, tat, 0, allow_at - now
+    remaining = int((window - (new_tat - now)) / interval + 1e-9)
+    return True, new_tat, remaining, 0.0
+
+
+class MemoryBackend:
+    """
+    Per-process GCRA state
+
+    Keys are kept in last-touched order; a key whose TAT has passed is
+    indistinguishable from one never seen, so idle keys are dropped from
+    the old end as new requests come in.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tats: OrderedDict = OrderedDict()  # (key, limit, window) -> tat
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def apply(self, key: str, limits: Sequence[Limit], now: float, consume: bool) -> Decision:
+        with self._lock:
+            slots = [(key, limit, window) for limit, window in limits]
+            results = [_gcra(self._tats.get(slot), now, limit, window)
+                       for slot, (limit, window) in zip(slots, limits)]
+            allowed = all(r[0] for r in results)
+
+            if allowed and consume:
+                for slot, (_, new_tat, _, _) in zip(slots, results):
+                    self._tats[slot] = new_tat
+                    self._tats.move_to_end(slot)
+            self._evict(now)
+
+        return _decision(allowed, limits, results, now)
+
+    def _evict(self, now: float):
+        while self._tats:
+            slot, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self.max_keys:
+                break
+            del self._tats[slot]
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._tats)
+
+
+# All limits checked and, if every one allows, consumed in one round trip.
+# KEYS: one per limit. ARGV: now, consume, then (limit, window) per key.
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local consume = ARGV[2] == '1'
+local allowed = 1
+local out = {}
+local new_tats = {}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[1 + 2 * i])
+    local window = tonumber(ARGV[2 + 2 * i])
+    local interval = window / limit
+    local tat = tonumber(redis.call('GET', key) or now)
+    if tat < now then tat = now end
+    local new_tat = tat + interval
+    local allow_at = new_tat - window
+    if allow_at > now then
+        allowed = 0
+        new_tats[i] = tat
+        out[i] = {0, tostring(tat), 0, tostring(allow_at - now)}
+    else
+        new_tats[i] = new_tat
+        out[i] = {1, tostring(new_tat), math.floor((window - (new_tat - now)) / interval + 1e-9), '0'}
+    end
+end
+if allowed == 1 and consume then
+    for i, key in ipairs(KEYS) do
+        redis.call('SET', key, tostring(new_tats[i]), 'PX', math.ceil((new_tats[i] - now) * 1000) + 1)
+    end
+end
+return out
+"""
+
+
+class RedisBackend:
+    """GCRA state in Redis; keys expire by themselves once idle"""
+
+    def __init__(self, client, prefix: str = 'ratelimit'):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_GCRA_SCRIPT)
+
+    def apply(self, key: str, limits: Sequence[Limit], now: float, consume: bool) -> Decision:
+        keys = [f"{self.prefix}:{key}:{limit}:{window:g}" for limit, window in limits]
+        args = [repr(now), '1' if consume else '0']
+        for limit, window in limits:
+            args += [limit, repr(float(window))]
+
+        rows = self._script(keys=keys, args=args)
+        results = [(bool(int(allowed)), float(tat), int(remaining), float(retry))
+                   for allowed, tat, remaining, retry in rows]
+        return _decision(all(r[0] for r in results), limits, results, now)
+
+
+def _decision(allowed: bool, limits: Sequence[Limit], results: List, now: float) -> Decision:
+    tightest = min(range(len(limits)), key=lambda i: results[i][2])
+    return Decision(
+        allowed=allowed,
+        limit=limits[tightest][0],
+        remaining=results[tightest][2] if allowed else 0,
+        retry_after=max(r[3] for r in results),
+        reset_after=max(max(r[1] - now, 0.0) for r in results)
+    )
+
+
+class RateLimitEngine:
+    """
+    Checks a key against one or more limits at once
+
+    A request counts against every limit only if all of them allow it.
+    If Redis becomes unreachable, limits fall back to this process's
+    memory rather than failing requests.
+    """
+
+    def __init__(self, backend=None):
+        self.local = MemoryBackend()
+        self.backend = backend if backend is not None else self.local
+        self.stats = {'allowed': 0, 'limited': 0, 'backend_errors': 0}
+
+    def _apply(self, key: str, limits: Sequence[Limit], consume: bool, now: Optional[float]) -> Decision:
+        now = time.time() if now is None else now
+        try:
+            return self.backend.apply(key, limits, now, consume)
+        except Exception as e:
+            if self.backend is self.local:
+                raise
+            self.stats['backend_errors'] += 1
+            logger.warning(f"Rate limit backend error, using local limits: {e}")
+            return self.local.apply(key, limits, now, consume)
+
+    def hit(self, key: str, limits: Sequence[Limit], now: Optional[float] = None) -> Decision:
+        """Count one request for key if every limit allows it"""
+        decision = self._apply(key, limits, True, now)
+        self.stats['allowed' if decision.allowed else 'limited'] += 1
+        return decision
+
+    def peek(self, key: str, limits: Sequence[Limit], now: Optional[float] = None) -> Decision:
+        """What hit() would decide, without counting a request"""
+        return self._apply(key, limits, False, now)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['backend'] = 'redis' if isinstance(self.backend, RedisBackend) else 'memory'
+        stats['local_keys'] = len(self.local)
+        stats['local_evicted'] = self.local.evicted
+        return stats
+
+
+def retry_after_seconds(decision: Decision) -> int:
+    """Whole seconds for a Retry-After header"""
+    return int(math.ceil(decision.retry_after))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RateLimitEngine:
+    """Process-wide engine, backed by Redis when REDIS_URL is configured"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                backend = None
+                if config.REDIS_URL and REDIS_AVAILABLE:
+                    try:
+                        client = redis.Redis.from_url(config.REDIS_URL, socket_timeout=0.5)
+                        client.ping()
+                        backend = RedisBackend(client)
+                    except Exception as e:
+                        logger.warning(f"Redis unavailable for rate limiting, using memory: {e}")
+                _engine = RateLimitEngine(backend)
+    return _engine
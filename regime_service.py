@@ -0,0 +1,161 @@
+"""
+Shared Market Regime Service
+One rolling regime state per (symbol, timeframe), advanced once per new
+bar and read by every bot and analyzer, instead of each caller
+recomputing rolling volatility and moving averages over its own frame
+every minute.
+"""
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bars kept per symbol/timeframe; matches the 100-candle fetch the bots
+# make, so averages cover the same span they did before
+REGIME_HISTORY = 100
+DEFAULT_MAX_KEYS = 1024
+
+
+def _rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    if len(values) < window:
+        return np.array([])
+    return np.lib.stride_tricks.sliding_window_view(values, window).std(axis=1, ddof=1)
+
+
+def compute_regime_state(close: np.ndarray, high: np.ndarray, low: np.ndarray) -> Dict:
+    """
+    Regime inputs for the newest bar of a price history
+
+    Same quantities the analyzers used to derive from pandas rolling
+    windows: 20-bar return volatility (latest and average), 20/50 SMAs,
+    the prior 10-bar high/low and the squared-return persistence ratio.
+    """
+    n = len(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = close[1:] / close[:-1] - 1
+        volatility = _rolling_std(returns, 20)
+        squared = returns ** 2
+
+        if len(squared) >= 20:
+            persistence = min(squared[-10:].mean() / squared[-50:].mean(), 2.0) / 2.0
+        else:
+            persistence = 0.5
+
+    return {
+        'bars': n,
+        'close': float(close[-1]) if n else np.nan,
+        'high': float(high[-1]) if n else np.nan,
+        'low': float(low[-1]) if n else np.nan,
+        'current_vol': float(volatility[-1]) if len(volatility) else np.nan,
+        'avg_vol': float(volatility.mean()) if len(volatility) else np.nan,
+        'sma_20': float(close[-20:].mean()) if n >= 20 else np.nan,
+        'sma_50': float(close[-50:].mean()) if n >= 50 else np.nan,
+        'prev_high_10': float(high[-11:-1].max()) if n >= 11 else np.nan,
+        'prev_low_10': float(low[-11:-1].min()) if n >= 11 else np.nan,
+        'persistence': float(persistence),
+    }
+
+
+def _timestamps(df: pd.DataFrame) -> Optional[np.ndarray]:
+    if isinstance(df.index, pd.DatetimeIndex):
+        return df.index.asi8
+    if 'timestamp' in df.columns:
+        values = df['timestamp']
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.astype('int64').to_numpy()
+        return values.to_numpy()
+    return None
+
+
+def state_from_frame(df: pd.DataFrame) -> Dict:
+    """Uncached regime state over a whole frame"""
+    return compute_regime_state(
+        df['close'].to_numpy(dtype=float),
+        df['high'].to_numpy(dtype=float),
+        df['low'].to_numpy(dtype=float)
+    )
+
+
+class RegimeService:
+    """
+    Incremental per-(symbol, timeframe) regime state
+
+    The first caller to see a new bar folds it into the stored window and
+    recomputes the state; everyone else in that bar gets the cached
+    state. The bar that was still open last time is replaced by its
+    final values when the next bar shows up.
+    """
+
+    def __init__(self, history: int = REGIME_HISTORY, max_keys: int = DEFAULT_MAX_KEYS):
+        self.history = history
+        self.max_keys = max_keys
+        self._bars: OrderedDict = OrderedDict()
+        self._states: Dict = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'updates': 0, 'rebuilds': 0}
+
+    def get_state(self, symbol: Optional[str], timeframe: str, df: pd.DataFrame) -> Dict:
+        """Regime state for the newest bar in df"""
+        stamps = _timestamps(df)
+        if symbol is None or stamps is None or len(df) == 0:
+            return state_from_frame(df)
+
+        key = (symbol, timeframe)
+        newest = stamps[-1]
+
+        with self._lock:
+            bars = self._bars.get(key)
+            if bars and bars[-1][0] == newest:
+                self._bars.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._states[key]
+
+            tail = df[['high', 'low', 'close']].to_numpy(dtype=float)
+            if bars and stamps[0] <= bars[-1][0] < newest:
+                # Re-take the previously open bar, then append the new ones
+                start = int(np.searchsorted(stamps, bars[-1][0]))
+                bars.pop()
+                for ts, (high, low, close) in zip(stamps[start:], tail[start:]):
+                    bars.append((ts, high, low, close))
+                self.stats['updates'] += 1
+            else:
+                # First sight, a gap, or history went backwards
+                bars = deque(
+                    ((ts, high, low, close) for ts, (high, low, close)
+                     in zip(stamps[-self.history:], tail[-self.history:])),
+                    maxlen=self.history
+                )
+                self._bars[key] = bars
+                self.stats['rebuilds'] += 1
+
+            _, high, low, close = (np.array(col, dtype=float) for col in zip(*bars))
+            state = compute_regime_state(close, high, low)
+            state['timestamp'] = newest
+            self._states[key] = state
+            self._bars.move_to_end(key)
+
+            while len(self._bars) > self.max_keys:
+                evicted, _ = self._bars.popitem(last=False)
+                self._states.pop(evicted, None)
+
+            return state
+
+    def reset(self, symbol: Optional[str] = None):
+        with self._lock:
+            for key in [k for k in self._bars if symbol is None or k[0] == symbol]:
+                self._bars.pop(key, None)
+                self._states.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['keys'] = len(self._bars)
+        return stats
+
+
+# Shared by every bot in the process
+regime_service = RegimeService()
@@ -10,13 +10,19 @@ import re
 import secrets
 import hashlib
 import pyotp
-from collections import defaultdict
 import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import smtplib
 import os
+import logging
+from collections import deque
 from colorama import Fore, Style
+import config
+from rate_limit import RateLimitEngine, get_engine, retry_after_seconds
+from audit_log import AuditPipeline
+
+logger = logging.getLogger(__name__)
 
 
 # ============================================================================
@@ -24,54 +30,26 @@ from colorama import Fore, Style
 # ============================================================================
 
 class RateLimiter:
-    """Rate limiting to prevent API abuse"""
+    """Rate limiting to prevent API abuse (per-minute and per-hour, see rate_limit.py)"""
     
-    def __init__(self, requests_per_minute: int = 60, requests_per_hour: int = 1000):
+    def __init__(self, requests_per_minute: int = 60, requests_per_hour: int = 1000,
+                 engine: RateLimitEngine = None):
         self.rpm = requests_per_minute
         self.rph = requests_per_hour
-        self.requests = defaultdict(list)
-        
-    def is_allowed(self, identifier: str) -> bool:
-        """Check if request is allowed"""
-        now = time.time()
-        
-        # Clean old requests
-        self.requests[identifier] = [
-            timestamp for timestamp in self.requests[identifier]
-            if now - timestamp < 3600  # Keep last hour
-        ]
+        self.engine = engine or get_engine()
         
-        # Check limits
-        minute_ago = now - 60
-        hour_ago = now - 3600
+    @property
+    def limits(self):
+        return [(self.rpm, 60), (self.rph, 3600)]
         
-        recent_minute = sum(1 for t in self.requests[identifier] if t > minute_ago)
-        recent_hour = sum(1 for t in self.requests[identifier] if t > hour_ago)
-        
-        if recent_minute >= self.rpm:
-            return False
-        if recent_hour >= self.rph:
-            return False
-            
-        # Add current request
-        self.requests[identifier].append(now)
-        return True
+    def is_allowed(self, identifier: str) -> bool:
+        """Check if request is allowed (and count it if so)"""
+        return self.engine.hit(f"security:{identifier}", self.limits).allowed
         
     def get_retry_after(self, identifier: str) -> int:
         """Get seconds until next request allowed"""
-        if not self.requests[identifier]:
-            return 0
-            
-        now = time.time()
-        minute_ago = now - 60
-        
-        recent_minute = [t for t in self.requests[identifier] if t > minute_ago]
-        
-        if len(recent_minute) >= self.rpm:
-            oldest_request = min(recent_minute)
-            return int(60 - (now - oldest_request)) + 1
-            
-        return 0
+        decision = self.engine.peek(f"security:{identifier}", self.limits)
+        return retry_after_seconds(decision)
 
 
 # Global rate limiter
@@ -370,17 +348,25 @@ async def security_headers_middleware(request: Request, call_next):
 # ============================================================================
 
 class AuditLogger:
-    """Log security-relevant events"""
+    """Log security-relevant events (persisted in batches, see audit_log.py)"""
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, pipeline: AuditPipeline = None, history: int = 1000):
         self.db = db
-        self.logs = []
+        # Most recent events only; the full record lives in Mongo
+        self.logs = deque(maxlen=history)
+        if pipeline is None and db:
+            pipeline = AuditPipeline(
+                db.db['audit_logs'],
+                config.AUDIT_LOG_FALLBACK_PATH,
+                retention_days=config.AUDIT_LOG_RETENTION_DAYS
+            )
+        self.pipeline = pipeline
         
     def log_event(self, event_type: str, user_id: str = None,
                   ip_address: str = None, details: dict = None):
         """Log a security event"""
         event = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': datetime.utcnow(),  # datetime so the TTL index can expire it
             'event_type': event_type,
             'user_id': user_id,
             'ip_address': ip_address,
@@ -389,16 +375,14 @@ class AuditLogger:
         
         self.logs.append(event)
         
-        # Store in database if available
-        if self.db:
-            try:
-                self.db.db['audit_logs'].insert_one(event)
-            except Exception as e:
-                print(f"{Fore.RED}❌ Failed to store audit log: {e}{Style.RESET_ALL}")
+        # Queued; written to the database by the pipeline's thread
+        if self.pipeline:
+            self.pipeline.submit(event)
                 
-        # Log to file
-        import logging
-        logging.info(f"AUDIT: {event_type} - User: {user_id} - IP: {ip_address}")
+        logger.info(f"AUDIT: {event_type} - User: {user_id} - IP: {ip_address}")
+    
+    def get_stats(self) -> Dict:
+        return self.pipeline.get_stats() if self.pipeline else {'submitted': len(self.logs)}
 
 
 # ============================================================================
@@ -0,0 +1,202 @@
+"""
+Background Sentiment Service
+Each sentiment source (news, social, fear & greed, momentum) refreshes on
+its own interval in a background thread; readers get the cached
+composite for a symbol together with its age, so sentiment never costs a
+fetch or an NLP pass on the trading path.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+NEUTRAL = 0.5
+DEFAULT_TEXT_CACHE = 10000
+
+
+class BatchTextScorer:
+    """
+    Scores a batch of texts, each distinct text once
+
+    Headlines and posts repeat across symbols and refreshes, so scores
+    are memoized (LRU) and only unseen texts reach the NLP model.
+    """
+
+    def __init__(self, score_fn: Callable[[str], float], max_cache: int = DEFAULT_TEXT_CACHE):
+        self.score_fn = score_fn
+        self.max_cache = max_cache
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'scored': 0, 'cached': 0}
+
+    def score_many(self, texts: Iterable[str]) -> List[float]:
+        texts = list(texts)
+        with self._lock:
+            unseen = [t for t in dict.fromkeys(texts) if t not in self._cache]
+        scores = {text: self.score_fn(text) for text in unseen}
+
+        with self._lock:
+            for text, score in scores.items():
+                self._cache[text] = score
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+            self.stats['scored'] += len(unseen)
+            self.stats['cached'] += len(texts) - len(unseen)
+            return [scores[t] if t in scores else self._cache.get(t, 0.0) for t in texts]
+
+
+class _Source:
+    def __init__(self, name, fetch, interval, per_symbol):
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.per_symbol = per_symbol
+        self.values: Dict = {}          # symbol (or None) -> score
+        self.updated_at: Dict = {}      # symbol (or None) -> epoch seconds
+        self.last_run: Optional[float] = None
+        self.errors = 0
+
+
+class SentimentService:
+    """
+    Cached, background-refreshed composite sentiment per symbol
+
+    Per-symbol sources are called with the full list of tracked symbols
+    (fetch(symbols) -> {symbol: score}) so they can batch; global sources
+    are called with no arguments and apply to every symbol. A symbol is
+    tracked from its first read; until its sources have run it reads as
+    neutral with age None.
+    """
+
+    def __init__(self, weights: Dict[str, float], start: bool = True,
+                 tick: float = 1.0):
+        self.weights = weights
+        self.tick = tick
+        self._sources: Dict[str, _Source] = {}
+        self._symbols = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._autostart = start
+
+    def add_source(self, name: str, fetch: Callable, interval: float, per_symbol: bool = True):
+        self._sources[name] = _Source(name, fetch, interval, per_symbol)
+
+    # ------------------------------------------------------------------
+    # Background refresh
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sentiment-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_due()
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
+
+    def refresh_due(self, now: Optional[float] = None) -> List[str]:
+        """Run every source whose interval has elapsed (or that has new symbols)"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            symbols = sorted(self._symbols)
+            pending = set(self._pending)
+            self._pending.clear()
+
+        refreshed = []
+        for source in self._sources.values():
+            due = source.last_run is None or now - source.last_run >= source.interval
+            if not due and not (source.per_symbol and pending):
+                continue
+            targets = symbols if due else sorted(pending)
+            if source.per_symbol and not targets:
+                continue
+            try:
+                if source.per_symbol:
+                    values = source.fetch(targets)
+                else:
+                    values = {None: source.fetch()}
+                with self._lock:
+                    for key, value in values.items():
+                        if value is not None:
+                            source.values[key] = value
+                            source.updated_at[key] = now
+                if due:
+                    source.last_run = now
+                refreshed.append(source.name)
+            except Exception as e:
+                source.errors += 1
+                # Keep serving the last good values; try again next interval
+                if due:
+                    source.last_run = now
+                logger.error(f"Sentiment source {source.name} failed: {e}")
+        return refreshed
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    def track(self, symbol: str):
+        with self._lock:
+            if symbol in self._symbols:
+                return
+            self._symbols.add(symbol)
+            self._pending.add(symbol)
+        if self._autostart:
+            self.start()
+        self._wakeup.set()
+
+    def get(self, symbol: str) -> Dict:
+        """Composite sentiment for a symbol from cache, never blocking"""
+        self.track(symbol)
+        now = time.time()
+
+        scores = {name: None for name in self.weights}
+        stamps = []
+        with self._lock:
+            for name, source in self._sources.items():
+                key = symbol if source.per_symbol else None
+                scores[name] = source.values.get(key)
+                if key in source.updated_at:
+                    stamps.append(source.updated_at[key])
+
+        # A source that hasn't reported yet counts as neutral, the same
+        # value the sources fall back to when they fail
+        composite = sum(
+            (NEUTRAL if scores[name] is None else scores[name]) * self.weights.get(name, 0)
+            for name in scores
+        )
+
+        return {
+            'composite_sentiment': composite,
+            'individual_scores': scores,
+            # Age of the stalest source that has reported
+            'age_seconds': round(now - min(stamps), 1) if stamps else None,
+            'complete': len(stamps) == len(self._sources)
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            'symbols': len(self._symbols),
+            'sources': {
+                name: {
+                    'interval': source.interval,
+                    'errors': source.errors,
+                    'last_run_age': round(time.time() - source.last_run, 1) if source.last_run is not None else None
+                }
+                for name, source in self._sources.items()
+            }
+        }
@@ -46,6 +46,43 @@ def mock_exchange():
     return exchange
 
 
+class FakeDepositExchange:
+    """In-memory exchange exposing ccxt's fetch_deposits (with since/limit paging)"""
+
+    def __init__(self):
+        self.deposits = []
+        self.fetch_calls = []
+
+    def add_deposit(self, address, amount, timestamp, tag=None, status='ok', txid=None, currency='USDT'):
+        deposit = {
+            'id': f"dep{len(self.deposits) + 1}",
+            'currency': currency,
+            'txid': txid or f"tx{len(self.deposits) + 1}",
+            'address': address,
+            'tag': tag,
+            'amount': amount,
+            'status': status,
+            'timestamp': timestamp
+        }
+        self.deposits.append(deposit)
+        return deposit
+
+    def fetch_deposits(self, code=None, since=None, limit=None, params=None):
+        self.fetch_calls.append({'code': code, 'since': since, 'limit': limit})
+        rows = [
+            dict(d) for d in sorted(self.deposits, key=lambda d: d['timestamp'])
+            if (code is None or d['currency'] == code)
+            and (since is None or d['timestamp'] >= since)
+        ]
+        return rows[:limit] if limit else rows
+
+
+@pytest.fixture
+def fake_deposit_exchange():
+    """Fake exchange for deposit reconciliation tests"""
+    return FakeDepositExchange()
+
+
 @pytest.fixture
 def sample_market_data():
     """Sample market data for testing"""
@@ -0,0 +1,89 @@
+"""
+Unit tests for AI strategy model training
+"""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from model_registry import ModelRegistry
+from ai_strategy import AITradingStrategy, N_ESTIMATORS, WARM_START_ESTIMATORS
+
+
+def _candles(seed=3, n=320):
+    rng = np.random.RandomState(seed)
+    close = 100 + np.cumsum(rng.randn(n))
+    return pd.DataFrame({
+        'open': close + rng.randn(n) * 0.2,
+        'high': close + rng.uniform(0.1, 1.0, n),
+        'low': close - rng.uniform(0.1, 1.0, n),
+        'close': close,
+        'volume': rng.uniform(100, 1000, n)
+    }, index=pd.date_range('2025-01-01', periods=n, freq='h'))
+
+
+@pytest.fixture
+def strategy(tmp_path):
+    strategy = AITradingStrategy()
+    strategy.registry = ModelRegistry(str(tmp_path))
+    strategy.n_jobs = 1
+    strategy.cv_splits = 3
+    return strategy
+
+
+class TestModelTraining:
+    """Test suite for AITradingStrategy training"""
+
+    def test_warm_start_from_memory_mapped_artifact(self, strategy):
+        assert strategy.train_ml_model(_candles(), 'BTC/USDT')
+        strategy.registry.evict('BTC/USDT')
+
+        previous = strategy.registry.get('BTC/USDT')
+        assert strategy.registry.stats['loads'] == 1
+        assert any(isinstance(value, np.memmap) for value in vars(previous['scaler']).values())
+
+        assert strategy.train_ml_model(_candles(seed=4), 'BTC/USDT')
+
+        stats = strategy.training_stats['BTC/USDT']
+        assert stats['mode'] == 'warm_start'
+        assert stats['n_estimators'] == N_ESTIMATORS + WARM_START_ESTIMATORS
+        bundle = strategy.registry.get('BTC/USDT')
+        assert len(bundle['gb'].estimators_) == N_ESTIMATORS + WARM_START_ESTIMATORS
+        # The artifact it was loaded from is untouched
+        assert previous['rf'].n_estimators == N_ESTIMATORS
+        assert strategy.registry.versions('BTC/USDT') == [1, 2]
+
+    def test_retrain_universe_reports_time_series_cv_scores(self, strategy):
+        data = {'BTC/USDT': _candles(), 'ETH/USDT': _candles(seed=5)}
+
+        report = strategy.retrain_universe(data, warm_start=False, cv=True)
+
+        assert report['failed'] == []
+        for symbol in data:
+            scores = report['symbols'][symbol]['cv_scores']
+            assert set(scores) == {'rf', 'gb'}
+            assert all(len(fold_scores) == 3 for fold_scores in scores.values())
+            assert all(np.isfinite(fold_scores).all() for fold_scores in scores.values())
+        assert report['total_seconds'] > 0
+
+    def test_cv_scores_match_serial_folds(self, strategy):
+        from sklearn.model_selection import TimeSeriesSplit
+
+        bundle = strategy._fit_models(_candles(), 'BTC/USDT', cv=True)
+
+        df = strategy.indicators.compute(_candles())
+        features = strategy.prepare_ml_features(df)[:-1]
+        target = (df['close'].shift(-1) / df['close'] - 1).fillna(0)[:-1].values
+        X = bundle['scaler'].transform(features)
+        expected = []
+        for train_idx, test_idx in TimeSeriesSplit(n_splits=3).split(X):
+            model = strategy._cv_model(bundle['gb'])
+            model.fit(X[train_idx], target[train_idx])
+            expected.append(model.score(X[test_idx], target[test_idx]))
+
+        assert bundle['training']['cv_scores']['gb'] == pytest.approx(expected, abs=1e-6)
+        # CV fits copies; the returned models are the full-data fit
+        assert bundle['rf'].n_estimators == N_ESTIMATORS
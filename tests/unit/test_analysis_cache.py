@@ -0,0 +1,151 @@
+"""
+Unit tests for the per-bar analysis cache
+"""
+import pytest
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from analysis_cache import BarCache, bar_open, timeframe_seconds, analysis_cache
+from advanced_ai_engine import AdvancedAIEngine
+
+
+class CountingExchange:
+    """Exchange stub serving a steady uptrend and counting API calls"""
+
+    id = 'stub'
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def fetch_ohlcv(self, symbol, timeframe, limit=50):
+        self._count()
+        return [[i * 60_000, 100 + i, 101 + i, 99 + i, 100 + i, 10] for i in range(limit)]
+
+    def fetch_order_book(self, symbol, limit=20):
+        self._count()
+        return {'bids': [[100, 5]] * limit, 'asks': [[101, 5]] * limit}
+
+    def fetch_ticker(self, symbol):
+        self._count()
+        return {'quoteVolume': 50_000_000, 'last': 100}
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_cache():
+    analysis_cache.invalidate()
+    yield
+    analysis_cache.invalidate()
+
+
+class TestBarCache:
+    """Test suite for BarCache"""
+
+    def test_timeframe_helpers(self):
+        assert timeframe_seconds('15m') == 900
+        assert timeframe_seconds('4h') == 14400
+        assert bar_open('1h', now=7300) == 7200
+        with pytest.raises(ValueError):
+            timeframe_seconds('1x')
+
+    def test_computes_once_per_bar(self):
+        cache = BarCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {'value': len(calls)}
+
+        assert cache.get('k', '1h', compute, now=3600) == {'value': 1}
+        assert cache.get('k', '1h', compute, now=7199) == {'value': 1}
+        assert cache.get('k', '1h', compute, now=7200) == {'value': 2}
+        assert cache.get_stats()['keys'] == 1
+
+    def test_concurrent_callers_share_one_computation(self):
+        cache = BarCache()
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return {'value': 42}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('k', '1h', compute)))
+                   for _ in range(8)]
+        threads[0].start()
+        started.wait(1)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{'value': 42}] * 8
+        assert cache.stats['waited'] == 7
+
+    def test_results_are_copies(self):
+        cache = BarCache()
+        first = cache.get('k', '1h', lambda: {'reasons': []})
+        first['reasons'].append('mutated')
+
+        assert cache.get('k', '1h', lambda: None) == {'reasons': []}
+
+    def test_rejected_result_is_not_cached(self):
+        cache = BarCache()
+        results = iter([{'ok': False}, {'ok': True}])
+
+        def compute():
+            return next(results)
+
+        cache.get('k', '1h', compute, cache_if=lambda r: r['ok'], now=0)
+
+        assert cache.get('k', '1h', compute, cache_if=lambda r: r['ok'], now=0) == {'ok': True}
+        assert cache.stats['not_cached'] == 1
+
+    def test_error_propagates_and_is_not_cached(self):
+        cache = BarCache()
+
+        def fail():
+            raise RuntimeError('exchange down')
+
+        with pytest.raises(RuntimeError):
+            cache.get('k', '1h', fail)
+        assert cache.get('k', '1h', lambda: 'recovered') == 'recovered'
+
+
+class TestAdvancedAIEngineSharing:
+    """Engines for different bots share one analysis per bar"""
+
+    def test_comprehensive_analysis_shared_across_engines(self):
+        exchange = CountingExchange()
+        engines = [AdvancedAIEngine(exchange) for _ in range(10)]
+
+        results = [engine.comprehensive_market_analysis('ETH/USDT') for engine in engines]
+        calls_for_one = exchange.calls
+        engines[0].comprehensive_market_analysis('BTC/USDT')
+
+        assert all(result == results[0] for result in results)
+        assert exchange.calls == 2 * calls_for_one
+
+    def test_should_enter_trade_reuses_market_state(self):
+        exchange = CountingExchange()
+        engine = AdvancedAIEngine(exchange)
+
+        first = engine.should_enter_trade('ETH/USDT', 'buy', confidence=80)
+        calls = exchange.calls
+        second = engine.should_enter_trade('ETH/USDT', 'buy', confidence=40)
+
+        assert exchange.calls == calls
+        assert first['analysis']['multi_timeframe']['trend'] == 'BULL'
+        assert first['confidence_adjusted'] != second['confidence_adjusted']
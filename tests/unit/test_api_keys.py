@@ -0,0 +1,107 @@
+"""
+Unit tests for API key validation caching and batched usage counters
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from api_service import APIKeyManager
+from write_behind import WriteBehindBuffer
+
+
+class CountingCollection:
+    """Wraps a mongomock collection, counting reads and applying bulk writes"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.reads = 0
+        self.bulk_writes = []
+
+    def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return self.collection.find_one(*args, **kwargs)
+
+    def bulk_write(self, operations, ordered=True):
+        # mongomock can't take pymongo's operation objects; apply them directly
+        self.bulk_writes.append(operations)
+        for op in operations:
+            self.collection.update_one(op._filter, op._doc)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.api_keys = CountingCollection(mongomock.MongoClient().db['api_keys'])
+        self.db = {'api_keys': self.api_keys}
+        self.writer = WriteBehindBuffer(self.db, start=False)
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def manager(fake_db):
+    return APIKeyManager(fake_db)
+
+
+class TestAPIKeyManager:
+    """Test suite for APIKeyManager caching"""
+
+    def test_repeat_validation_reads_once(self, manager, fake_db):
+        key = manager.generate_api_key('user-1', 'webhook')
+
+        for _ in range(10):
+            assert manager.validate_api_key(key['api_key'], key['api_secret'])
+
+        assert fake_db.api_keys.reads == 1
+
+    def test_wrong_secret_rejected_from_cache(self, manager):
+        key = manager.generate_api_key('user-1', 'webhook')
+        manager.validate_api_key(key['api_key'], key['api_secret'])
+
+        assert manager.validate_api_key(key['api_key'], 'wrong') is None
+
+    def test_usage_counters_coalesce_into_one_write(self, manager, fake_db):
+        key = manager.generate_api_key('user-1', 'webhook')
+        for _ in range(25):
+            manager.validate_api_key(key['api_key'], key['api_secret'])
+
+        fake_db.writer.flush()
+
+        stored = fake_db.api_keys.collection.find_one({'api_key': key['api_key']})
+        assert stored['usage_count'] == 25
+        assert stored['last_used'] is not None
+        assert len(fake_db.api_keys.bulk_writes) == 1
+        assert len(fake_db.api_keys.bulk_writes[0]) == 1
+
+    def test_revoked_key_stops_validating(self, manager):
+        key = manager.generate_api_key('user-1', 'webhook')
+        manager.validate_api_key(key['api_key'], key['api_secret'])
+
+        assert manager.revoke_api_key(key['api_key'], 'user-1')
+
+        assert manager.validate_api_key(key['api_key'], key['api_secret']) is None
+        assert not manager.check_permission(key['api_key'], 'read:bots')
+
+    def test_rate_limit_buckets_do_not_contain_the_key(self, manager):
+        from rate_limit import RateLimitEngine
+
+        key = manager.generate_api_key('user-1', 'webhook')
+        buckets = []
+        engine = RateLimitEngine()
+        hit = engine.hit
+        manager.rate_engine = engine
+        engine.hit = lambda bucket, *args, **kwargs: buckets.append(bucket) or hit(bucket, *args, **kwargs)
+
+        assert manager.check_rate_limit(key['api_key'])
+
+        assert buckets and all(key['api_key'] not in bucket for bucket in buckets)
+        assert buckets[0].startswith('apikey:')
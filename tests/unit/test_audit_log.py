@@ -0,0 +1,99 @@
+"""
+Unit tests for the audit log pipeline
+"""
+import json
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from audit_log import AuditPipeline
+from security import AuditLogger
+
+
+class FlakyCollection:
+    """Wraps a collection; raises while `down` is set"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.down = False
+
+    def create_index(self, *args, **kwargs):
+        return self.collection.create_index(*args, **kwargs)
+
+    def insert_many(self, documents, ordered=True):
+        if self.down:
+            raise ConnectionError('mongo unreachable')
+        return self.collection.insert_many(documents, ordered=ordered)
+
+
+@pytest.fixture
+def audit(tmp_path):
+    collection = FlakyCollection(mongomock.MongoClient().db['audit_logs'])
+    pipeline = AuditPipeline(collection, str(tmp_path / 'audit.jsonl'), batch_size=10, start=False)
+    return AuditLogger(pipeline=pipeline, history=5), collection, tmp_path / 'audit.jsonl'
+
+
+def _spilled(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestAuditPipeline:
+    """Test suite for AuditLogger / AuditPipeline"""
+
+    def test_log_event_does_not_write_until_flush(self, audit):
+        logger, collection, _ = audit
+        for i in range(25):
+            logger.log_event('login', user_id=f'u{i}', ip_address='1.2.3.4')
+
+        assert collection.collection.count_documents({}) == 0
+
+        assert logger.pipeline.flush() == 25
+        assert collection.collection.count_documents({}) == 25
+        assert logger.pipeline.queue_depth == 0
+
+    def test_recent_events_are_bounded(self, audit):
+        logger, _, _ = audit
+        for i in range(20):
+            logger.log_event('login', user_id=f'u{i}')
+
+        assert len(logger.logs) == 5
+        assert logger.logs[-1]['user_id'] == 'u19'
+
+    def test_ttl_index_on_timestamp(self, audit):
+        _, collection, _ = audit
+        indexes = collection.collection.index_information()
+
+        assert any(spec.get('expireAfterSeconds') == 90 * 86400 for spec in indexes.values())
+
+    def test_mongo_failure_spills_to_file_and_backs_off(self, audit):
+        logger, collection, path = audit
+        collection.down = True
+        logger.log_event('login_failed', user_id='u1')
+        logger.pipeline.flush()
+
+        # Mongo is back, but we stay on the file until the backoff expires
+        collection.down = False
+        logger.log_event('login_failed', user_id='u2')
+        logger.pipeline.flush()
+
+        assert [e['user_id'] for e in _spilled(path)] == ['u1', 'u2']
+        assert collection.collection.count_documents({}) == 0
+        assert logger.get_stats()['mongo_paused']
+
+    def test_backlog_beyond_limit_goes_to_file(self, audit):
+        logger, collection, path = audit
+        logger.pipeline.max_pending = 15
+        for i in range(40):
+            logger.log_event('api_call', user_id=f'u{i}')
+
+        logger.pipeline.flush()
+
+        stats = logger.get_stats()
+        assert stats['dropped'] == 10
+        assert stats['spilled'] + stats['written'] == 30
+        assert collection.collection.count_documents({}) == stats['written']
+        assert len(_spilled(path)) == stats['spilled']
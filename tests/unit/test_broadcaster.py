@@ -0,0 +1,144 @@
+"""
+Unit tests for the websocket fan-out broadcaster
+"""
+import asyncio
+import json
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from broadcaster import (
+    Broadcaster, CLOSE, PUBLIC_TOPIC, SLOW_CONSUMER_CODE, user_topic, bot_topic
+)
+
+
+class FakeWebSocket:
+    """Records what was sent; `gate` can hold sends to simulate a slow client"""
+
+    def __init__(self, gate: asyncio.Event = None):
+        self.sent = []
+        self.closed_with = None
+        self.gate = gate
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestBroadcaster:
+    """Test suite for Broadcaster"""
+
+    def test_topics_route_events(self):
+        async def scenario():
+            hub = Broadcaster()
+            public, alice, bob = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+            await hub.connect(public)
+            await hub.connect(alice, [user_topic('alice')])
+            await hub.connect(bob, [user_topic('bob')])
+
+            hub.publish([PUBLIC_TOPIC, user_topic('alice')], {'type': 'trade', 'n': 1})
+            await settle()
+            return public, alice, bob
+
+        public, alice, bob = asyncio.run(scenario())
+
+        assert public.sent == [{'type': 'trade', 'n': 1}]
+        assert alice.sent == [{'type': 'trade', 'n': 1}]
+        assert bob.sent == []
+
+    def test_overlapping_subscriptions_deliver_once(self):
+        async def scenario():
+            hub = Broadcaster()
+            ws = FakeWebSocket()
+            conn = await hub.connect(ws, [user_topic('alice')])
+            hub.subscribe(conn, bot_topic('b1'))
+
+            hub.publish([user_topic('alice'), bot_topic('b1')], {'n': 1})
+            hub.unsubscribe(conn, bot_topic('b1'))
+            hub.publish([bot_topic('b1')], {'n': 2})
+            await settle()
+            return ws
+
+        assert asyncio.run(scenario()).sent == [{'n': 1}]
+
+    def test_slow_client_does_not_block_others(self):
+        async def scenario():
+            hub = Broadcaster(queue_size=3)
+            gate = asyncio.Event()
+            slow, fast = FakeWebSocket(gate), FakeWebSocket()
+            await hub.connect(slow)
+            await hub.connect(fast)
+
+            for n in range(10):
+                hub.publish([PUBLIC_TOPIC], {'n': n})
+                await settle()
+
+            fast_sent = list(fast.sent)
+            gate.set()
+            await settle()
+            return hub, slow, fast_sent
+
+        hub, slow, fast_sent = asyncio.run(scenario())
+
+        assert [m['n'] for m in fast_sent] == list(range(10))
+        # The slow client keeps the newest events, oldest were dropped
+        assert [m['n'] for m in slow.sent][-3:] == [7, 8, 9]
+        assert hub.stats['dropped'] > 0
+
+    def test_close_policy_disconnects_slow_client(self):
+        async def scenario():
+            hub = Broadcaster(queue_size=2, overflow=CLOSE)
+            slow = FakeWebSocket(asyncio.Event())
+            await hub.connect(slow)
+
+            for n in range(5):
+                hub.publish([PUBLIC_TOPIC], {'n': n})
+            await settle()
+            return hub, slow
+
+        hub, slow = asyncio.run(scenario())
+
+        assert slow.closed_with == SLOW_CONSUMER_CODE
+        assert hub.get_stats()['connections'] == 0
+
+    def test_publish_from_another_thread(self):
+        async def scenario():
+            hub = Broadcaster()
+            ws = FakeWebSocket()
+            await hub.connect(ws)
+
+            await asyncio.to_thread(hub.publish, [PUBLIC_TOPIC], {'from': 'thread'})
+            await settle()
+            return ws
+
+        assert asyncio.run(scenario()).sent == [{'from': 'thread'}]
+
+    def test_send_reaches_one_connection(self):
+        async def scenario():
+            hub = Broadcaster()
+            first, second = FakeWebSocket(), FakeWebSocket()
+            conn = await hub.connect(first)
+            await hub.connect(second)
+
+            hub.send(conn, {'type': 'positions_snapshot'})
+            await settle()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+
+        assert first.sent == [{'type': 'positions_snapshot'}]
+        assert second.sent == []
@@ -0,0 +1,75 @@
+"""
+Unit tests for streaming CSV / Parquet export
+"""
+import csv
+import io
+import pytest
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from data_export import (
+    iter_csv_chunks, iter_scanned_export, iter_parquet_chunks, scan_schema, PARQUET_AVAILABLE
+)
+
+# Open trades first, closed ones (with exit_price / pnl) only in a later batch
+BATCHES = [
+    [{'symbol': 'BTC/USDT', 'amount': 1, 'status': 'open', 'entry_time': datetime(2024, 1, 1)}],
+    [{'symbol': 'ETH/USDT', 'amount': 0.5, 'status': 'closed', 'entry_time': datetime(2024, 1, 2),
+      'exit_price': 2100.0, 'pnl': 12.5, 'note': 'manual'},
+     {'symbol': 'SOL/USDT', 'amount': 3, 'status': 'closed', 'pnl': -1, 'note': 7}],
+]
+
+
+def _source():
+    return iter([list(batch) for batch in BATCHES])
+
+
+def _read_parquet(chunks):
+    pq = pytest.importorskip('pyarrow.parquet')
+    return pq.read_table(io.BytesIO(b''.join(chunks))).to_pydict()
+
+
+class TestDataExport:
+    """Test suite for data export"""
+
+    def test_scan_schema_unions_columns_and_widens_types(self):
+        schema = scan_schema(_source())
+
+        assert schema.columns == ['symbol', 'amount', 'status', 'entry_time', 'exit_price', 'pnl', 'note']
+        assert schema.kinds['amount'] == 'float'
+        assert schema.kinds['entry_time'] == 'datetime'
+        assert schema.kinds['note'] == 'string'  # str and int mixed
+
+    def test_csv_keeps_fields_first_seen_in_later_batches(self):
+        text = b''.join(iter_scanned_export(_source, 'csv')).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+        assert 'pnl' in rows[0] and 'exit_price' in rows[0]
+        assert [row['pnl'] for row in rows] == ['', '12.5', '-1']
+
+    def test_csv_without_schema_warns_about_dropped_fields(self, caplog):
+        text = b''.join(iter_csv_chunks(_source())).decode('utf-8')
+
+        assert text.splitlines()[0] == 'symbol,amount,status,entry_time'
+        assert 'pnl' in caplog.text
+
+    @pytest.mark.skipif(not PARQUET_AVAILABLE, reason='pyarrow not installed')
+    def test_parquet_mixed_batches(self):
+        table = _read_parquet(iter_scanned_export(_source, 'parquet'))
+
+        assert table['amount'] == [1.0, 0.5, 3.0]  # not truncated to ints
+        assert table['pnl'] == [None, 12.5, -1.0]
+        assert table['note'] == [None, 'manual', '7']
+        assert table['entry_time'][1] == datetime(2024, 1, 2)
+
+    @pytest.mark.skipif(not PARQUET_AVAILABLE, reason='pyarrow not installed')
+    def test_parquet_without_schema_never_fails_mid_stream(self, caplog):
+        batches = [[{'price': 1.5}], [{'price': 'n/a'}], [{'price': 2}]]
+
+        table = _read_parquet(iter_parquet_chunks(iter(batches)))
+
+        assert table['price'] == [1.5, None, 2.0]
+        assert 'null' in caplog.text
@@ -0,0 +1,122 @@
+"""
+Unit tests for the SQLite trading database
+"""
+import threading
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+pytest.importorskip('pandas')
+
+from database import TradingDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = TradingDatabase(str(tmp_path / 'trading.db'), flush_interval=60)
+    yield database
+    database.close()
+
+
+def _trade(symbol='BTC/USDT', minutes=0):
+    return {
+        'symbol': symbol,
+        'side': 'buy',
+        'entry_price': 100.0,
+        'amount': 1.0,
+        'entry_time': datetime(2024, 1, 1) + timedelta(minutes=minutes),
+    }
+
+
+def _signal(symbol='BTC/USDT'):
+    return {'symbol': symbol, 'signal': 'buy', 'confidence': 70.0, 'price': 100.0}
+
+
+class TestTradingDatabase:
+    """Test suite for TradingDatabase"""
+
+    def test_wal_mode_and_indexes(self, db):
+        assert db.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+        indexes = {row[1] for row in db.conn.execute("PRAGMA index_list('trades')")}
+        assert 'idx_trades_symbol_status_entry' in indexes
+
+        columns = [row[2] for row in db.conn.execute("PRAGMA index_info('idx_trades_symbol_status_entry')")]
+        assert columns == ['symbol', 'status', 'entry_time']
+
+    def test_signals_are_batched_until_flush(self, db):
+        db.save_signals([_signal() for _ in range(3)])
+        db.save_signal(_signal('ETH/USDT'))
+
+        count = db.conn.execute('SELECT COUNT(*) FROM signals').fetchone()[0]
+        assert count == 0
+
+        assert len(db.get_signals()) == 4  # reads flush first
+        assert len(db.get_signals(symbol='ETH/USDT')) == 1
+
+    def test_close_writes_pending_signals(self, tmp_path):
+        path = str(tmp_path / 'closing.db')
+        database = TradingDatabase(path, flush_interval=60)
+        database.save_signal(_signal())
+        database.close()
+
+        reopened = TradingDatabase(path)
+        assert len(reopened.get_signals()) == 1
+        reopened.close()
+
+    def test_trade_lifecycle_and_statistics(self, db):
+        db.save_trades([_trade(minutes=i) for i in range(3)])
+        trade_id = db.save_trade(_trade('ETH/USDT'))
+        assert trade_id == 4
+
+        db.update_trade('ETH/USDT', {
+            'exit_price': 110.0, 'exit_time': datetime(2024, 1, 2), 'pnl': 10.0, 'pnl_percent': 10.0
+        })
+
+        assert len(db.get_open_trades()) == 3
+        stats = db.get_statistics()
+        assert stats['total_trades'] == 1
+        assert stats['winning_trades'] == 1
+        assert stats['total_pnl'] == 10.0
+        assert stats['avg_loss'] == 0
+
+    def test_concurrent_writers_and_readers(self, db):
+        errors = []
+
+        def writer(n):
+            try:
+                for i in range(50):
+                    db.save_trade(_trade(f'S{n}/USDT', minutes=i))
+                    db.save_signal(_signal(f'S{n}/USDT'))
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            try:
+                for _ in range(20):
+                    db.get_trades(limit=10)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        threads += [threading.Thread(target=reader) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert len(db.get_trades(limit=1000)) == 200
+        assert len(db.get_signals(limit=1000)) == 200
+
+    def test_in_memory_database(self):
+        database = TradingDatabase(':memory:')
+        database.save_trade(_trade())
+        database.save_signal(_signal())
+
+        assert len(database.get_trades()) == 1
+        assert len(database.get_signals()) == 1
+        database.close()
@@ -0,0 +1,142 @@
+"""
+Unit tests for deposit reconciliation
+"""
+import pytest
+from datetime import datetime, timedelta
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from deposit_reconciler import DepositReconciler
+
+ADDRESS = 'TAdminDepositAddress'
+NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def is_match(deposit, payment):
+    """Same rules as OKXPaymentHandler._is_matching_deposit"""
+    return (
+        deposit.get('address') == payment['deposit_address']
+        and deposit['amount'] >= payment['crypto_amount'] * 0.98
+        and deposit['status'] in ['ok', 'confirmed']
+    )
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()['trading_bot']
+
+
+@pytest.fixture
+def confirmed():
+    return []
+
+
+@pytest.fixture
+def reconciler(db, fake_deposit_exchange, confirmed):
+    def confirm(payment_id, deposit):
+        confirmed.append((payment_id, deposit['txid']))
+        db['payments'].update_one(
+            {'payment_id': payment_id},
+            {'$set': {'status': 'completed', 'tx_hash': deposit['txid']}}
+        )
+        return {'status': 'completed'}
+
+    return DepositReconciler(
+        fake_deposit_exchange, db['payments'], db['payment_reconciliation'],
+        confirm=confirm, is_match=is_match, page_limit=2
+    )
+
+
+def add_payment(db, payment_id, amount, created_at, currency='USDT'):
+    db['payments'].insert_one({
+        'payment_id': payment_id,
+        'crypto_currency': currency,
+        'crypto_amount': amount,
+        'deposit_address': ADDRESS,
+        'deposit_tag': None,
+        'status': 'pending',
+        'created_at': created_at,
+        'expires_at': created_at + timedelta(hours=2)
+    })
+
+
+class TestDepositReconciler:
+    """Test suite for DepositReconciler"""
+
+    def test_one_fetch_for_many_payments(self, db, reconciler, fake_deposit_exchange):
+        """Pending payments of one currency share a single deposit download"""
+        for i in range(5):
+            add_payment(db, f"p{i}", 29.0, NOW - timedelta(minutes=30 - i))
+
+        result = reconciler.reconcile(now=NOW)
+
+        assert result['fetches'] == 1
+        assert result['pending'] == 5
+        assert len(fake_deposit_exchange.fetch_calls) == 1
+
+    def test_matches_and_pages(self, db, reconciler, fake_deposit_exchange, confirmed):
+        """Deposits beyond the first page are still matched"""
+        add_payment(db, 'p1', 29.0, NOW - timedelta(minutes=30))
+        add_payment(db, 'p2', 99.0, NOW - timedelta(minutes=20))
+        fake_deposit_exchange.add_deposit('elsewhere', 5.0, ms(NOW - timedelta(minutes=25)))
+        fake_deposit_exchange.add_deposit('elsewhere', 6.0, ms(NOW - timedelta(minutes=24)))
+        fake_deposit_exchange.add_deposit(ADDRESS, 99.0, ms(NOW - timedelta(minutes=10)), txid='big')
+        fake_deposit_exchange.add_deposit(ADDRESS, 29.0, ms(NOW - timedelta(minutes=5)), txid='small')
+
+        result = reconciler.reconcile(now=NOW)
+
+        assert result['confirmed'] == 2
+        assert sorted(confirmed) == [('p1', 'small'), ('p2', 'big')]
+
+    def test_deposit_confirms_only_one_payment(self, db, reconciler, fake_deposit_exchange, confirmed):
+        """A single transfer can't pay two invoices at the same address"""
+        add_payment(db, 'p1', 29.0, NOW - timedelta(minutes=30))
+        add_payment(db, 'p2', 29.0, NOW - timedelta(minutes=20))
+        fake_deposit_exchange.add_deposit(ADDRESS, 29.0, ms(NOW - timedelta(minutes=5)), txid='only')
+
+        reconciler.reconcile(now=NOW)
+        reconciler.reconcile(now=NOW)
+
+        assert confirmed == [('p1', 'only')]
+
+    def test_deposit_before_payment_ignored(self, db, reconciler, fake_deposit_exchange, confirmed):
+        """Deposits older than the invoice don't count towards it"""
+        add_payment(db, 'p1', 29.0, NOW - timedelta(minutes=10))
+        fake_deposit_exchange.add_deposit(ADDRESS, 29.0, ms(NOW - timedelta(minutes=30)))
+
+        assert reconciler.reconcile(now=NOW)['confirmed'] == 0
+        assert confirmed == []
+
+    def test_watermark_waits_for_unconfirmed_deposit(self, db, reconciler, fake_deposit_exchange, confirmed):
+        """A deposit still confirming is re-read on the next cycle"""
+        add_payment(db, 'p1', 29.0, NOW - timedelta(minutes=60))
+        deposit = fake_deposit_exchange.add_deposit(
+            ADDRESS, 29.0, ms(NOW - timedelta(minutes=50)), status='pending'
+        )
+        fake_deposit_exchange.add_deposit('elsewhere', 1.0, ms(NOW - timedelta(minutes=1)))
+
+        reconciler.reconcile(now=NOW)
+        assert reconciler.get_watermark('USDT') == deposit['timestamp']
+
+        deposit['status'] = 'ok'
+        reconciler.reconcile(now=NOW)
+
+        assert confirmed == [('p1', deposit['txid'])]
+
+    def test_expired_payments(self, db, reconciler, fake_deposit_exchange):
+        """Expired invoices are closed in bulk and never fetched for"""
+        add_payment(db, 'old', 29.0, NOW - timedelta(hours=3))
+
+        result = reconciler.reconcile(now=NOW)
+
+        assert result['expired'] == 1
+        assert fake_deposit_exchange.fetch_calls == []
+        assert db['payments'].find_one({'payment_id': 'old'})['status'] == 'expired'
@@ -0,0 +1,86 @@
+"""
+Unit tests for the incremental feature store
+"""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from feature_store import FeatureStore
+from ml_predictor import MLPredictor, FEATURE_LOOKBACK
+
+
+@pytest.fixture
+def candles():
+    np.random.seed(7)
+    n = 900
+    index = pd.date_range('2025-01-01', periods=n, freq='h')
+    return pd.DataFrame({
+        'close': 100 + np.cumsum(np.random.randn(n)),
+        'volume': np.random.uniform(100, 1000, n)
+    }, index=index)
+
+
+def _sma_features(df):
+    return pd.DataFrame({
+        'sma_10': df['close'].rolling(10).mean(),
+        'ema_5': df['close'].ewm(span=5, adjust=False).mean(),
+    }, index=df.index)
+
+
+class TestFeatureStore:
+    """Test suite for FeatureStore"""
+
+    def test_incremental_matches_offline(self, candles):
+        """Online rows equal a full-history recompute"""
+        store = FeatureStore(_sma_features, lookback=200, fill=True)
+        offline = store.compute(candles)
+
+        store.update('BTC/USDT', candles.iloc[:300])
+        for end in range(301, len(candles) + 1):
+            store.update('BTC/USDT', candles.iloc[end - 250:end])
+
+        online = store.update('BTC/USDT', candles)
+        np.testing.assert_allclose(
+            online.values, offline.loc[online.index].values, rtol=1e-9
+        )
+        assert store.stats['rebuilds'] == 1
+
+    def test_unchanged_candles_are_a_hit(self, candles):
+        store = FeatureStore(_sma_features, lookback=50)
+        store.update('BTC/USDT', candles)
+        store.update('BTC/USDT', candles)
+
+        assert store.stats['hits'] == 1
+
+    def test_open_candle_is_recomputed(self, candles):
+        """The newest bar keeps changing until it closes"""
+        store = FeatureStore(_sma_features, lookback=50)
+        store.update('BTC/USDT', candles)
+
+        moved = candles.copy()
+        moved.iloc[-1, moved.columns.get_loc('close')] += 10
+        row = store.latest('BTC/USDT', moved)
+
+        assert row['sma_10'] == pytest.approx(moved['close'].iloc[-10:].mean())
+
+    def test_rewound_history_rebuilds(self, candles):
+        store = FeatureStore(_sma_features, lookback=50)
+        store.update('BTC/USDT', candles)
+        store.update('BTC/USDT', candles.iloc[:100])
+
+        assert store.stats['rebuilds'] == 2
+
+    def test_ml_predictor_features_match(self, candles):
+        """MLPredictor's live rows match its training features"""
+        predictor = MLPredictor()
+        offline = predictor.prepare_features(candles)
+
+        for end in range(FEATURE_LOOKBACK + 50, len(candles) + 1, 7):
+            row = predictor.latest_features(candles.iloc[:end], 'ETH/USDT')
+
+        np.testing.assert_allclose(row.values, offline.loc[row.name].values, rtol=1e-8)
+        assert not offline.isna().any().any()
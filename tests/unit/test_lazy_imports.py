@@ -0,0 +1,48 @@
+"""
+Unit tests for lazy imports and cold-start profiling
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from lazy_imports import LazyModule, lazy_import, parse_importtime, profile_imports
+
+
+SAMPLE_IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1500 |     250000 |     sklearn.base
+import time:       800 |     260000 |   sklearn
+import time:      2000 |     300000 | ml_predictor
+"""
+
+
+class TestLazyImports:
+    """Test suite for lazy_imports"""
+
+    def test_lazy_module_loads_on_first_access(self):
+        module = LazyModule('json')
+        assert 'not loaded' in repr(module)
+
+        assert module.dumps({'a': 1}) == '{"a": 1}'
+        assert 'not loaded' not in repr(module)
+
+    def test_already_imported_module_returned_as_is(self):
+        assert lazy_import('os') is os
+
+    def test_parse_importtime(self):
+        rows = parse_importtime(SAMPLE_IMPORTTIME)
+
+        assert [r['module'] for r in rows] == ['_io', 'sklearn.base', 'sklearn', 'ml_predictor']
+        assert [r['depth'] for r in rows] == [1, 2, 1, 0]
+        assert rows[-1]['cumulative_ms'] == pytest.approx(300)
+
+    def test_ml_predictor_does_not_import_sklearn(self):
+        """Bots and the API import ml_predictor; sklearn waits for training"""
+        result = profile_imports('ml_predictor')
+
+        assert result['ok'], result['error']
+        assert 'sklearn' not in result['heavy_modules']
+        assert 'joblib' not in result['heavy_modules']
@@ -0,0 +1,71 @@
+"""
+Unit tests for the ML ensemble predictor
+"""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+pytest.importorskip('sklearn')
+
+from ml_predictor import MLPredictor
+from model_registry import ModelRegistry
+
+SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'XRP/USDT']
+
+
+def _candles(seed, n=700):
+    rng = np.random.RandomState(seed)
+    index = pd.date_range('2025-01-01', periods=n, freq='h')
+    return pd.DataFrame({
+        'close': 100 + np.cumsum(rng.randn(n)),
+        'volume': rng.uniform(100, 1000, n)
+    }, index=index)
+
+
+@pytest.fixture(scope='module')
+def trained(tmp_path_factory):
+    predictor = MLPredictor(registry=ModelRegistry(str(tmp_path_factory.mktemp('models'))))
+    bundle, _ = predictor._fit_bundle(_candles(0))
+    predictor._use_bundle(bundle)
+    return predictor
+
+
+def _reference(predictor, df):
+    """Per-symbol ensemble: one predict / predict_proba call per model"""
+    row = predictor.prepare_features(df).iloc[[-1]]
+    X = predictor.scaler.transform(row[predictor.feature_columns])
+    vote = np.sign(np.mean([model.predict(X)[0] for model in predictor.models.values()]))
+    confidence = np.max(np.mean([model.predict_proba(X)[0] for model in predictor.models.values()], axis=0))
+    return {1: 'buy', -1: 'sell', 0: 'hold'}[int(vote)], float(confidence)
+
+
+class TestMLPredictor:
+    """Test suite for MLPredictor"""
+
+    def test_predict_batch_matches_per_symbol_predict(self, trained):
+        data = {symbol: _candles(seed) for seed, symbol in enumerate(SYMBOLS, start=1)}
+
+        batch = trained.predict_batch(data)
+
+        for symbol, df in data.items():
+            signal, confidence = _reference(trained, df)
+            assert batch[symbol][0] == signal
+            assert batch[symbol][1] == pytest.approx(confidence)
+            assert trained.predict(df, symbol) == batch[symbol]
+
+    def test_bad_symbol_does_not_sink_the_batch(self, trained):
+        data = {'BTC/USDT': _candles(1), 'BAD/USDT': pd.DataFrame({'open': [1.0]})}
+
+        batch = trained.predict_batch(data)
+
+        assert batch['BAD/USDT'] == (None, 0.0)
+        assert batch['BTC/USDT'][0] in ('buy', 'sell', 'hold')
+
+    def test_untrained_returns_no_signal(self, tmp_path):
+        predictor = MLPredictor(registry=ModelRegistry(str(tmp_path)))
+
+        assert predictor.predict_batch({'BTC/USDT': _candles(1)}) == {'BTC/USDT': (None, 0.0)}
@@ -0,0 +1,69 @@
+"""
+Unit tests for the versioned model artifact registry
+"""
+import pytest
+import time
+import numpy as np
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path), max_in_memory=2, keep_versions=2)
+
+
+def _bundle(value):
+    return {'weights': np.full(10, value, dtype=float), 'features': ['a', 'b']}
+
+
+class TestModelRegistry:
+    """Test suite for ModelRegistry"""
+
+    def test_save_creates_versions(self, registry):
+        assert registry.save('BTC/USDT', _bundle(1)) == 1
+        assert registry.save('BTC/USDT', _bundle(2)) == 2
+        assert registry.versions('BTC/USDT') == [1, 2]
+
+    def test_old_versions_pruned(self, registry):
+        for value in range(4):
+            registry.save('BTC/USDT', _bundle(value))
+        assert registry.versions('BTC/USDT') == [3, 4]
+
+    def test_lazy_load_latest_from_disk(self, registry):
+        registry.save('BTC/USDT', _bundle(1))
+        registry.save('BTC/USDT', _bundle(2))
+        registry.evict('BTC/USDT')
+
+        bundle = registry.get('BTC/USDT')
+
+        assert bundle['weights'][0] == 2
+        assert registry.stats['loads'] == 1
+
+    def test_lru_cap(self, registry):
+        for symbol in ('A/USDT', 'B/USDT', 'C/USDT'):
+            registry.put(symbol, _bundle(0))
+
+        assert registry.get_stats()['in_memory'] == 2
+        assert registry.stats['evictions'] == 1
+
+    def test_missing_symbol_returns_none(self, registry):
+        assert registry.get('NOPE/USDT') is None
+
+    def test_train_async_does_not_block(self, registry):
+        def slow_train():
+            time.sleep(0.2)
+            return _bundle(7)
+
+        started = time.perf_counter()
+        assert registry.train_async('ETH/USDT', slow_train)
+        assert time.perf_counter() - started < 0.1
+        # A second request while the first is running is dropped
+        assert not registry.train_async('ETH/USDT', slow_train)
+
+        registry._pool.shutdown(wait=True)
+        assert registry.get('ETH/USDT')['weights'][0] == 7
@@ -0,0 +1,65 @@
+"""
+Unit tests for keyset pagination cursors
+"""
+import pytest
+import json
+from datetime import datetime
+from bson import ObjectId
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from pagination import encode_cursor, decode_cursor, keyset_filter, InvalidCursor, dumps
+
+
+class TestCursor:
+    """Test suite for cursor encoding"""
+
+    def test_datetime_round_trip(self):
+        """Datetime sort values survive encoding"""
+        ts = datetime(2025, 1, 2, 3, 4, 5, 678000)
+        oid = ObjectId()
+
+        value, doc_id = decode_cursor(encode_cursor(ts, oid))
+
+        assert value == ts
+        assert doc_id == oid
+
+    def test_none_sort_value(self):
+        """Rows without a sort value can still be paged past"""
+        oid = ObjectId()
+
+        value, doc_id = decode_cursor(encode_cursor(None, oid))
+
+        assert value is None
+        assert doc_id == oid
+
+    def test_invalid_cursor(self):
+        """Garbage cursors raise InvalidCursor"""
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+
+class TestKeysetFilter:
+    """Test suite for the after-cursor query"""
+
+    def test_no_cursor_keeps_query(self):
+        query = {'user_id': 'abc'}
+        assert keyset_filter(query, 'timestamp', None) is query
+
+    def test_cursor_adds_tie_breaker(self):
+        ts = datetime(2025, 1, 1)
+        oid = ObjectId()
+
+        query = keyset_filter({'user_id': 'abc'}, 'timestamp', encode_cursor(ts, oid))
+
+        assert query['$and'][0] == {'user_id': 'abc'}
+        branches = query['$and'][1]['$or']
+        assert {'timestamp': {'$lt': ts}} in branches
+        assert {'timestamp': ts, '_id': {'$lt': oid}} in branches
+
+    def test_dumps_handles_bson_types(self):
+        oid = ObjectId()
+        out = json.loads(dumps({'_id': oid, 'ts': datetime(2025, 1, 1)}))
+        assert out == {'_id': str(oid), 'ts': '2025-01-01T00:00:00'}
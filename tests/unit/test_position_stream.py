@@ -0,0 +1,115 @@
+"""
+Unit tests for the position & PnL stream
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from position_stream import PositionStream
+from broadcaster import user_topic, bot_topic
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, topics, message):
+        self.events.append((list(topics), message))
+
+    def types(self):
+        return [message['type'] for _, message in self.events]
+
+
+class TickerExchange:
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def fetch_tickers(self, symbols):
+        self.calls.append(list(symbols))
+        return {s: {'last': self.prices[s]} for s in symbols if s in self.prices}
+
+
+@pytest.fixture
+def stream():
+    exchange = TickerExchange({'BTC/USDT': 100.0, 'ETH/USDT': 10.0})
+    publisher = RecordingPublisher()
+    stream = PositionStream(exchange=exchange, publisher=publisher)
+    stream.start = lambda: None  # drive ticks by hand
+    return stream, exchange, publisher
+
+
+class TestPositionStream:
+    """Test suite for PositionStream"""
+
+    def test_one_fetch_for_all_open_symbols(self, stream):
+        stream, exchange, _ = stream
+        stream.open('b1', 'u1', 'BTC/USDT', entry=100.0, amount=1.0)
+        stream.open('b2', 'u1', 'BTC/USDT', entry=90.0, amount=2.0)
+        stream.open('b3', 'u2', 'ETH/USDT', entry=10.0, amount=5.0)
+
+        stream.tick()
+
+        assert exchange.calls == [['BTC/USDT', 'ETH/USDT']]
+
+    def test_only_moved_positions_are_published(self, stream):
+        stream, exchange, publisher = stream
+        stream.open('b1', 'u1', 'BTC/USDT', entry=100.0, amount=1.0)
+        stream.open('b3', 'u2', 'ETH/USDT', entry=10.0, amount=5.0)
+        publisher.events.clear()
+
+        exchange.prices['BTC/USDT'] = 110.0
+        assert stream.tick() == 1
+        assert stream.tick() == 0
+
+        deltas = [m['data'] for _, m in publisher.events if m['type'] == 'position']
+        assert deltas == [{
+            'bot_id': 'b1', 'user_id': 'u1', 'symbol': 'BTC/USDT',
+            'mark_price': 110.0, 'unrealized_pnl': 10.0, 'pnl_percent': 10.0
+        }]
+
+    def test_deltas_go_to_owner_and_bot_topics(self, stream):
+        stream, exchange, publisher = stream
+        stream.open('b1', 'u1', 'BTC/USDT', entry=100.0, amount=1.0)
+        publisher.events.clear()
+
+        stream.mark('BTC/USDT', 105.0)
+
+        topics, message = publisher.events[0]
+        assert message['type'] == 'position'
+        assert user_topic('u1') in topics and bot_topic('b1') in topics
+        assert publisher.events[1] == ([user_topic('u1')], {
+            'type': 'pnl', 'data': {'user_id': 'u1', 'unrealized_pnl': 5.0, 'open_positions': 1}
+        })
+
+    def test_snapshot_and_close(self, stream):
+        stream, exchange, publisher = stream
+        stream.open('b1', 'u1', 'BTC/USDT', entry=100.0, amount=1.0)
+        stream.open('b3', 'u2', 'ETH/USDT', entry=10.0, amount=5.0)
+        exchange.prices['BTC/USDT'] = 120.0
+        stream.tick()
+
+        assert stream.snapshot('u1')['unrealized_pnl'] == 20.0
+        assert stream.snapshot()['count'] == 2
+
+        stream.close('b1', reason='take_profit')
+        stream.close('b1')
+
+        assert stream.snapshot('u1')['count'] == 0
+        assert publisher.types().count('position_closed') == 1
+        assert publisher.events[-1][1]['data']['open_positions'] == 0
+
+    def test_fetch_failure_keeps_last_marks(self, stream):
+        stream, exchange, _ = stream
+        stream.open('b1', 'u1', 'BTC/USDT', entry=100.0, amount=1.0)
+        stream.mark('BTC/USDT', 101.0)
+
+        def broken(symbols):
+            raise ConnectionError('exchange down')
+        exchange.fetch_tickers = broken
+
+        assert stream.tick() == 0
+        assert stream.stats['tick_errors'] == 1
+        assert stream.price('BTC/USDT') == 101.0
@@ -0,0 +1,71 @@
+"""
+Unit tests for the in-memory price quote service
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from price_quotes import PriceQuoteService, QuoteUnavailable
+
+
+class FakeTickerExchange:
+    """Counts fetch_tickers calls and serves fixed prices"""
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def fetch_tickers(self, symbols):
+        self.calls.append(list(symbols))
+        return {s: {'symbol': s, 'last': self.prices[s]} for s in symbols if s in self.prices}
+
+
+@pytest.fixture
+def exchange():
+    return FakeTickerExchange({'BTC/USDT': 50000.0, 'ETH/USDT': 2500.0})
+
+
+class TestPriceQuoteService:
+    """Test suite for PriceQuoteService"""
+
+    def test_single_batched_refresh(self, exchange):
+        """One fetch_tickers call covers every non-stable currency"""
+        quotes = PriceQuoteService(exchange, ['BTC', 'ETH', 'USDT'], start=False)
+
+        assert quotes.refresh() == 2
+        assert exchange.calls == [['BTC/USDT', 'ETH/USDT']]
+
+    def test_lookups_do_not_hit_exchange(self, exchange):
+        quotes = PriceQuoteService(exchange, ['BTC', 'ETH'], start=False)
+        quotes.refresh()
+
+        for _ in range(10):
+            assert quotes.get_price('BTC') == 50000.0
+        assert quotes.get_price('USDC') == 1.0
+        assert len(exchange.calls) == 1
+
+    def test_stale_quote_refused(self, exchange):
+        """Quotes past max_staleness are never used to price an invoice"""
+        quotes = PriceQuoteService(exchange, ['BTC'], ttl=0.0, max_staleness=0.0, start=False)
+        quotes.refresh()
+
+        with pytest.raises(QuoteUnavailable):
+            quotes.get_price('BTC')
+
+    def test_failed_refresh_keeps_last_quote(self, exchange):
+        quotes = PriceQuoteService(exchange, ['BTC'], start=False)
+        quotes.refresh()
+
+        exchange.prices = {}
+        quotes.refresh()
+
+        assert quotes.get_price('BTC') == 50000.0
+
+    def test_missing_quote(self, exchange):
+        quotes = PriceQuoteService(exchange, ['SOL'], warmup_timeout=0, start=False)
+        quotes.refresh()
+
+        with pytest.raises(QuoteUnavailable):
+            quotes.get_price('SOL')
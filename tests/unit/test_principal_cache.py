@@ -0,0 +1,111 @@
+"""
+Unit tests for the authenticated principal cache
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from principal_cache import PrincipalCache, InvalidatingCollection
+
+
+@pytest.fixture
+def users():
+    cache = PrincipalCache(ttl=60)
+    collection = InvalidatingCollection(mongomock.MongoClient().db['users'], cache)
+    collection.insert_one({'email': 'a@example.com', 'role': 'user', 'subscription': 'free'})
+    collection.insert_one({'email': 'b@example.com', 'role': 'user', 'subscription': 'free'})
+    return cache, collection
+
+
+def _load(cache, collection, email):
+    return cache.get(email, lambda subject: collection.find_one({'email': subject}))
+
+
+class TestPrincipalCache:
+    """Test suite for PrincipalCache"""
+
+    def test_repeat_lookups_hit_cache(self, users):
+        cache, collection = users
+        reads = []
+
+        def loader(subject):
+            reads.append(subject)
+            return collection.find_one({'email': subject})
+
+        for _ in range(5):
+            cache.get('a@example.com', loader)
+
+        assert reads == ['a@example.com']
+        assert cache.get_stats()['hit_rate'] == pytest.approx(0.8)
+
+    def test_entries_expire(self, users):
+        cache, collection = users
+        cache.ttl = 0
+        _load(cache, collection, 'a@example.com')
+        _load(cache, collection, 'a@example.com')
+
+        assert cache.stats['expired'] == 1
+
+    def test_unknown_user_not_cached(self, users):
+        cache, collection = users
+        assert _load(cache, collection, 'nobody@example.com') is None
+        assert cache.get_stats()['size'] == 0
+
+    def test_returned_user_is_a_copy(self, users):
+        cache, collection = users
+        _load(cache, collection, 'a@example.com').pop('role')
+
+        assert _load(cache, collection, 'a@example.com')['role'] == 'user'
+
+    def test_update_by_email_invalidates(self, users):
+        cache, collection = users
+        _load(cache, collection, 'a@example.com')
+        _load(cache, collection, 'b@example.com')
+
+        collection.update_one({'email': 'a@example.com'}, {'$set': {'role': 'admin'}})
+
+        assert _load(cache, collection, 'a@example.com')['role'] == 'admin'
+        assert cache.get_stats()['size'] == 2
+        assert cache.stats['misses'] == 3
+
+    def test_update_by_id_invalidates(self, users):
+        cache, collection = users
+        user = _load(cache, collection, 'a@example.com')
+
+        collection.update_one({'_id': user['_id']}, {'$set': {'subscription': 'pro'}})
+
+        assert _load(cache, collection, 'a@example.com')['subscription'] == 'pro'
+
+    def test_delete_invalidates(self, users):
+        cache, collection = users
+        _load(cache, collection, 'b@example.com')
+
+        collection.delete_one({'email': 'b@example.com'})
+
+        assert _load(cache, collection, 'b@example.com') is None
+
+    def test_unrecognised_filter_clears_everything(self, users):
+        cache, collection = users
+        _load(cache, collection, 'a@example.com')
+        _load(cache, collection, 'b@example.com')
+
+        collection.update_many({'subscription': 'free'}, {'$set': {'subscription': 'basic'}})
+
+        assert cache.get_stats()['size'] == 0
+
+    def test_load_racing_a_write_is_not_stored(self, users):
+        cache, collection = users
+
+        def stale_loader(subject):
+            user = collection.find_one({'email': subject})
+            # A write lands between our read and the store
+            collection.update_one({'email': subject}, {'$set': {'role': 'admin'}})
+            return user
+
+        cache.get('a@example.com', stale_loader)
+
+        assert _load(cache, collection, 'a@example.com')['role'] == 'admin'
@@ -0,0 +1,131 @@
+"""
+Unit tests for the declared index schema and the query profiler
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from index_schema import INDEX_SCHEMA, covering_index, ensure_indexes, idx, suggest_index
+from query_profiler import ProfiledDatabase, QueryProfiler, classify, query_shape
+
+
+def _collscan_explain(examined, returned):
+    return {
+        'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}},
+        'executionStats': {'totalDocsExamined': examined, 'totalKeysExamined': 0, 'nReturned': returned},
+    }
+
+
+class TestIndexSchema:
+    """Test suite for the index schema"""
+
+    def test_ensure_indexes_creates_declared_indexes(self):
+        db = mongomock.MongoClient().db
+
+        result = ensure_indexes(db)
+
+        assert result['failed'] == 0
+        keys = [list(spec['key']) for spec in db['trades'].index_information().values()]
+        assert [('user_id', 1), ('status', 1), ('exit_time', 1)] in keys
+        unique = [spec for spec in db['performance'].index_information().values() if spec.get('unique')]
+        assert list(unique[0]['key']) == [('date', 1)]
+
+    def test_conflicting_index_does_not_block_the_rest(self):
+        db = mongomock.MongoClient().db
+        db['users'].create_index('email', unique=True, name='email_1')
+        schema = {'users': [idx('email'), idx('-created_at')]}
+
+        result = ensure_indexes(db, schema)
+
+        assert result == {'created': 1, 'failed': 1}
+        assert 'created_at_-1' in db['users'].index_information()
+
+    def test_covering_index_and_suggestion(self):
+        assert covering_index('trades', ['status', 'user_id'], [], ['exit_time']) is not None
+        assert covering_index('trades', ['bot_id', 'side'], ['timestamp'], []) is not None
+        assert covering_index('trades', ['exit_reason'], [], []) is None
+        assert covering_index('trades', [], [], []) is None
+        assert all(spec.keys for specs in INDEX_SCHEMA.values() for spec in specs)
+
+        assert suggest_index(['user_id'], [('timestamp', -1)], ['pnl', 'timestamp']) == [
+            ('user_id', 1), ('timestamp', -1), ('pnl', 1)
+        ]
+
+
+class TestQueryProfiler:
+    """Test suite for QueryProfiler"""
+
+    def test_shapes_hide_values_and_split_fields(self):
+        query = {'user_id': 'u1', 'status': {'$in': ['open']}, 'exit_time': {'$gte': 5}}
+
+        assert query_shape(query) == {'exit_time': {'$gte': 1}, 'status': {'$in': 1}, 'user_id': 1}
+        assert query_shape({'user_id': 'u2', 'status': {'$in': ['closed', 'open']},
+                            'exit_time': {'$gte': 9}}) == query_shape(query)
+        assert classify(query) == (['user_id', 'status'], ['exit_time'])
+
+    def test_profiled_database_records_queries(self):
+        profiler = QueryProfiler(explain=False)
+        db = ProfiledDatabase(mongomock.MongoClient().db, profiler)
+        db['trades'].insert_many([{'user_id': 'u1', 'timestamp': i} for i in range(5)])
+
+        rows = list(db['trades'].find({'user_id': 'u1'}).sort('timestamp', -1).limit(3))
+        db['trades'].find_one({'user_id': 'u2'})
+        db['trades'].count_documents({'user_id': 'u1'})
+        db['trades'].update_one({'user_id': 'u1'}, {'$set': {'seen': True}})
+
+        assert len(rows) == 3
+        report = {(row['op'], row['collection']): row for row in profiler.report()}
+        find = report[('find', 'trades')]
+        assert find['count'] == 1
+        assert find['sort'] == [('timestamp', -1)]
+        assert find['declared_index'] == [['user_id', 1], ['timestamp', -1], ['_id', -1]]
+        assert find['suggested_index'] is None
+        assert {'find_one', 'count', 'update_one'} <= {op for op, _ in report}
+        assert profiler.get_stats()['queries'] == 4
+
+    def test_collection_scan_is_flagged_with_a_suggestion(self):
+        profiler = QueryProfiler(explain=False)
+        collection = mongomock.MongoClient().db['trades']
+        query = {'exit_reason': 'stop_loss', 'pnl': {'$lt': 0}}
+
+        profiler.record(collection, 'find', query, [('timestamp', -1)], 250.0, returned=2)
+        key = next(iter(profiler._shapes))
+        collection.database.command = lambda *args, **kwargs: _collscan_explain(5000, 2)
+        profiler.explain_now(key, collection, query, [('timestamp', -1)])
+
+        row = profiler.unindexed()[0]
+        assert row['examined_per_returned'] == 2500.0
+        assert row['explain']['collection_scan'] and row['explain']['in_memory_sort']
+        assert row['suggested_index'] == [('exit_reason', 1), ('timestamp', -1), ('pnl', 1)]
+        assert profiler.get_stats()['slow'] == 1
+
+    def test_partially_read_cursors_are_recorded(self):
+        profiler = QueryProfiler()
+        db = ProfiledDatabase(mongomock.MongoClient().db, profiler)
+        db['trades'].insert_many([{'user_id': 'u1', 'timestamp': i} for i in range(5)])
+
+        cursor = db['trades'].find({'user_id': 'u1'})
+        next(cursor)
+        cursor.close()
+        with db['signals'].find({'symbol': 'BTC/USDT'}) as signals:
+            list(signals)
+        for _ in db['trades'].find({'status': 'open'}).limit(1):
+            break
+
+        report = {(row['op'], row['collection'], repr(row['shape'])): row for row in profiler.report()}
+        assert report[('find', 'trades', repr({'user_id': 1}))]['count'] == 1
+        assert ('find', 'signals', repr({'symbol': 1})) in report
+        assert profiler.get_stats()['queries'] == 3  # the with-block one is not counted twice
+
+    def test_explain_sampling_is_opt_in(self):
+        profiler = QueryProfiler()
+        db = ProfiledDatabase(mongomock.MongoClient().db, profiler)
+
+        db['trades'].find_one({'user_id': 'u1'})
+
+        assert profiler._explain_queue.empty()
+        assert profiler.get_stats()['explained'] == 0
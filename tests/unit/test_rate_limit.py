@@ -0,0 +1,113 @@
+"""
+Unit tests for the shared rate limiting engine
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from rate_limit import RateLimitEngine, MemoryBackend, RedisBackend, REDIS_AVAILABLE
+from security import RateLimiter
+from api_service import APIRateLimiter
+
+
+@pytest.fixture
+def engine():
+    return RateLimitEngine()
+
+
+class TestRateLimitEngine:
+    """Test suite for RateLimitEngine (memory backend)"""
+
+    def test_allows_up_to_limit_then_blocks(self, engine):
+        decisions = [engine.hit('k', [(5, 60)], now=1000) for _ in range(6)]
+
+        assert [d.allowed for d in decisions] == [True] * 5 + [False]
+        assert [d.remaining for d in decisions[:5]] == [4, 3, 2, 1, 0]
+        assert decisions[-1].retry_after == pytest.approx(12)
+
+    def test_budget_refills_over_the_window(self, engine):
+        for _ in range(5):
+            engine.hit('k', [(5, 60)], now=1000)
+
+        assert not engine.hit('k', [(5, 60)], now=1011).allowed
+        assert engine.hit('k', [(5, 60)], now=1012).allowed
+        assert engine.peek('k', [(5, 60)], now=1072).remaining == 4
+
+    def test_denied_request_consumes_nothing(self, engine):
+        """A request blocked by one limit doesn't count against the others"""
+        limits = [(2, 60), (100, 3600)]
+        for _ in range(10):
+            engine.hit('k', limits, now=1000)
+
+        assert engine.peek('k', [(100, 3600)], now=1000).remaining == 97
+
+    def test_keys_are_independent(self, engine):
+        engine.hit('a', [(1, 60)], now=1000)
+
+        assert engine.hit('b', [(1, 60)], now=1000).allowed
+
+    def test_idle_keys_are_evicted(self):
+        backend = MemoryBackend()
+        engine = RateLimitEngine(backend)
+        for i in range(100):
+            engine.hit(f'ip-{i}', [(10, 60)], now=1000)
+
+        engine.hit('late', [(10, 60)], now=2000)
+
+        assert len(backend) == 1
+
+    def test_max_keys_bounds_memory(self):
+        backend = MemoryBackend(max_keys=10)
+        engine = RateLimitEngine(backend)
+        for i in range(50):
+            engine.hit(f'ip-{i}', [(10, 60)], now=1000)
+
+        assert len(backend) == 10
+
+    def test_backend_failure_falls_back_to_memory(self):
+        class BrokenBackend:
+            def apply(self, *args):
+                raise ConnectionError('redis down')
+
+        engine = RateLimitEngine(BrokenBackend())
+
+        assert engine.hit('k', [(1, 60)], now=1000).allowed
+        assert not engine.hit('k', [(1, 60)], now=1000).allowed
+        assert engine.stats['backend_errors'] == 2
+
+
+class TestLimiterFrontends:
+    """security.RateLimiter and APIRateLimiter on the shared engine"""
+
+    def test_security_rate_limiter(self, engine):
+        limiter = RateLimiter(requests_per_minute=5, engine=engine)
+        results = [limiter.is_allowed('test_user') for _ in range(7)]
+
+        assert results == [True] * 5 + [False, False]
+        assert 1 <= limiter.get_retry_after('test_user') <= 12
+
+    def test_api_rate_limiter(self, engine):
+        limiter = APIRateLimiter(engine=engine)
+        first = limiter.check_rate_limit('key', limit=2, window=60)
+        limiter.check_rate_limit('key', limit=2, window=60)
+        blocked = limiter.check_rate_limit('key', limit=2, window=60)
+
+        assert first['allowed'] and first['remaining'] == 1
+        assert not blocked['allowed'] and blocked['retry_after'] > 0
+
+
+@pytest.mark.skipif(not (REDIS_AVAILABLE and os.getenv('REDIS_URL')), reason='needs a Redis server')
+class TestRedisBackend:
+    """Same semantics with state in Redis"""
+
+    def test_limits_shared_between_engines(self):
+        import redis
+        client = redis.Redis.from_url(os.getenv('REDIS_URL'))
+        client.delete('test-ratelimit:k:3:60')
+        workers = [RateLimitEngine(RedisBackend(client, prefix='test-ratelimit')) for _ in range(2)]
+
+        decisions = [workers[i % 2].hit('k', [(3, 60)], now=1000) for i in range(4)]
+
+        assert [d.allowed for d in decisions] == [True, True, True, False]
@@ -0,0 +1,80 @@
+"""
+Unit tests for the shared regime service
+"""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from regime_service import RegimeService, state_from_frame
+
+
+@pytest.fixture
+def ohlcv():
+    np.random.seed(3)
+    n = 300
+    close = 100 + np.cumsum(np.random.randn(n))
+    return pd.DataFrame({
+        'timestamp': np.arange(n) * 3_600_000,
+        'open': close,
+        'high': close + np.random.uniform(0, 1, n),
+        'low': close - np.random.uniform(0, 1, n),
+        'close': close,
+        'volume': np.random.uniform(100, 1000, n)
+    })
+
+
+class TestRegimeService:
+    """Test suite for RegimeService"""
+
+    def test_state_matches_pandas(self, ohlcv):
+        """Numpy state equals the pandas rolling computations it replaced"""
+        df = ohlcv.tail(100)
+        state = state_from_frame(df)
+
+        volatility = df['close'].pct_change().rolling(20).std()
+        assert state['current_vol'] == pytest.approx(volatility.iloc[-1])
+        assert state['avg_vol'] == pytest.approx(volatility.mean())
+        assert state['sma_50'] == pytest.approx(df['close'].rolling(50).mean().iloc[-1])
+        assert state['prev_high_10'] == pytest.approx(df['high'].rolling(10).max().iloc[-2])
+
+    def test_same_bar_is_cached(self, ohlcv):
+        service = RegimeService()
+        frame = ohlcv.iloc[:100]
+
+        first = service.get_state('BTC/USDT', '1h', frame)
+        second = service.get_state('BTC/USDT', '1h', frame)
+
+        assert first is second
+        assert service.stats == {'hits': 1, 'updates': 0, 'rebuilds': 1}
+
+    def test_incremental_matches_fresh_window(self, ohlcv):
+        """Advancing bar by bar gives the state of the latest 100 bars"""
+        service = RegimeService(history=100)
+        for end in range(100, len(ohlcv) + 1):
+            state = service.get_state('ETH/USDT', '1h', ohlcv.iloc[end - 100:end])
+
+        expected = state_from_frame(ohlcv.tail(100))
+        for key in ('current_vol', 'avg_vol', 'sma_20', 'sma_50', 'persistence'):
+            assert state[key] == pytest.approx(expected[key])
+        assert service.stats['rebuilds'] == 1
+
+    def test_open_bar_replaced_by_final_values(self, ohlcv):
+        service = RegimeService(history=100)
+        partial = ohlcv.iloc[:100].copy()
+        partial.loc[partial.index[-1], 'close'] = 1.0
+        service.get_state('BTC/USDT', '1h', partial)
+
+        state = service.get_state('BTC/USDT', '1h', ohlcv.iloc[1:101])
+
+        assert state['sma_20'] == pytest.approx(ohlcv['close'].iloc[81:101].mean())
+
+    def test_timeframes_are_separate(self, ohlcv):
+        service = RegimeService()
+        service.get_state('BTC/USDT', '1h', ohlcv)
+        service.get_state('BTC/USDT', '4h', ohlcv)
+
+        assert service.get_stats()['keys'] == 2
@@ -0,0 +1,110 @@
+"""
+Unit tests for the background sentiment service
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from sentiment_service import SentimentService, BatchTextScorer, NEUTRAL
+
+
+class CountingSource:
+    """Per-symbol source that records every batch it is asked for"""
+
+    def __init__(self, score=0.8):
+        self.score = score
+        self.calls = []
+
+    def __call__(self, symbols):
+        self.calls.append(list(symbols))
+        return {symbol: self.score for symbol in symbols}
+
+
+@pytest.fixture
+def service():
+    return SentimentService({'news': 0.5, 'fear_greed': 0.5}, start=False)
+
+
+class TestSentimentService:
+    """Test suite for SentimentService"""
+
+    def test_unrefreshed_symbol_reads_neutral(self, service):
+        service.add_source('news', CountingSource(), 60)
+
+        result = service.get('BTC/USDT')
+
+        assert result['composite_sentiment'] == pytest.approx(NEUTRAL)
+        assert result['age_seconds'] is None
+        assert not result['complete']
+
+    def test_sources_batch_all_symbols(self, service):
+        news = CountingSource(0.8)
+        service.add_source('news', news, 60)
+        service.add_source('fear_greed', lambda: 0.2, 3600, per_symbol=False)
+        service.track('BTC/USDT')
+        service.track('ETH/USDT')
+
+        service.refresh_due(now=1000)
+        result = service.get('ETH/USDT')
+
+        assert news.calls == [['BTC/USDT', 'ETH/USDT']]
+        assert result['composite_sentiment'] == pytest.approx(0.5)
+        assert result['complete']
+
+    def test_sources_refresh_on_their_own_interval(self, service):
+        news = CountingSource()
+        fear_greed_calls = []
+        service.add_source('news', news, 60)
+        service.add_source('fear_greed', lambda: fear_greed_calls.append(1) or 0.5, 3600,
+                           per_symbol=False)
+        service.track('BTC/USDT')
+
+        service.refresh_due(now=1000)
+        service.refresh_due(now=1030)
+        service.refresh_due(now=1060)
+
+        assert len(news.calls) == 2
+        assert len(fear_greed_calls) == 1
+
+    def test_new_symbol_fetched_before_interval(self, service):
+        news = CountingSource()
+        service.add_source('news', news, 60)
+        service.track('BTC/USDT')
+        service.refresh_due(now=1000)
+
+        service.track('SOL/USDT')
+        service.refresh_due(now=1010)
+
+        assert news.calls == [['BTC/USDT'], ['SOL/USDT']]
+
+    def test_failed_source_keeps_last_value(self, service):
+        scores = iter([0.9])
+
+        def flaky(symbols):
+            return {symbol: next(scores) for symbol in symbols}
+
+        service.add_source('news', flaky, 60)
+        service.track('BTC/USDT')
+        service.refresh_due(now=1000)
+        service.refresh_due(now=1060)
+
+        assert service.get('BTC/USDT')['individual_scores']['news'] == 0.9
+        assert service.get_stats()['sources']['news']['errors'] == 1
+
+
+class TestBatchTextScorer:
+    """Test suite for BatchTextScorer"""
+
+    def test_each_text_scored_once(self):
+        seen = []
+        scorer = BatchTextScorer(lambda text: seen.append(text) or len(text) / 10)
+
+        first = scorer.score_many(['up', 'down', 'up'])
+        second = scorer.score_many(['down', 'flat'])
+
+        assert first == [0.2, 0.4, 0.2]
+        assert second == [0.4, 0.4]
+        assert seen == ['up', 'down', 'flat']
+        assert scorer.stats == {'scored': 3, 'cached': 2}
@@ -0,0 +1,204 @@
+"""
+Unit tests for time-series storage and price rollups
+"""
+import pytest
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from timeseries_store import (
+    TimeSeriesStore, ROLLUP_TIERS, bucket_start, ensure_timeseries, rollup_pipeline, series_specs
+)
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.inserts = []
+
+    def insert(self, collection, document):
+        self.inserts.append((collection, document))
+
+
+class RecordingDb:
+    """Enough of a Database to see which commands and pipelines are sent"""
+
+    def __init__(self, collections=()):
+        self.collections = list(collections)
+        self.commands = []
+        self.pipelines = []
+        self.state = {}
+
+    def list_collections(self, filter=None):
+        return [c for c in self.collections if c['name'] == filter['name']]
+
+    def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+    def __getitem__(self, name):
+        db = self
+
+        class Collection:
+            def aggregate(self, pipeline):
+                db.pipelines.append((name, pipeline))
+                return iter([])
+
+            def find_one(self, filter):
+                return db.state.get(filter['_id'])
+
+            def update_one(self, filter, update, upsert=False):
+                db.state[filter['_id']] = {'_id': filter['_id'], **update['$max']}
+
+        return Collection()
+
+
+class MongomockDb:
+    """mongomock database plus the list_collections() it lacks"""
+
+    def __init__(self):
+        self.db = mongomock.MongoClient().db
+
+    def list_collections(self, filter=None):
+        return [{'name': name, 'type': 'collection'} for name in self.db.list_collection_names()
+                if name == filter['name']]
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __getitem__(self, name):
+        return self.db[name]
+
+
+class TestTimeSeriesStore:
+    """Test suite for TimeSeriesStore"""
+
+    def test_falls_back_to_ttl_indexes(self):
+        db = MongomockDb()
+        store = TimeSeriesStore(db, RecordingWriter(), signal_days=30)
+
+        modes = store.ensure()
+
+        assert modes == {'signals': 'ttl_index', 'performance_snapshots': 'ttl_index',
+                         'price_samples': 'ttl_index'}
+        ttls = {spec['key'][0][0]: spec.get('expireAfterSeconds')
+                for spec in db['signals'].index_information().values()}
+        assert ttls['timestamp'] == 30 * 86400
+
+        rollup_indexes = db['price_1h'].index_information().values()
+        assert any(spec.get('unique') for spec in rollup_indexes)
+
+    def test_existing_timeseries_gets_retention_updated(self):
+        db = RecordingDb([{'name': 'signals', 'type': 'timeseries'}])
+        spec = series_specs(45, 90, 7)[0]
+
+        assert ensure_timeseries(db, spec) == 'timeseries'
+        assert db.commands == [(('collMod', 'signals'), {'expireAfterSeconds': 45 * 86400})]
+
+    def test_writes_are_queued(self):
+        writer = RecordingWriter()
+        store = TimeSeriesStore(mongomock.MongoClient().db, writer)
+
+        store.record_price('BTC/USDT', 100.0)
+        store.record_price('BTC/USDT', 0)
+        store.record_snapshot({'capital': 1000.0})
+
+        assert [c for c, _ in writer.inserts] == ['price_samples', 'performance_snapshots']
+        assert writer.inserts[0][1]['symbol'] == 'BTC/USDT'
+
+    def test_rollup_pipelines(self):
+        raw = rollup_pipeline(ROLLUP_TIERS['1m'], datetime(2024, 1, 1))
+        bars = rollup_pipeline(ROLLUP_TIERS['1h'], datetime(2024, 1, 1))
+
+        assert raw[2]['$group']['open'] == {'$first': '$price'}
+        assert raw[2]['$group']['samples'] == {'$sum': 1}
+        assert bars[2]['$group']['high'] == {'$max': '$high'}
+        assert bars[2]['$group']['samples'] == {'$sum': '$samples'}
+        assert bars[-1]['$merge']['into'] == 'price_1h'
+        assert bars[-1]['$merge']['on'] == ['symbol', 'timestamp']
+
+    def test_rollup_only_revisits_recent_buckets(self):
+        db = RecordingDb()
+        store = TimeSeriesStore(db, RecordingWriter(), price_days=7)
+        now = datetime(2024, 3, 10, 12, 30, 15)
+
+        store.rollup(now)
+        store.rollup(now + timedelta(minutes=5))
+
+        first, second = db.pipelines[:3], db.pipelines[3:]
+        assert [source for source, _ in first] == ['price_samples', 'price_1m', 'price_1h']
+        assert first[0][1][0]['$match']['timestamp']['$gte'] == datetime(2024, 3, 3, 12, 29)
+        assert second[0][1][0]['$match']['timestamp']['$gte'] == datetime(2024, 3, 10, 12, 29)
+        assert second[1][1][0]['$match']['timestamp']['$gte'] == datetime(2024, 3, 10, 11, 0)
+        assert second[2][1][0]['$match']['timestamp']['$gte'] == datetime(2024, 3, 9)
+
+    def test_restart_resumes_from_stored_progress(self):
+        db = RecordingDb()
+        now = datetime(2024, 3, 10, 12, 30, 15)
+        TimeSeriesStore(db, RecordingWriter(), price_days=7).rollup(now)
+
+        assert db.state['price_1m']['rolled_until'] == now
+        db.pipelines.clear()
+        TimeSeriesStore(db, RecordingWriter(), price_days=7).rollup(now + timedelta(minutes=5))
+
+        assert db.pipelines[0][1][0]['$match']['timestamp']['$gte'] == datetime(2024, 3, 10, 12, 29)
+
+    def test_cleanup_does_not_change_signal_retention(self):
+        from mongodb_database import MongoTradingDatabase
+
+        db = MongomockDb()
+        mongo = MongoTradingDatabase.__new__(MongoTradingDatabase)
+        mongo.signals = db['signals']
+        mongo.timeseries = TimeSeriesStore(db, RecordingWriter(), signal_days=90)
+        db['signals'].insert_many([
+            {'symbol': 'BTC/USDT', 'timestamp': datetime.now() - timedelta(days=age)} for age in (1, 40, 100)
+        ])
+
+        assert mongo.cleanup_old_data(days=90) == 0
+        assert mongo.cleanup_old_data(days=30) == 2
+        assert db['signals'].count_documents({}) == 1
+        assert mongo.timeseries.specs[0].ttl_days == 90
+
+        mongo.set_signal_retention(30)
+
+        assert mongo.timeseries.specs[0].ttl_days == 30
+        ttls = {spec['key'][0][0]: spec.get('expireAfterSeconds')
+                for spec in db['signals'].index_information().values()}
+        assert ttls['timestamp'] == 30 * 86400
+
+    def test_bucket_start(self):
+        moment = datetime(2024, 3, 10, 12, 30, 15)
+
+        assert bucket_start(moment, 60) == datetime(2024, 3, 10, 12, 30)
+        assert bucket_start(moment, 3600) == datetime(2024, 3, 10, 12)
+        assert bucket_start(moment, 86400) == datetime(2024, 3, 10)
+
+    def test_background_thread_rolls_up_without_reads(self):
+        db = RecordingDb()
+        store = TimeSeriesStore(db, RecordingWriter(), rollup_interval=0.01)
+
+        store.start()
+        deadline = time.monotonic() + 2
+        while store.stats['rollups'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        store.close()
+
+        assert store.stats['rollups'] >= 2
+        assert [source for source, _ in db.pipelines[:3]] == ['price_samples', 'price_1m', 'price_1h']
+        assert not store.get_stats()['rollup_thread_alive']
+
+    def test_history_is_read_only(self):
+        db = mongomock.MongoClient().db
+        db['price_1h'].insert_many([
+            {'symbol': 'BTC/USDT', 'timestamp': datetime(2024, 1, 1, hour), 'close': 100.0 + hour}
+            for hour in range(5)
+        ])
+        store = TimeSeriesStore(db, RecordingWriter())
+
+        bars = store.history('BTC/USDT', '1h', limit=3)
+
+        assert [bar['close'] for bar in bars] == [102.0, 103.0, 104.0]
+        assert store.stats['rollups'] == 0
@@ -0,0 +1,234 @@
+"""
+Unit tests for incremental trade analytics
+"""
+import pytest
+import sys
+import time
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from trade_analytics import TradeAnalytics, compounded_drawdown, return_percentile
+
+
+class AnalyticsDb:
+    """Just what AITradingAssistant / PerformanceAnalytics read from"""
+
+    def __init__(self):
+        self.db = mongomock.MongoClient().db
+        self.trades = self.db['trades']
+        self.analytics = TradeAnalytics(self.db)
+
+
+def _close(analytics, pnl, hour=10, day=1, held_minutes=30, symbol='BTC/USDT', user_id='u1'):
+    opened = datetime(2024, 1, day, hour)
+    analytics.record_close(user_id, symbol, pnl=pnl, opened_at=opened,
+                           closed_at=opened + timedelta(minutes=held_minutes),
+                           entry_value=1000.0, strategy='momentum')
+
+
+def _trade(pnl, hour=10, day=1, held_minutes=30, symbol='BTC/USDT', user_id='u1'):
+    """The trades document behind _close(), for tests that backfill"""
+    opened = datetime(2024, 1, day, hour)
+    return {'user_id': user_id, 'symbol': symbol, 'status': 'closed', 'pnl': pnl,
+            'entry_price': 1000.0, 'amount': 1.0, 'entry_time': opened,
+            'exit_time': opened + timedelta(minutes=held_minutes), 'strategy': 'momentum'}
+
+
+def _closed_trade(pnl, minutes):
+    exit_time = datetime(2024, 1, 1, 12) + timedelta(minutes=minutes)
+    return {'user_id': 'u1', 'symbol': 'ETH/USDT', 'status': 'closed', 'pnl': pnl,
+            'entry_price': 100.0, 'amount': 1.0, 'entry_time': exit_time - timedelta(hours=2),
+            'exit_time': exit_time}
+
+
+class TestTradeAnalytics:
+    """Test suite for TradeAnalytics"""
+
+    def test_record_close_updates_buckets_and_high_water_mark(self):
+        db = AnalyticsDb()
+        for pnl in (100.0, -30.0, -50.0, 40.0):
+            _close(db.analytics, pnl)
+
+        totals = db.analytics.totals.find_one({'_id': 'user:u1'})
+        assert totals['trades'] == 4
+        assert totals['wins'] == 2 and totals['losses'] == 2
+        assert totals['gross_profit'] == 140.0 and totals['gross_loss'] == 80.0
+        assert totals['peak'] == 100.0
+        assert totals['max_drawdown'] == 80.0
+        assert totals['max_loss_streak'] == 2
+        assert totals['hours']['10']['trades'] == 4
+        assert totals['hold_hist'] == {'5m_1h': 4}
+        assert totals['symbols']['BTC/USDT']['worst'] == -50.0
+        assert db.analytics.totals.find_one({'_id': 'global'})['trades'] == 4
+
+    def test_rebuild_matches_incremental_updates(self):
+        db = AnalyticsDb()
+        pnls = [25.0, -10.0, 5.0, -40.0]
+        db.trades.insert_many([_closed_trade(pnl, i) for i, pnl in enumerate(pnls)])
+        db.trades.insert_one({**_closed_trade(0.0, 9), 'side': 'buy'})  # closed BUY leg
+
+        rebuilt = db.analytics.get_totals('u1')
+
+        live = AnalyticsDb()
+        for i, pnl in enumerate(pnls):
+            exit_time = datetime(2024, 1, 1, 12) + timedelta(minutes=i)
+            live.analytics.record_close('u1', 'ETH/USDT', pnl=pnl, opened_at=exit_time - timedelta(hours=2),
+                                        closed_at=exit_time, entry_value=100.0)
+        incremental = live.analytics.totals.find_one({'_id': 'user:u1'})
+
+        assert rebuilt['backfilled']
+        for field in ('trades', 'wins', 'pnl', 'gross_loss', 'max_drawdown', 'hold_hist', 'return_hist',
+                      'max_win_streak', 'max_loss_streak', 'symbols'):
+            assert rebuilt[field] == pytest.approx(incremental[field]) if isinstance(rebuilt[field], float) \
+                else rebuilt[field] == incremental[field]
+        assert db.analytics.daily.count_documents({'key': 'user:u1'}) == 1
+
+    def test_rebuild_survives_non_datetime_entry_time(self):
+        db = AnalyticsDb()
+        trades = [_closed_trade(pnl, i) for i, pnl in enumerate((10.0, -5.0))]
+        trades[0]['entry_time'] = '2024-01-01T10:00:00'
+        db.trades.insert_many(trades)
+
+        totals = db.analytics.get_totals('u1')
+
+        assert totals['backfilled'] and totals['trades'] == 2
+        assert totals['hold_count'] == 1  # only the trade with a real entry time
+
+    def test_rebuild_orders_trades_by_close_time_across_fields(self):
+        db = AnalyticsDb()
+        # Inserted out of order; the close time lives in exit_time or timestamp
+        db.trades.insert_many([
+            {'user_id': 'u1', 'status': 'closed', 'side': 'sell', 'pnl': -1.0, 'timestamp': datetime(2024, 1, 3)},
+            {'user_id': 'u1', 'status': 'closed', 'pnl': 5.0, 'exit_time': datetime(2024, 1, 1)},
+            {'user_id': 'u1', 'status': 'closed', 'side': 'sell', 'pnl': -2.0, 'timestamp': datetime(2024, 1, 4)},
+            {'user_id': 'u1', 'status': 'closed', 'pnl': 3.0, 'exit_time': datetime(2024, 1, 2)},
+        ])
+
+        totals = db.analytics.get_totals('u1')
+
+        assert totals['max_win_streak'] == 2 and totals['max_loss_streak'] == 2
+        assert totals['peak'] == 8.0 and totals['max_drawdown'] == 3.0
+
+    def test_rebuild_falls_back_to_bot_strategy(self):
+        db = AnalyticsDb()
+        bot_id = str(db.db['bot_instances'].insert_one({'user_id': 'u1', 'config': {'strategy': 'grid'}}).inserted_id)
+        legacy_id = str(db.db['bot_instances'].insert_one({'user_id': 'u1', 'config': {}}).inserted_id)
+        db.trades.insert_many([
+            {**_closed_trade(5.0, 0), 'side': 'sell', 'bot_id': bot_id},
+            {**_closed_trade(-2.0, 1), 'side': 'sell', 'bot_id': legacy_id},
+            {**_closed_trade(1.0, 2), 'side': 'sell', 'bot_id': bot_id, 'strategy': 'ai'},
+        ])
+
+        totals = db.analytics.get_totals('u1')
+
+        assert set(totals['strategies']) == {'grid', 'momentum', 'ai'}
+        assert totals['strategies']['grid']['pnl'] == 5.0
+
+    def test_close_during_rebuild_forces_recompute(self, monkeypatch):
+        db = AnalyticsDb()
+        db.analytics.get_totals('u1')
+        db.trades.insert_one(_closed_trade(10.0, 0))
+        replay = db.analytics._replay
+        calls = []
+
+        def replay_then_close(*args):
+            days = replay(*args)
+            if not calls:  # lands between the aggregation and the write
+                time.sleep(0.002)  # after the snapshot, at Mongo's millisecond precision
+                db.trades.insert_one({**_closed_trade(7.0, 0), 'exit_time': datetime.utcnow()})
+                db.analytics.record_close('u1', 'ETH/USDT', pnl=7.0, closed_at=datetime.utcnow())
+            calls.append(1)
+            return days
+
+        monkeypatch.setattr(db.analytics, '_replay', replay_then_close)
+        totals = db.analytics.rebuild('user:u1')
+
+        assert len(calls) == 2
+        assert totals['trades'] == 2 and totals['pnl'] == 17.0
+        assert db.analytics.totals.find_one({'_id': 'user:u1'})['trades'] == 2
+
+    def test_close_counted_by_rebuild_is_not_counted_again(self):
+        db = AnalyticsDb()
+        closed_at = datetime.utcnow()
+        db.trades.insert_one({**_closed_trade(10.0, 0), 'exit_time': closed_at})
+        db.analytics.rebuild('user:u1')
+
+        # The writer's record_close for that trade arrives late
+        db.analytics.record_close('u1', 'ETH/USDT', pnl=10.0, closed_at=closed_at)
+        db.analytics.record_close('u1', 'ETH/USDT', pnl=3.0)
+
+        totals = db.analytics.totals.find_one({'_id': 'user:u1'})
+        assert totals['trades'] == 2 and totals['pnl'] == 13.0
+        daily = list(db.analytics.daily.find({'key': 'user:u1'}))
+        assert sum(bucket['trades'] for bucket in daily) == 2
+
+    def test_record_close_never_raises(self, caplog):
+        db = AnalyticsDb()
+
+        db.analytics.record_close('u1', 'BTC/USDT', pnl='n/a')
+        db.analytics.record_close('u1', 'BTC/USDT', pnl=5.0, opened_at='yesterday')
+
+        totals = db.analytics.totals.find_one({'_id': 'user:u1'})
+        assert totals['trades'] == 1 and 'hold_count' not in totals
+        assert 'Error updating trade analytics' in caplog.text
+
+    def test_window_merges_daily_buckets(self):
+        db = AnalyticsDb()
+        db.trades.insert_many([
+            _trade(50.0, day=1), _trade(-20.0, day=2, symbol='ETH/USDT'), _trade(10.0, day=20)
+        ])
+
+        window = db.analytics.get_window('u1', days=5, now=datetime(2024, 1, 4, 12))
+
+        assert window['trades'] == 2
+        assert window['pnl'] == 30.0
+        assert window['best_trade'] == 50.0 and window['worst_trade'] == -20.0
+        assert set(window['symbols']) == {'BTC/USDT', 'ETH/USDT'}
+        assert window['max_drawdown_pct'] == pytest.approx(-2.0)
+
+    def test_curve_and_percentile_helpers(self):
+        assert compounded_drawdown([]) == 0.0
+        assert return_percentile({'-4': 1, '0': 18, '3': 1}, 20, 5) == pytest.approx(-0.02)
+
+
+class TestAnalyticsConsumers:
+    """Test suite for the assistant / analytics readers"""
+
+    def test_assistant_answers_from_rollups(self):
+        from ai_assistant import AITradingAssistant
+
+        db = AnalyticsDb()
+        db.trades.insert_many([_trade(30.0 if i % 3 else -60.0, hour=9 + i % 2) for i in range(12)])
+
+        result = AITradingAssistant(db).analyze_user_performance('u1')
+
+        assert result['status'] == 'success'
+        assert result['total_trades'] == 12
+        analysis = result['analysis']
+        assert analysis['win_rate'] == pytest.approx(66.67, abs=0.01)
+        assert analysis['profit_factor'] == pytest.approx(1.0)
+        assert analysis['trading_pattern'] == 'scalper'
+        assert {m['type'] for m in analysis['common_mistakes']} >= {'cutting_winners_early', 'poor_risk_reward'}
+
+    def test_performance_summary_without_loading_trades(self):
+        from performance_analytics import PerformanceAnalytics
+
+        db = AnalyticsDb()
+        # Closes after the backfill (Mongo keeps milliseconds)
+        now = db.analytics.get_totals('u1')['snapshot_at'] + timedelta(milliseconds=1)
+        for pnl in (20.0, -10.0, 30.0):
+            db.analytics.record_close('u1', 'BTC/USDT', pnl=pnl, opened_at=now - timedelta(hours=2),
+                                      closed_at=now, entry_value=1000.0, strategy='grid')
+
+        summary = PerformanceAnalytics(db).get_performance_summary('u1', days=7)
+
+        assert summary['overview']['total_trades'] == 3
+        assert summary['overview']['avg_trade_duration_hours'] == pytest.approx(2.0)
+        assert summary['profitability']['profit_factor'] == pytest.approx(5.0)
+        assert summary['strategy_performance']['grid']['total_trades'] == 3
+        assert summary['risk_metrics']['volatility'] > 0
+        assert summary['recent_trades'] == []
@@ -0,0 +1,153 @@
+"""
+Unit tests for pre-aggregated trade rollups
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+
+from trade_rollups import TradeRollups, GLOBAL_KEY, bot_key, user_key
+
+
+class BulkCollection:
+    """mongomock collection that can apply pymongo's bulk operation objects"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            self.collection.update_one(op._filter, op._doc, upsert=op._upsert)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def _rollups(db):
+    rollups = TradeRollups(db)
+    rollups.collection = BulkCollection(rollups.collection)
+    return rollups
+
+
+def _round_trip(db, pnl_price, user_id='u1', bot_id='b1', closed_at=None):
+    """Bot engine style round trip: closed BUY leg plus a SELL record without pnl"""
+    closed_at = closed_at or datetime.utcnow()
+    opened_at = closed_at - timedelta(hours=1)
+    db['trades'].insert_one({'user_id': user_id, 'bot_id': bot_id, 'side': 'buy', 'status': 'closed',
+                             'price': 100.0, 'entry_price': 100.0, 'amount': 2.0,
+                             'timestamp': opened_at, 'exit_timestamp': closed_at})
+    db['trades'].insert_one({'user_id': user_id, 'bot_id': bot_id, 'side': 'sell', 'status': 'closed',
+                             'price': pnl_price, 'entry_price': 100.0, 'amount': 2.0,
+                             'entry_time': opened_at, 'timestamp': closed_at})
+    return closed_at
+
+
+class TestTradeRollups:
+    """Test suite for TradeRollups"""
+
+    def test_record_open_and_close(self, db):
+        rollups = _rollups(db)
+        for key in (GLOBAL_KEY, user_key('u1'), bot_key('b1')):
+            db['trade_rollups'].insert_one({'_id': key, 'backfilled': True})
+
+        rollups.record_open('u1', 'b1')
+        rollups.record_open('u1', 'b1')
+        rollups.record_close('u1', 'b1', pnl=30.0)
+        rollups.record_close('u1', 'b1', pnl=-10.0)
+
+        stats = rollups.get(user_key('u1'))
+        assert stats['closed_trades'] == 2
+        assert stats['open_positions'] == 0
+        assert stats['realized_pnl'] == 20.0
+        assert stats['win_rate'] == 50
+        assert stats['profit_factor'] == 3.0
+        assert rollups.get(GLOBAL_KEY)['closed_trades'] == 2
+        assert db['trade_rollups'].find_one({'_id': bot_key('b1')})['version'] == 4
+
+    def test_get_many_backfills_missing_rollups(self, db):
+        _round_trip(db, 110.0)
+        _round_trip(db, 95.0)
+        db['trades'].insert_one({'user_id': 'u1', 'status': 'open', 'unrealized_pnl': 4.0,
+                                 'entry_time': datetime.utcnow()})
+
+        stats = _rollups(db).get_many([user_key('u1'), bot_key('b1')])
+
+        user = stats[user_key('u1')]
+        assert user['closed_trades'] == 2  # BUY legs are not counted
+        assert user['realized_pnl'] == pytest.approx(10.0)
+        assert user['gross_loss'] == pytest.approx(10.0)
+        assert user['open_positions'] == 1 and 'unrealized_pnl' not in user
+        assert stats[bot_key('b1')]['closed_trades'] == 2
+        assert db['trade_rollups'].find_one({'_id': user_key('u1')})['backfilled']
+
+    def test_rebuild_retries_when_a_close_lands_mid_aggregation(self, db):
+        rollups = _rollups(db)
+        _round_trip(db, 110.0)
+        db['trade_rollups'].insert_one({'_id': user_key('u1'), 'version': 1, 'closed_trades': 7})
+
+        aggregate = rollups.trades.aggregate
+        calls = []
+
+        class Trades:
+            def aggregate(self, pipeline):
+                calls.append(pipeline)
+                if len(calls) == 1:
+                    # A close is persisted and counted while we aggregate
+                    _round_trip(db, 120.0)
+                    rollups.record_close('u1', 'b1', pnl=40.0)
+                return aggregate(pipeline)
+
+        rollups.trades = Trades()
+        stats = rollups.rebuild(user_key('u1'))
+
+        assert len(calls) == 4  # first pass discarded, second written
+        doc = db['trade_rollups'].find_one({'_id': user_key('u1')})
+        assert doc['closed_trades'] == stats['closed_trades'] == 2
+        assert doc['realized_pnl'] == pytest.approx(60.0)
+        assert doc['backfilled']
+
+    def test_close_counted_by_rebuild_is_not_counted_again(self, db):
+        rollups = _rollups(db)
+        closed_at = _round_trip(db, 110.0)
+
+        rollups.rebuild(user_key('u1'))
+        # The writer's record_close lands only after the rebuild wrote
+        rollups.record_close('u1', 'b1', pnl=20.0, closed_at=closed_at)
+
+        assert rollups.get(user_key('u1'))['closed_trades'] == 1
+
+        later = _round_trip(db, 90.0, closed_at=datetime.utcnow() + timedelta(seconds=1))
+        rollups.record_close('u1', 'b1', pnl=-20.0, closed_at=later)
+
+        stats = rollups.get(user_key('u1'))
+        assert stats['closed_trades'] == 2
+        assert stats['realized_pnl'] == pytest.approx(0.0)
+
+    def test_position_closed_after_snapshot_leaves_open_count(self, db):
+        rollups = _rollups(db)
+        opened_at = datetime.utcnow() - timedelta(minutes=5)
+        db['trades'].insert_one({'user_id': 'u1', 'bot_id': 'b1', 'side': 'buy', 'status': 'open',
+                                 'price': 100.0, 'entry_price': 100.0, 'amount': 1.0, 'timestamp': opened_at})
+        assert rollups.get(user_key('u1'))['open_positions'] == 1
+
+        closed_at = datetime.utcnow() + timedelta(seconds=1)
+        db['trades'].update_one({'side': 'buy'}, {'$set': {'status': 'closed', 'exit_timestamp': closed_at}})
+        db['trades'].insert_one({'user_id': 'u1', 'bot_id': 'b1', 'side': 'sell', 'status': 'closed',
+                                 'price': 105.0, 'entry_price': 100.0, 'amount': 1.0, 'timestamp': closed_at})
+        # A rebuild between the close and its record_close sees it still open
+        db['trade_rollups'].delete_many({})
+        rollups.rebuild(user_key('u1'))
+        rollups.record_close('u1', 'b1', pnl=5.0, closed_at=closed_at)
+
+        stats = rollups.get(user_key('u1'))
+        assert stats['open_positions'] == 0
+        assert stats['closed_trades'] == 1 and stats['realized_pnl'] == pytest.approx(5.0)
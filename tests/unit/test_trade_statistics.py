@@ -0,0 +1,65 @@
+"""
+Unit tests for MongoTradingDatabase.get_statistics
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+mongomock = pytest.importorskip('mongomock')
+pytest.importorskip('pandas')
+
+from mongodb_database import MongoTradingDatabase
+
+
+@pytest.fixture
+def database():
+    # Skip __init__ (it connects to a server); statistics only need `trades`
+    database = MongoTradingDatabase.__new__(MongoTradingDatabase)
+    database.trades = mongomock.MongoClient().db['trades']
+    return database
+
+
+def _round_trip(trades, exit_price, bot_id='b1', symbol='BTC/USDT'):
+    """Bot engine style: BUY leg marked closed plus a SELL record, neither with `pnl`"""
+    trades.insert_one({'bot_id': bot_id, 'user_id': 'u1', 'symbol': symbol, 'side': 'buy',
+                       'status': 'closed', 'price': 100.0, 'entry_price': 100.0, 'amount': 1.0,
+                       'pnl_percent': exit_price - 100.0})
+    trades.insert_one({'bot_id': bot_id, 'user_id': 'u1', 'symbol': symbol, 'side': 'sell',
+                       'status': 'closed', 'price': exit_price, 'entry_price': 100.0, 'amount': 1.0,
+                       'pnl_percent': exit_price - 100.0})
+
+
+class TestTradeStatistics:
+    """Test suite for get_statistics"""
+
+    def test_round_trips_counted_once_with_derived_pnl(self, database):
+        _round_trip(database.trades, 110.0)
+        _round_trip(database.trades, 96.0)
+        _round_trip(database.trades, 130.0, bot_id='b2')
+
+        stats = database.get_statistics(bot_id='b1')
+
+        assert stats['total_trades'] == 2
+        assert stats['winning_trades'] == 1
+        assert stats['total_pnl'] == pytest.approx(6.0)
+        assert stats['win_rate'] == 50
+        assert stats['profit_factor'] == pytest.approx(2.5)
+        assert stats['by_symbol'][0]['symbol'] == 'BTC/USDT'
+
+    def test_closed_positions_with_pnl(self, database):
+        database.trades.insert_many([
+            {'user_id': 'u2', 'symbol': 'ETH/USDT', 'status': 'closed', 'pnl': 12.0, 'strategy': 'grid'},
+            {'user_id': 'u2', 'symbol': 'ETH/USDT', 'status': 'closed', 'pnl': -4.0, 'strategy': 'grid'},
+            {'user_id': 'u2', 'symbol': 'ETH/USDT', 'status': 'open'},
+        ])
+
+        stats = database.get_statistics(user_id='u2')
+
+        assert stats['total_trades'] == 2
+        assert stats['total_pnl'] == pytest.approx(8.0)
+        assert stats['by_strategy'][0]['strategy'] == 'grid'
+
+    def test_no_trades(self, database):
+        assert database.get_statistics(bot_id='missing')['total_trades'] == 0
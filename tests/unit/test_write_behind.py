@@ -0,0 +1,161 @@
+"""
+Unit tests for the write-behind buffer
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from write_behind import WriteBehindBuffer
+
+
+class RecordingCollection:
+    """Collects bulk_write calls; can be told to fail the next ones"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = 0
+        self.reject_at = None
+        self.before_write = None
+
+    def bulk_write(self, operations, ordered=True):
+        if self.before_write:
+            self.before_write()
+        if self.fail:
+            self.fail -= 1
+            raise AutoReconnect('connection refused')
+        if self.reject_at is not None:
+            index, self.reject_at = self.reject_at, None
+            self.batches.append(list(operations[:index]))
+            raise BulkWriteError({'writeErrors': [{'index': index, 'errmsg': 'E11000 duplicate key'}]})
+        self.batches.append(list(operations))
+
+    @property
+    def operations(self):
+        return [op for batch in self.batches for op in batch]
+
+
+class RecordingDb(dict):
+    def __missing__(self, name):
+        self[name] = RecordingCollection()
+        return self[name]
+
+
+def _docs(collection):
+    return [op._doc for op in collection.operations]
+
+
+@pytest.fixture
+def db():
+    return RecordingDb()
+
+
+class TestWriteBehindBuffer:
+    """Test suite for WriteBehindBuffer"""
+
+    def test_buffers_until_flush_and_groups_by_collection(self, db):
+        buffer = WriteBehindBuffer(db, start=False)
+        buffer.insert('signals', {'n': 1})
+        buffer.update('bots', {'_id': 'b1'}, {'$set': {'state': 'running'}}, upsert=True)
+        buffer.insert('signals', {'n': 2})
+
+        assert not db and buffer.queue_depth == 3
+        assert buffer.flush() == 3
+
+        assert len(db['signals'].batches) == 1
+        assert _docs(db['signals']) == [{'n': 1}, {'n': 2}]
+        assert isinstance(db['bots'].operations[0], UpdateOne)
+        assert buffer.get_stats()['queue_depth'] == 0
+
+    def test_increments_are_coalesced_per_document(self, db):
+        buffer = WriteBehindBuffer(db, start=False)
+        for _ in range(1000):
+            buffer.increment('api_keys', {'_id': 'k1'}, {'usage': 1}, {'last_used': 'now'})
+
+        buffer.flush()
+
+        assert len(db['api_keys'].operations) == 1
+        assert db['api_keys'].operations[0]._doc == {'$inc': {'usage': 1000}, '$set': {'last_used': 'now'}}
+        assert buffer.stats['coalesced'] == 999
+
+    def test_failed_flush_requeues_in_order(self, db):
+        buffer = WriteBehindBuffer(db, start=False)
+        for n in range(3):
+            buffer.insert('signals', {'n': n})
+        db['signals'].fail = 1
+
+        assert buffer.flush() == 0
+        assert buffer.stats['errors'] == 1 and buffer.queue_depth == 3
+
+        buffer.insert('signals', {'n': 3})
+        assert buffer.flush() == 4
+        assert _docs(db['signals']) == [{'n': n} for n in range(4)]
+
+    def test_rejected_write_is_dropped_and_the_rest_written(self, db):
+        buffer = WriteBehindBuffer(db, start=False)
+        for n in range(4):
+            buffer.insert('signals', {'n': n})
+        db['signals'].reject_at = 1
+
+        assert buffer.flush() == 3
+        assert _docs(db['signals']) == [{'n': 0}, {'n': 2}, {'n': 3}]
+        assert buffer.stats['dropped'] == 1 and buffer.queue_depth == 0
+
+    def test_full_queue_drops_oldest(self, db):
+        buffer = WriteBehindBuffer(db, max_queue=3, start=False)
+        for n in range(5):
+            buffer.insert('signals', {'n': n})
+
+        buffer.flush()
+
+        assert _docs(db['signals']) == [{'n': 2}, {'n': 3}, {'n': 4}]
+        assert buffer.stats['dropped'] == 2
+
+    def test_requeue_overflow_drops_oldest_too(self, db):
+        buffer = WriteBehindBuffer(db, max_queue=3, start=False)
+        for n in range(2):
+            buffer.insert('signals', {'n': n})
+
+        def refill():
+            # Newer writes keep arriving while the batch is in flight
+            buffer.insert('signals', {'n': 2})
+            buffer.insert('signals', {'n': 3})
+        db['signals'].before_write = refill
+        db['signals'].fail = 1
+
+        buffer.flush()
+        db['signals'].before_write = None
+        buffer.flush()
+
+        assert _docs(db['signals']) == [{'n': 1}, {'n': 2}, {'n': 3}]
+        assert buffer.stats['dropped'] == 1
+
+    def test_size_trigger_wakes_flusher_and_close_drains(self, db):
+        buffer = WriteBehindBuffer(db, max_batch=2, flush_interval=60)
+        buffer.insert('signals', {'n': 0})
+        buffer.insert('signals', {'n': 1})
+        buffer.insert('signals', {'n': 2})
+
+        buffer.close()
+
+        assert _docs(db['signals']) == [{'n': 0}, {'n': 1}, {'n': 2}]
+        buffer.insert('signals', {'n': 3})  # written through after close
+        assert isinstance(db['signals'].operations[-1], InsertOne)
+
+    def test_save_signal_queues_a_copy(self, db):
+        from mongodb_database import MongoTradingDatabase
+
+        mongo = MongoTradingDatabase.__new__(MongoTradingDatabase)
+        mongo.writer = WriteBehindBuffer(db, start=False)
+        signal = {'symbol': 'BTC/USDT', 'action': 'buy'}
+
+        signal_id = mongo.save_signal(signal)
+        mongo.writer.flush()
+
+        assert signal == {'symbol': 'BTC/USDT', 'action': 'buy'}
+        written = _docs(db['signals'])[0]
+        assert str(written['_id']) == signal_id and 'timestamp' in written
@@ -0,0 +1,305 @@
+"""
+Time-Series Storage
+Signals, performance snapshots and price samples live in MongoDB
+time-series collections that expire themselves (expireAfterSeconds), so
+nothing has to scan and delete old rows and storage stays flat.
+
+Price samples are downsampled into OHLC bars, 1m -> 1h -> 1d, with one
+$merge per tier over the most recent buckets only. Charts read a few
+hundred bars from the right tier instead of raw samples.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+class SeriesSpec(NamedTuple):
+    name: str
+    meta_field: str
+    granularity: str          # 'seconds' | 'minutes' | 'hours'
+    ttl_days: Optional[float]
+
+
+class RollupTier(NamedTuple):
+    source: str
+    target: str
+    unit: str                 # $dateTrunc unit: 'minute' | 'hour' | 'day'
+    seconds: int
+    ttl_days: Optional[float]
+
+
+# Interval name -> tier, coarse tiers keep longer history
+ROLLUP_TIERS = {
+    '1m': RollupTier('price_samples', 'price_1m', 'minute', 60, 30),
+    '1h': RollupTier('price_1m', 'price_1h', 'hour', 3600, 730),
+    '1d': RollupTier('price_1h', 'price_1d', 'day', DAY, None),
+}
+
+ROLLUP_INTERVAL = 60.0  # seconds between background rollup passes
+
+# tier target -> `now` of its last pass, so a restart picks up where the
+# previous process stopped instead of rescanning the whole retention
+ROLLUP_STATE = 'rollup_state'
+
+
+def series_specs(signal_days: float, snapshot_days: float, price_days: float) -> List[SeriesSpec]:
+    return [
+        SeriesSpec('signals', 'symbol', 'minutes', signal_days),
+        SeriesSpec('performance_snapshots', 'meta', 'hours', snapshot_days),
+        SeriesSpec('price_samples', 'symbol', 'seconds', price_days),
+    ]
+
+
+def ensure_ttl_index(collection, field: str, ttl_days: Optional[float]):
+    """TTL index on field, adjusting an existing index on the same key in place"""
+    if not ttl_days:
+        collection.create_index(field)
+        return
+    seconds = int(ttl_days * DAY)
+    try:
+        collection.create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure:
+        # Same key already indexed with other options (e.g. the old plain index)
+        collection.database.command(
+            'collMod', collection.name,
+            index={'keyPattern': {field: 1}, 'expireAfterSeconds': seconds}
+        )
+
+
+def ensure_timeseries(db, spec: SeriesSpec) -> str:
+    """
+    Create spec's collection as a time-series collection with TTL
+
+    A collection that already exists as a regular one (deployments from
+    before this change, or servers older than 5.0) keeps working with a
+    TTL index on timestamp instead. Returns 'timeseries' or 'ttl_index'.
+    """
+    existing = next(iter(db.list_collections(filter={'name': spec.name})), None)
+    expire = int(spec.ttl_days * DAY) if spec.ttl_days else None
+
+    if existing is None:
+        options = {'timeseries': {'timeField': 'timestamp', 'metaField': spec.meta_field,
+                                  'granularity': spec.granularity}}
+        if expire:
+            options['expireAfterSeconds'] = expire
+        try:
+            db.create_collection(spec.name, **options)
+            db[spec.name].create_index([(spec.meta_field, ASCENDING), ('timestamp', DESCENDING)])
+            return 'timeseries'
+        except Exception as e:
+            logger.warning(f"Time-series collections unavailable for {spec.name}, using a TTL index: {e}")
+    elif existing.get('type') == 'timeseries':
+        if expire:
+            # Keep retention in sync with config
+            db.command('collMod', spec.name, expireAfterSeconds=expire)
+        return 'timeseries'
+
+    collection = db[spec.name]
+    ensure_ttl_index(collection, 'timestamp', spec.ttl_days)
+    collection.create_index([(spec.meta_field, ASCENDING), ('timestamp', DESCENDING)])
+    return 'ttl_index'
+
+
+def bucket_start(moment: datetime, seconds: int) -> datetime:
+    """Start of the UTC bucket of the given length containing moment"""
+    epoch = datetime(1970, 1, 1)
+    return epoch + timedelta(seconds=int((moment - epoch).total_seconds()) // seconds * seconds)
+
+
+def rollup_pipeline(tier: RollupTier, since: datetime) -> List[Dict]:
+    """
+    Aggregate tier.source buckets starting at `since` into tier.target
+
+    Raw samples carry `price`; bars carry open/high/low/close/samples.
+    Re-running over the same window replaces its bars, so a partially
+    filled bucket is simply recomputed on the next pass.
+    """
+    raw = tier.source == 'price_samples'
+    return [
+        {'$match': {'timestamp': {'$gte': since}}},
+        {'$sort': {'timestamp': 1}},
+        {'$group': {
+            '_id': {
+                'symbol': '$symbol',
+                'timestamp': {'$dateTrunc': {'date': '$timestamp', 'unit': tier.unit}},
+            },
+            'open': {'$first': '$price' if raw else '$open'},
+            'high': {'$max': '$price' if raw else '$high'},
+            'low': {'$min': '$price' if raw else '$low'},
+            'close': {'$last': '$price' if raw else '$close'},
+            'samples': {'$sum': 1 if raw else '$samples'},
+        }},
+        {'$project': {
+            '_id': 0,
+            'symbol': '$_id.symbol',
+            'timestamp': '$_id.timestamp',
+            'open': 1, 'high': 1, 'low': 1, 'close': 1, 'samples': 1,
+        }},
+        {'$merge': {
+            'into': tier.target,
+            'on': ['symbol', 'timestamp'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert',
+        }},
+    ]
+
+
+class TimeSeriesStore:
+    """
+    Retention-managed series plus OHLC rollups
+
+    Writes go through the write-behind buffer. Rollups run on a
+    background thread every rollup_interval seconds once start() is
+    called, whether or not anyone reads history, so raw samples are
+    rolled up before they expire. Only one process needs to call
+    start(); progress is kept in the rollup_state collection. Reads
+    never aggregate.
+    """
+
+    def __init__(self, db, writer, signal_days: float = 90, snapshot_days: float = 90,
+                 price_days: float = 7, rollup_interval: float = ROLLUP_INTERVAL):
+        self.db = db
+        self.writer = writer
+        self.specs = series_specs(signal_days, snapshot_days, price_days)
+        self.modes: Dict[str, str] = {}
+        self.rollup_interval = rollup_interval
+        self._rollup_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._rolled_until: Dict[str, Optional[datetime]] = {}  # cache of rollup_state
+        self.stats = {'rollups': 0, 'rollup_errors': 0, 'last_rollup_ms': 0.0}
+
+    def ensure(self):
+        """Create/adjust collections and indexes (idempotent)"""
+        for spec in self.specs:
+            self.modes[spec.name] = ensure_timeseries(self.db, spec)
+        for tier in ROLLUP_TIERS.values():
+            target = self.db[tier.target]
+            target.create_index([('symbol', ASCENDING), ('timestamp', ASCENDING)], unique=True)
+            ensure_ttl_index(target, 'timestamp', tier.ttl_days)
+        return dict(self.modes)
+
+    def set_retention(self, name: str, days: float):
+        """Change one series' retention and apply it now"""
+        self.specs = [spec._replace(ttl_days=days) if spec.name == name else spec for spec in self.specs]
+        spec = next(spec for spec in self.specs if spec.name == name)
+        self.modes[name] = ensure_timeseries(self.db, spec)
+
+    # ------------------------------------------------------------------
+    # Writes (queued)
+    # ------------------------------------------------------------------
+
+    def record_price(self, symbol: str, price: float, timestamp: Optional[datetime] = None):
+        if price and price > 0:
+            self.writer.insert('price_samples', {
+                'timestamp': timestamp or datetime.utcnow(),
+                'symbol': symbol,
+                'price': float(price),
+            })
+
+    def record_snapshot(self, values: Dict, meta: Optional[Dict] = None,
+                        timestamp: Optional[datetime] = None):
+        self.writer.insert('performance_snapshots', {
+            'timestamp': timestamp or datetime.utcnow(),
+            'meta': meta or {'scope': 'account'},
+            **values,
+        })
+
+    # ------------------------------------------------------------------
+    # Rollups
+    # ------------------------------------------------------------------
+
+    def rollup(self, now: Optional[datetime] = None) -> int:
+        """Recompute the newest buckets of every tier, finest first; returns tiers run"""
+        now = now or datetime.utcnow()
+        with self._rollup_lock:
+            started = time.perf_counter()
+            ran = 0
+            for tier in ROLLUP_TIERS.values():
+                try:
+                    # Everything since the bucket before the last pass; the
+                    # source's whole retention if no pass has ever run
+                    last = self._last_rolled(tier)
+                    if last is None:
+                        last = now - timedelta(days=self._source_retention(tier))
+                    since = bucket_start(min(last, now), tier.seconds) - timedelta(seconds=tier.seconds)
+                    self.db[tier.source].aggregate(rollup_pipeline(tier, since))
+                    self.db[ROLLUP_STATE].update_one(
+                        {'_id': tier.target}, {'$max': {'rolled_until': now}}, upsert=True
+                    )
+                    self._rolled_until[tier.target] = now
+                    ran += 1
+                except Exception as e:
+                    self.stats['rollup_errors'] += 1
+                    logger.error(f"Rollup {tier.source} -> {tier.target} failed: {e}")
+                    break
+            self.stats['rollups'] += 1
+            self.stats['last_rollup_ms'] = (time.perf_counter() - started) * 1000
+            return ran
+
+    def _last_rolled(self, tier: RollupTier) -> Optional[datetime]:
+        """`now` of the tier's last pass, from rollup_state on this process' first"""
+        if tier.target not in self._rolled_until:
+            state = self.db[ROLLUP_STATE].find_one({'_id': tier.target}) or {}
+            self._rolled_until[tier.target] = state.get('rolled_until')
+        return self._rolled_until[tier.target]
+
+    def _source_retention(self, tier: RollupTier) -> float:
+        for spec in self.specs:
+            if spec.name == tier.source:
+                return spec.ttl_days or 365
+        source = next(t for t in ROLLUP_TIERS.values() if t.target == tier.source)
+        return source.ttl_days or 365
+
+    def start(self):
+        """Start the background rollup thread; the first pass runs right away"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='timeseries-rollup', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.rollup()
+            except Exception as e:
+                logger.error(f"Rollup pass failed: {e}")
+            self._stop.wait(self.rollup_interval)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Stop the rollup thread (a pass in progress is allowed to finish)"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def history(self, symbol: str, interval: str = '1h', limit: int = 168) -> List[Dict]:
+        """Newest `limit` OHLC bars for symbol, oldest first (read-only)"""
+        tier = ROLLUP_TIERS.get(interval)
+        if tier is None:
+            raise ValueError(f"Unknown interval {interval!r}; use one of {', '.join(ROLLUP_TIERS)}")
+        bars = list(
+            self.db[tier.target]
+            .find({'symbol': symbol}, {'_id': 0})
+            .sort('timestamp', DESCENDING)
+            .limit(limit)
+        )
+        bars.reverse()
+        return bars
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['modes'] = dict(self.modes)
+        stats['rollup_thread_alive'] = bool(self._thread and self._thread.is_alive())
+        return stats
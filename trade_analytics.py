@@ -0,0 +1,433 @@
+"""
+Trade Analytics - Incremental per-user performance aggregates
+Every closed trade updates a lifetime document and a per-day bucket for
+its user (and platform-wide): win/loss sums, hold-time histogram,
+per-hour / weekday / symbol / strategy buckets, return moments and an
+equity high-water mark for drawdown.
+
+The AI assistant and performance analytics answer from these documents
+instead of loading and re-scanning trades on every request.
+"""
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from trade_rollups import CLOSED_AT_EXPR, CLOSED_TRADE_MATCH, GLOBAL_KEY, REBUILD_ATTEMPTS, user_key
+
+logger = logging.getLogger(__name__)
+
+# Hold-time histogram buckets: (label, upper bound in seconds)
+HOLD_BUCKETS = (
+    ('under_5m', 300),
+    ('5m_1h', 3600),
+    ('1h_4h', 14400),
+    ('4h_1d', 86400),
+    ('1d_1w', 604800),
+    ('over_1w', None),
+)
+
+# Width of the per-trade return histogram buckets (0.5%), used for VaR
+RETURN_BUCKET = 0.005
+
+# Merged across buckets with max/min instead of a sum
+MAX_FIELDS = {'best_trade', 'best'}
+MIN_FIELDS = {'worst_trade', 'worst'}
+BUCKET_META = {'_id', 'key', 'date', 'updated_at', 'backfilled', 'snapshot_at', 'version'}
+
+# bot_engine's strategy when a bot's config has none; older bot engine
+# trades carry no `strategy`, so rebuilds look it up from the bot
+DEFAULT_BOT_STRATEGY = 'momentum'
+
+
+def _field(name) -> str:
+    """Symbol/strategy name usable as a document field"""
+    return str(name).replace('.', '_').replace('$', '_')
+
+
+def hold_bucket(seconds: float) -> str:
+    for label, upper in HOLD_BUCKETS:
+        if upper is None or seconds < upper:
+            return label
+
+
+def day_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def close_update(pnl: float, closed_at: datetime, opened_at: Optional[datetime] = None,
+                 trade_return: Optional[float] = None, symbol: Optional[str] = None,
+                 strategy: Optional[str] = None, fees: float = 0.0) -> Dict:
+    """The $inc / $max / $min one closed trade applies to a bucket"""
+    if not isinstance(opened_at, datetime):
+        opened_at = None  # e.g. an ISO string on old documents: no hold time
+    won = pnl > 0
+    inc = {
+        'trades': 1,
+        'wins': 1 if won else 0,
+        'losses': 1 if pnl < 0 else 0,
+        'pnl': pnl,
+        'gross_profit': pnl if won else 0.0,
+        'gross_loss': -pnl if pnl < 0 else 0.0,
+        'fees': float(fees or 0.0),
+    }
+    maxes = {'best_trade': pnl}
+    mins = {'worst_trade': pnl}
+
+    hour_of = opened_at or closed_at
+    inc[f'hours.{hour_of.hour}.pnl'] = pnl
+    inc[f'hours.{hour_of.hour}.trades'] = 1
+    inc[f'weekdays.{hour_of.weekday()}.pnl'] = pnl
+    inc[f'weekdays.{hour_of.weekday()}.trades'] = 1
+
+    if opened_at and closed_at >= opened_at:
+        held = (closed_at - opened_at).total_seconds()
+        outcome = 'win' if won else 'loss'
+        inc['hold_seconds'] = held
+        inc['hold_count'] = 1
+        inc[f'{outcome}_hold_seconds'] = held
+        inc[f'{outcome}_hold_count'] = 1
+        inc[f'hold_hist.{hold_bucket(held)}'] = 1
+
+    if trade_return is not None:
+        inc['return_count'] = 1
+        inc['return_sum'] = trade_return
+        inc['return_sq_sum'] = trade_return ** 2
+        inc[f'return_hist.{math.floor(trade_return / RETURN_BUCKET)}'] = 1
+        if trade_return > -1:
+            inc['log_return_sum'] = math.log1p(trade_return)
+        if trade_return < 0:
+            inc['downside_count'] = 1
+            inc['downside_sum'] = trade_return
+            inc['downside_sq_sum'] = trade_return ** 2
+
+    for group, name in (('symbols', symbol), ('strategies', strategy)):
+        if name:
+            prefix = f'{group}.{_field(name)}'
+            inc[f'{prefix}.pnl'] = pnl
+            inc[f'{prefix}.trades'] = 1
+            inc[f'{prefix}.wins'] = 1 if won else 0
+            maxes[f'{prefix}.best'] = pnl
+            mins[f'{prefix}.worst'] = pnl
+
+    return {'$inc': inc, '$max': maxes, '$min': mins}
+
+
+def apply_update(doc: Dict, update: Dict) -> Dict:
+    """Apply a close_update() to an in-memory document (backfill)"""
+    for op, values in update.items():
+        for path, value in values.items():
+            *parents, leaf = path.split('.')
+            target = doc
+            for part in parents:
+                target = target.setdefault(part, {})
+            if leaf not in target:
+                target[leaf] = value
+            elif op == '$inc':
+                target[leaf] += value
+            elif op == '$max':
+                target[leaf] = max(target[leaf], value)
+            elif op == '$min':
+                target[leaf] = min(target[leaf], value)
+    return doc
+
+
+def merge(docs: Iterable[Dict]) -> Dict:
+    """Combine bucket documents: counters add up, best/worst keep extremes"""
+    merged: Dict = {}
+    for doc in docs:
+        _merge_into(merged, doc)
+    return merged
+
+
+def _merge_into(target: Dict, source: Dict):
+    for name, value in source.items():
+        if name in BUCKET_META:
+            continue
+        if isinstance(value, dict):
+            _merge_into(target.setdefault(name, {}), value)
+        elif name not in target:
+            target[name] = value
+        elif name in MAX_FIELDS:
+            target[name] = max(target[name], value)
+        elif name in MIN_FIELDS:
+            target[name] = min(target[name], value)
+        else:
+            target[name] += value
+
+
+def compounded_drawdown(days: List[Dict]) -> float:
+    """Largest peak-to-trough fall (fraction, <= 0) of the compounded daily equity curve"""
+    equity = peak = 1.0
+    worst = 0.0
+    for day in days:
+        equity *= math.exp(day.get('log_return_sum', 0.0))
+        peak = max(peak, equity)
+        worst = min(worst, (equity - peak) / peak)
+    return worst
+
+
+def return_percentile(histogram: Dict, count: int, percentile: float) -> float:
+    """Approximate return percentile (lower bucket edge) from return_hist"""
+    if not count:
+        return 0.0
+    needed = count * percentile / 100
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen >= needed:
+            return int(bucket) * RETURN_BUCKET
+    return 0.0
+
+
+class TradeAnalytics:
+    """
+    Per-user / platform-wide analytics buckets
+
+    Lifetime documents live in `trade_analytics` keyed like trade
+    rollups ('global', 'user:<id>'); per-day buckets in
+    `trade_analytics_daily` keyed '<key>:<YYYY-MM-DD>'. Writers call
+    record_close right after persisting a closed trade, with the close
+    time they stored. A key that was never backfilled is rebuilt once
+    from the trades collection.
+    """
+
+    def __init__(self, db):
+        self.totals = db['trade_analytics']
+        self.daily = db['trade_analytics_daily']
+        self.trades = db['trades']
+        self.bots = db['bot_instances']
+
+    # ------------------------------------------------------------------
+    # Writers
+    # ------------------------------------------------------------------
+
+    def record_close(self, user_id=None, symbol: Optional[str] = None, pnl: float = 0.0,
+                     opened_at: Optional[datetime] = None, closed_at: Optional[datetime] = None,
+                     entry_value: Optional[float] = None, strategy: Optional[str] = None,
+                     fees: float = 0.0):
+        """Fold one closed trade (realized P&L in USD) into its buckets"""
+        keys = [GLOBAL_KEY] + ([user_key(user_id)] if user_id else [])
+        try:
+            pnl = float(pnl or 0.0)
+            closed_at = closed_at or datetime.utcnow()
+            trade_return = pnl / entry_value if entry_value else None
+            update = close_update(pnl, closed_at, opened_at, trade_return, symbol, strategy, fees)
+            for key in keys:
+                # Totals first: a rebuild running meanwhile either sees the
+                # version bump and starts over, or already counted the trade
+                if self._update_totals(key, pnl, update, closed_at):
+                    self._update_daily(key, closed_at, update)
+        except Exception as e:
+            # Never break the trading loop over analytics; a later
+            # rebuild() brings the buckets back in line.
+            logger.error(f"Error updating trade analytics {keys}: {e}")
+
+    @staticmethod
+    def _not_counted(closed_at: datetime) -> Dict:
+        """Buckets whose last rebuild (snapshot_at) predates a trade closed at closed_at"""
+        return {'$or': [{'snapshot_at': {'$exists': False}}, {'snapshot_at': {'$lt': closed_at}}]}
+
+    def _update_daily(self, key: str, closed_at: datetime, update: Dict):
+        day = day_start(closed_at)
+        try:
+            self.daily.update_one(
+                {'_id': f"{key}:{day:%Y-%m-%d}", **self._not_counted(closed_at)},
+                {**update, '$set': {'key': key, 'date': day, 'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # rebuilt after this trade closed: already counted
+
+    def _update_totals(self, key: str, pnl: float, update: Dict, closed_at: datetime) -> bool:
+        """
+        Counters plus equity / streaks, then the high-water marks they
+        imply; False if a rebuild already counted the trade
+        """
+        won = pnl > 0
+        inc = {**update['$inc'], 'equity': pnl, 'win_streak' if won else 'loss_streak': 1, 'version': 1}
+        try:
+            doc = self.totals.find_one_and_update(
+                {'_id': key, **self._not_counted(closed_at)},
+                {
+                    '$inc': inc,
+                    '$max': update['$max'],
+                    '$min': update['$min'],
+                    '$set': {'loss_streak' if won else 'win_streak': 0, 'updated_at': datetime.utcnow()},
+                },
+                projection={'equity': 1, 'peak': 1, 'win_streak': 1, 'loss_streak': 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False  # rebuilt after this trade closed: already counted
+        self.totals.update_one({'_id': key}, {'$max': self._marks(doc)})
+        return True
+
+    @staticmethod
+    def _marks(doc: Dict) -> Dict:
+        equity = doc.get('equity', 0.0)
+        peak = max(doc.get('peak', 0.0), equity, 0.0)
+        return {
+            'peak': peak,
+            'max_drawdown': peak - equity,
+            'max_win_streak': doc.get('win_streak', 0),
+            'max_loss_streak': doc.get('loss_streak', 0),
+        }
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    def get_totals(self, user_id=None) -> Dict:
+        """Lifetime analytics for a user (or everyone), backfilling if needed"""
+        key = user_key(user_id) if user_id else GLOBAL_KEY
+        doc = self.totals.find_one({'_id': key})
+        if not doc or not doc.get('backfilled'):
+            doc = self.rebuild(key)
+        return doc
+
+    def get_window(self, user_id=None, days: int = 30, now: Optional[datetime] = None) -> Dict:
+        """
+        Analytics over the trades closed in the last `days` whole days
+
+        Drawdown is measured on the compounded daily equity curve;
+        streaks are lifetime (they don't split into day buckets).
+        """
+        totals = self.get_totals(user_id)
+        now = now or datetime.utcnow()
+        since = day_start(now - timedelta(days=days))
+        buckets = list(
+            self.daily.find({'key': totals['_id'], 'date': {'$gte': since, '$lte': now}}).sort('date', 1)
+        )
+
+        window = merge(buckets)
+        window['max_drawdown_pct'] = compounded_drawdown(buckets) * 100
+        window['max_win_streak'] = totals.get('max_win_streak', 0)
+        window['max_loss_streak'] = totals.get('max_loss_streak', 0)
+        return window
+
+    # ------------------------------------------------------------------
+    # Backfill
+    # ------------------------------------------------------------------
+
+    def rebuild(self, key: str) -> Dict:
+        """
+        Recompute a key's lifetime and daily buckets from the trades collection
+
+        Closed trades are SELL records (bot engine) or closed position
+        documents (user bot manager); BUY legs marked closed are skipped.
+        Trades are sorted by close time on the server and streamed, so
+        a large history (the 'global' key) is never held in memory.
+
+        Like TradeRollups.rebuild, trades are counted as of `snapshot_at`,
+        taken after reading the totals' `version`:
+        - a record_close that lands before the totals are written bumps
+          the version, so the result is discarded and recomputed;
+        - one that lands after only applies if its trade closed after
+          snapshot_at (see _not_counted), so nothing is counted twice.
+        """
+        match = {'user_id': key[len('user:'):]} if key.startswith('user:') else {}
+        strategies: Dict = {}
+
+        for _ in range(REBUILD_ATTEMPTS):
+            totals: Dict = {'_id': key}
+            try:
+                current = self.totals.find_one({'_id': key}, {'version': 1}) or {}
+                version = current.get('version')
+                snapshot_at = datetime.utcnow()
+                days = self._replay(match, snapshot_at, totals, strategies)
+
+                now = datetime.utcnow()
+                totals['backfilled'] = True
+                totals['snapshot_at'] = snapshot_at
+                totals['updated_at'] = now
+                if version is not None:
+                    totals['version'] = version
+                # Day buckets first: if the guarded totals write below
+                # fails, the next attempt rewrites them anyway
+                self.daily.delete_many({'key': key})
+                if days:
+                    self.daily.insert_many([
+                        {**bucket, '_id': f"{key}:{day:%Y-%m-%d}", 'key': key, 'date': day,
+                         'snapshot_at': snapshot_at, 'updated_at': now}
+                        for day, bucket in days.items()
+                    ])
+                guard = {'_id': key, 'version': version if version is not None else {'$exists': False}}
+                result = self.totals.replace_one(guard, totals, upsert=True)
+                if result.matched_count or result.upserted_id is not None:
+                    logger.info(f"Rebuilt trade analytics {key}: {totals.get('trades', 0)} closed trades")
+                    break
+            except (DuplicateKeyError, BulkWriteError):
+                pass  # a record_close landed meanwhile; recompute
+            except Exception as e:
+                logger.error(f"Error rebuilding trade analytics {key}: {e}")
+                break
+        else:
+            logger.warning(f"Trade analytics {key} kept changing during rebuild; will retry on next read")
+            totals.pop('backfilled', None)
+
+        return totals
+
+    def _replay(self, match: Dict, snapshot_at: datetime, totals: Dict, strategies: Dict) -> Dict[datetime, Dict]:
+        """Fold the trades closed up to snapshot_at into totals; returns the day buckets"""
+        days: Dict[datetime, Dict] = {}
+        cursor = self.trades.aggregate([
+            {'$match': {**match, **CLOSED_TRADE_MATCH, '$expr': {'$lte': [CLOSED_AT_EXPR, snapshot_at]}}},
+            {'$project': {
+                'pnl': 1, 'price': 1, 'exit_price': 1, 'entry_price': 1, 'amount': 1,
+                'position_size': 1, 'symbol': 1, 'strategy': 1, 'bot_id': 1, 'fees': 1,
+                'entry_time': 1, 'exit_time': 1, 'exit_timestamp': 1, 'timestamp': 1,
+                'closed_at': CLOSED_AT_EXPR,
+            }},
+            {'$sort': {'closed_at': 1, '_id': 1}},
+        ], allowDiskUse=True)
+
+        for trade in cursor:
+            closed_at = self._closed_at(trade)
+            amount = trade.get('amount') or trade.get('position_size') or 0
+            entry_value = (trade.get('entry_price') or 0) * amount
+            pnl = trade.get('pnl')
+            if pnl is None:
+                exit_price = trade.get('exit_price') or trade.get('price') or 0
+                pnl = (exit_price - (trade.get('entry_price') or 0)) * amount
+            pnl = float(pnl)
+            strategy = trade.get('strategy') or self._bot_strategy(trade.get('bot_id'), strategies)
+
+            update = close_update(
+                pnl, closed_at, trade.get('entry_time'),
+                pnl / entry_value if entry_value else None,
+                trade.get('symbol'), strategy, trade.get('fees', 0.0)
+            )
+            apply_update(days.setdefault(day_start(closed_at), {}), update)
+            apply_update(totals, update)
+
+            won = pnl > 0
+            totals['equity'] = totals.get('equity', 0.0) + pnl
+            totals['win_streak' if won else 'loss_streak'] = totals.get('win_streak' if won else 'loss_streak', 0) + 1
+            totals['loss_streak' if won else 'win_streak'] = 0
+            for field, value in self._marks(totals).items():
+                totals[field] = max(totals.get(field, value), value)
+        return days
+
+    def _bot_strategy(self, bot_id, cache: Dict) -> Optional[str]:
+        """Strategy from the bot's config, for trades recorded without one"""
+        if not bot_id:
+            return None
+        if bot_id not in cache:
+            bot = self.bots.find_one(
+                {'_id': ObjectId(bot_id) if ObjectId.is_valid(bot_id) else bot_id}, {'config.strategy': 1}
+            )
+            cache[bot_id] = (bot.get('config') or {}).get('strategy', DEFAULT_BOT_STRATEGY) if bot else None
+        return cache[bot_id]
+
+    @staticmethod
+    def _closed_at(trade: Dict) -> datetime:
+        for field in ('exit_time', 'exit_timestamp', 'timestamp'):
+            if isinstance(trade.get(field), datetime):
+                return trade[field]
+        return datetime(1970, 1, 1)
@@ -12,6 +12,8 @@ import config
 from advanced_strategy_engine import AdvancedStrategyEngine
 from smart_risk_manager import SmartRiskManager
 from ml_predictor import MLPredictor, MarketRegimeDetector
+from trade_rollups import TradeRollups
+from trade_analytics import TradeAnalytics
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +25,8 @@ class UserTradingBot:
         self.user_id = user_id
         self.bot_id = bot_config['bot_id']
         self.db = db
+        self.rollups = TradeRollups(db)
+        self.analytics = TradeAnalytics(db)
         
         # Bot configuration
         self.config = bot_config
@@ -145,7 +149,7 @@ class UserTradingBot:
             # Detect market regime
             import pandas as pd
             df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            regime = self.regime_detector.detect_regime(df)
+            regime = self.regime_detector.detect_regime(df, symbol, '1h')
             
             # Select best strategy
             best_strategy = self.strategy_engine.select_best_strategy(df, regime)
@@ -227,6 +231,7 @@ class UserTradingBot:
             )
             
             # Save trade to database
+            opened_at = datetime.utcnow()
             trade_record = {
                 'user_id': self.user_id,
                 'bot_id': self.bot_id,
@@ -241,12 +246,13 @@ class UserTradingBot:
                 'strategy': signal.get('strategy', 'unknown'),
                 'confidence': signal['confidence'],
                 'status': 'open',
-                'entry_time': datetime.utcnow(),
-                'timestamp': datetime.utcnow(),
+                'entry_time': opened_at,
+                'timestamp': opened_at,
                 'paper_trading': self.paper_trading
             }
             
             self.db.trades.insert_one(trade_record)
+            self.rollups.record_open(self.user_id, self.bot_id, opened_at=opened_at)
             
             logger.info(f"Trade executed: {symbol} {signal['signal']} @ {current_price}")
             
@@ -337,6 +343,7 @@ class UserTradingBot:
                 return
             
             # Update trade in database
+            closed_at = datetime.utcnow()
             self.db.trades.update_one(
                 {
                     'user_id': self.user_id,
@@ -346,12 +353,23 @@ class UserTradingBot:
                 },
                 {'$set': {
                     'exit_price': exit_price,
-                    'exit_time': datetime.utcnow(),
+                    'exit_time': closed_at,
                     'exit_reason': reason,
                     'status': 'closed',
                     'pnl': position['unrealized_pnl']
                 }}
             )
+            self.rollups.record_close(self.user_id, self.bot_id, pnl=position['unrealized_pnl'],
+                                      closed_at=closed_at)
+            self.analytics.record_close(
+                self.user_id,
+                symbol,
+                pnl=position['unrealized_pnl'],
+                opened_at=position.get('entry_time'),
+                entry_value=position['entry_price'] * position['position_size'],
+                strategy=self.strategy,
+                closed_at=closed_at
+            )
             
             logger.info(f"Position closed: {symbol} @ {exit_price} ({reason})")
             
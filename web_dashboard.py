@@ -8,13 +8,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 from datetime import datetime, timedelta
 import jwt
 import bcrypt
 import os
+import json
 import logging
 from colorama import Fore, Style
 import config
@@ -25,6 +26,15 @@ logger = logging.getLogger(__name__)
 # Import MongoDB database
 try:
     from mongodb_database import MongoTradingDatabase
+    from trade_rollups import TradeRollups, GLOBAL_KEY, user_key, bot_key
+    from pagination import stream_json_page, InvalidCursor, DEFAULT_PAGE_SIZE
+    from principal_cache import principal_cache, InvalidatingCollection
+    from broadcaster import broadcaster, PUBLIC_TOPIC, ADMIN_TOPIC, user_topic, bot_topic
+    from position_stream import position_stream
+    from data_export import (
+        iter_mongo_batches, iter_scanned_export, export_filename,
+        EXPORT_FORMATS, MEDIA_TYPES, PARQUET_AVAILABLE
+    )
     MONGODB_AVAILABLE = True
 except ImportError:
     print(f"{Fore.RED}❌ MongoDB not available. Install: pip install pymongo{Style.RESET_ALL}")
@@ -128,8 +138,10 @@ security = HTTPBearer()
 # Database
 db = MongoTradingDatabase()
 
-# Add users collection
-users_collection = db.db['users']
+# Add users collection (writes through it invalidate cached principals)
+principal_cache.ttl = config.AUTH_CACHE_TTL
+principal_cache.max_entries = config.AUTH_CACHE_SIZE
+users_collection = InvalidatingCollection(db.db['users'], principal_cache)
 subscriptions_collection = db.db['subscriptions']
 bot_instances_collection = db.db['bot_instances']
 
@@ -218,7 +230,10 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     """Get current authenticated user"""
     token = credentials.credentials
     payload = decode_token(token)
-    user = users_collection.find_one({"email": payload.get("sub")})
+    user = principal_cache.get(
+        payload.get("sub"),
+        lambda email: users_collection.find_one({"email": email})
+    )
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
@@ -374,60 +389,22 @@ async def get_dashboard(user: dict = Depends(get_current_user)):
     total_capital = sum(bot.get("config", {}).get("initial_capital", 0) for bot in bots)
     active_bots = sum(1 for bot in bots if bot.get("status") == "running")
     
-    # Get total P&L from actual closed trades
-    total_pnl = 0.0
+    # Realized P&L, open positions and trade stats come from the
+    # pre-aggregated rollup (updated with $inc on every trade open/close),
+    # so this stays constant-time no matter how many trades the user has.
+    # Unrealized P&L is marked live by the position stream.
+    rollup_key = GLOBAL_KEY if is_admin else user_key(user["_id"])
     try:
-        if is_admin:
-            closed_trades = list(db.db['trades'].find({"side": "sell", "status": "closed"}))
-        else:
-            closed_trades = list(db.db['trades'].find({"user_id": str(user["_id"]), "side": "sell", "status": "closed"}))
-        
-        for trade in closed_trades:
-            entry_price = trade.get("entry_price", 0)
-            exit_price = trade.get("price", 0)
-            amount = trade.get("amount", 0)
-            if entry_price > 0:
-                profit_usd = (exit_price - entry_price) * amount
-                total_pnl += profit_usd
+        rollup = db.rollups.get(rollup_key)
     except Exception as e:
-        print(f"Error calculating P&L: {e}")
+        print(f"Error loading trade rollup: {e}")
+        rollup = TradeRollups.normalize(None)
     
-    # Get open positions and unrealized P&L
-    open_positions_count = 0
-    unrealized_pnl = 0.0
-    try:
-        if is_admin:
-            open_positions = list(db.db['trades'].find({"status": "open"}))
-        else:
-            open_positions = list(db.db['trades'].find({"user_id": str(user["_id"]), "status": "open"}))
-        
-        open_positions_count = len(open_positions)
-        
-        # Calculate unrealized P&L for open positions
-        # This is a simplified calculation - in production you'd fetch current prices
-        for position in open_positions:
-            entry_price = position.get("price", 0)
-            amount = position.get("amount", 0)
-            # Placeholder: In real implementation, fetch current price and calculate
-            # For now, we'll use 0 or any stored unrealized_pnl field
-            unrealized_pnl += position.get("unrealized_pnl", 0.0)
-    except Exception as e:
-        print(f"Error calculating open positions: {e}")
-    
-    # Get trade stats (if trades collection exists)
-    total_trades = 0
-    winning_trades = 0
-    try:
-        if is_admin:
-            total_trades = db.db['trades'].count_documents({"side": "sell", "status": "closed"})
-            winning_trades = db.db['trades'].count_documents({"side": "sell", "status": "closed", "pnl_percent": {"$gt": 0}})
-        else:
-            total_trades = db.db['trades'].count_documents({"user_id": str(user["_id"]), "side": "sell", "status": "closed"})
-            winning_trades = db.db['trades'].count_documents({"user_id": str(user["_id"]), "side": "sell", "status": "closed", "pnl_percent": {"$gt": 0}})
-    except:
-        pass
-    
-    win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
+    total_pnl = rollup["realized_pnl"]
+    unrealized_pnl = position_stream.snapshot(None if is_admin else str(user["_id"]))["unrealized_pnl"]
+    open_positions_count = rollup["open_positions"]
+    total_trades = rollup["closed_trades"]
+    win_rate = rollup["win_rate"]
     
     return {
         "stats": {
@@ -628,36 +605,23 @@ async def get_my_bots(user: dict = Depends(get_current_user)):
         bots = list(bot_instances_collection.find({"user_id": str(user["_id"])}))
         print(f"👤 User viewing their bots: {len(bots)} bots")
     
+    # One query for every bot's rollup instead of a trades scan per bot
+    try:
+        bot_rollups = db.rollups.get_many(bot_key(bot["_id"]) for bot in bots)
+    except Exception as e:
+        print(f"Error loading bot rollups: {e}")
+        bot_rollups = {}
+    
     # Enrich bots with owner information AND real-time stats
     for bot in bots:
         bot["_id"] = str(bot["_id"])
         bot_id_str = str(bot["_id"])
         
-        # Calculate real-time stats from trades
-        try:
-            # Get all trades for this bot
-            bot_trades = list(db.db['trades'].find({"bot_id": bot_id_str}))
-            
-            # Calculate total trades
-            bot["total_trades"] = len(bot_trades)
-            
-            # Calculate total profit/loss
-            total_pnl = sum(trade.get("profit", 0) for trade in bot_trades)
-            bot["total_profit"] = total_pnl
-            
-            # Calculate win rate
-            if bot_trades:
-                winning_trades = [t for t in bot_trades if t.get("profit", 0) > 0]
-                bot["win_rate"] = (len(winning_trades) / len(bot_trades)) * 100
-            else:
-                bot["win_rate"] = 0
-            
-            print(f"  Bot {bot_id_str}: {bot['total_trades']} trades, ${total_pnl:.2f} P&L")
-        except Exception as e:
-            print(f"Error calculating stats for bot {bot_id_str}: {e}")
-            bot["total_trades"] = 0
-            bot["total_profit"] = 0
-            bot["win_rate"] = 0
+        # Real-time stats from the per-bot rollup (batched above)
+        stats = bot_rollups.get(bot_key(bot_id_str)) or TradeRollups.normalize(None)
+        bot["total_trades"] = stats["closed_trades"]
+        bot["total_profit"] = stats["realized_pnl"]
+        bot["win_rate"] = stats["win_rate"]
         
         # Add owner info for admin
         if is_admin and bot.get("user_id"):
@@ -692,10 +656,12 @@ async def get_my_bots(user: dict = Depends(get_current_user)):
 @app.get("/api/bots/{bot_id}/performance")
 async def get_bot_performance(bot_id: str, user: dict = Depends(get_current_user)):
     """Get bot performance metrics"""
-    # Get trades for this bot
-    trades = list(db.trades.find({"bot_id": bot_id, "status": "closed"}))
+    if not _owns_bot(user, bot_id):
+        raise HTTPException(status_code=404, detail="Bot not found")
+    
+    stats = db.get_statistics(bot_id=bot_id)
     
-    if not trades:
+    if not stats or not stats.get("total_trades"):
         return {
             "total_trades": 0,
             "win_rate": 0,
@@ -703,7 +669,6 @@ async def get_bot_performance(bot_id: str, user: dict = Depends(get_current_user
             "profit_factor": 0
         }
     
-    stats = db.get_statistics()
     return stats
 
 @app.post("/api/bots/{bot_id}/start")
@@ -926,13 +891,24 @@ async def get_bot_analytics(bot_id: str, user: dict = Depends(get_current_user))
     if not bot:
         raise HTTPException(status_code=404, detail="Bot not found")
     
-    # Get trades
-    trades = list(db.db['trades'].find({"bot_id": bot_id}))
+    # Count and sum server-side; only pnl is ever read from the trades
+    rows = list(db.db['trades'].aggregate([
+        {"$match": {"bot_id": bot_id}},
+        {"$project": {"pnl": {"$ifNull": ["$pnl", 0]}}},
+        {"$group": {
+            "_id": None,
+            "total_trades": {"$sum": 1},
+            "winning_trades": {"$sum": {"$cond": [{"$gt": ["$pnl", 0]}, 1, 0]}},
+            "losing_trades": {"$sum": {"$cond": [{"$lt": ["$pnl", 0]}, 1, 0]}},
+            "total_pnl": {"$sum": "$pnl"}
+        }}
+    ]))
+    totals = rows[0] if rows else {}
     
-    total_trades = len(trades)
-    winning_trades = sum(1 for t in trades if t.get('pnl', 0) > 0)
-    losing_trades = sum(1 for t in trades if t.get('pnl', 0) < 0)
-    total_pnl = sum(t.get('pnl', 0) for t in trades)
+    total_trades = totals.get("total_trades", 0)
+    winning_trades = totals.get("winning_trades", 0)
+    losing_trades = totals.get("losing_trades", 0)
+    total_pnl = totals.get("total_pnl", 0)
     win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
     
     return {
@@ -948,14 +924,31 @@ async def get_bot_analytics(bot_id: str, user: dict = Depends(get_current_user))
         "capital": bot.get("config", {}).get("capital", 0)
     }
 
+# Fields the trade history screens actually render
+TRADE_HISTORY_PROJECTION = {
+    "bot_id": 1, "bot_name": 1, "bot_type": 1, "user_id": 1,
+    "symbol": 1, "side": 1, "signal": 1, "strategy": 1, "confidence": 1,
+    "amount": 1, "position_size": 1, "price": 1, "entry_price": 1, "exit_price": 1,
+    "pnl": 1, "pnl_percent": 1, "exit_reason": 1, "status": 1,
+    "is_paper": 1, "paper_trading": 1,
+    "timestamp": 1, "entry_time": 1, "exit_time": 1
+}
+
 @app.get("/api/trades/history")
 async def get_trade_history(
     bot_id: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
     user: dict = Depends(get_current_user)
 ):
-    """Get trade history with filters"""
+    """
+    Get trade history with filters
+    
+    Keyset-paginated on (timestamp, _id): pass the returned next_cursor
+    to get the following page. The response is streamed row by row.
+    """
     query = {}
     
     # Filter by user (admin sees all)
@@ -975,42 +968,55 @@ async def get_trade_history(
         if end_date:
             query["timestamp"]["$lte"] = datetime.fromisoformat(end_date)
     
-    trades = list(db.db['trades'].find(query).sort("timestamp", -1).limit(100))
+    # Bot names are looked up once per bot, not once per trade
+    bot_names = {}
     
-    # Convert ObjectId to string and enrich with bot information
-    for trade in trades:
-        trade["_id"] = str(trade["_id"])
-        if "timestamp" in trade:
-            trade["timestamp"] = trade["timestamp"].isoformat()
-        
+    def enrich(trade):
         # Add bot_name and bot_type if missing
         if not trade.get("bot_name"):
-            bot_id = trade.get("bot_id")
-            if bot_id == "admin_auto_trader" or bot_id == "new_listing_bot":
+            trade_bot_id = trade.get("bot_id")
+            if trade_bot_id == "admin_auto_trader" or trade_bot_id == "new_listing_bot":
                 trade["bot_name"] = "Admin Auto-Trader"
                 trade["bot_type"] = "admin"
             else:
-                # Look up bot name from bot_instances
-                try:
-                    from bson import ObjectId
-                    bot = bot_instances_collection.find_one({"_id": ObjectId(bot_id) if bot_id else None})
-                    if bot:
-                        trade["bot_name"] = bot.get("config", {}).get("bot_type", "Trading Bot")
-                        trade["bot_type"] = "user"
-                    else:
-                        trade["bot_name"] = "Unknown Bot"
-                        trade["bot_type"] = "user"
-                except:
-                    trade["bot_name"] = "Unknown Bot"
-                    trade["bot_type"] = "user"
+                if trade_bot_id not in bot_names:
+                    # Look up bot name from bot_instances
+                    try:
+                        from bson import ObjectId
+                        bot = bot_instances_collection.find_one(
+                            {"_id": ObjectId(trade_bot_id) if trade_bot_id else None},
+                            {"config.bot_type": 1}
+                        )
+                        bot_names[trade_bot_id] = (
+                            bot.get("config", {}).get("bot_type", "Trading Bot") if bot else "Unknown Bot"
+                        )
+                    except:
+                        bot_names[trade_bot_id] = "Unknown Bot"
+                trade["bot_name"] = bot_names[trade_bot_id]
+                trade["bot_type"] = "user"
         elif not trade.get("bot_type"):
             # Set bot_type based on bot_name if missing
             if "Admin" in trade.get("bot_name", ""):
                 trade["bot_type"] = "admin"
             else:
                 trade["bot_type"] = "user"
+        return trade
     
-    return {"trades": trades, "count": len(trades)}
+    try:
+        chunks = stream_json_page(
+            db.db['trades'],
+            query,
+            items_key="trades",
+            projection=TRADE_HISTORY_PROJECTION,
+            limit=limit,
+            cursor=cursor,
+            sort_field="timestamp",
+            transform=enrich
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(chunks, media_type="application/json")
 
 @app.get("/api/positions/open")
 async def get_open_positions(user: dict = Depends(get_current_user)):
@@ -1060,12 +1066,27 @@ async def get_open_positions(user: dict = Depends(get_current_user)):
                 config = bot.get("config", {})
                 latest_buy["_id"] = str(latest_buy["_id"])
                 latest_buy["bot_name"] = config.get("bot_type", "Trading Bot")
-                latest_buy["current_pnl"] = 0  # Would need live price to calculate
+                # Marked from the position stream's shared price feed
+                mark = position_stream.price(latest_buy.get("symbol"), max_age=60)
+                entry = latest_buy.get("entry_price") or latest_buy.get("price") or 0
+                latest_buy["current_price"] = mark
+                latest_buy["current_pnl"] = (mark - entry) * latest_buy.get("amount", 0) if mark and entry else 0
                 latest_buy["is_paper"] = latest_buy.get("is_paper", config.get("paper_trading", True))
                 open_positions.append(latest_buy)
     
     return {"positions": open_positions, "count": len(open_positions)}
 
+@app.get("/api/market/history")
+async def get_market_history(symbol: str, interval: str = "1h", limit: int = 168,
+                             user: dict = Depends(get_current_user)):
+    """OHLC price bars for charts (interval: 1m, 1h or 1d), from pre-computed rollups"""
+    limit = max(1, min(limit, 1000))
+    try:
+        bars = db.get_price_history(symbol, interval, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"symbol": symbol, "interval": interval, "bars": bars, "count": len(bars)}
+
 @app.get("/api/bots/{bot_id}/status")
 async def get_bot_status_endpoint(bot_id: str, user: dict = Depends(get_current_user)):
     """Get real-time bot status"""
@@ -1365,6 +1386,7 @@ async def paystack_callback(reference: str):
 
 # Crypto Payment Integration - FULL IMPLEMENTATION
 from okx_payment_handler import payment_handler
+from price_quotes import QuoteUnavailable
 from balance_fetcher import balance_fetcher
 
 @app.get("/api/payments/crypto/networks")
@@ -1389,6 +1411,8 @@ async def initialize_crypto_payment(payment: CryptoPayment, user: dict = Depends
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except QuoteUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Price quote unavailable, try again shortly: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Payment initialization failed: {str(e)}")
 
@@ -1721,6 +1745,43 @@ async def create_backup(admin: dict = Depends(get_admin_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
 
+# Collections admins may download; users/payments are deliberately excluded
+EXPORTABLE_COLLECTIONS = {"trades", "signals", "performance", "strategy_performance"}
+
+@app.get("/api/admin/export/{collection_name}")
+async def export_collection(
+    collection_name: str,
+    format: str = "csv",
+    admin: dict = Depends(get_admin_user)
+):
+    """Stream a collection as a CSV or Parquet download (admin only)"""
+    if collection_name not in EXPORTABLE_COLLECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {collection_name}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed on the server")
+    
+    collection = db.db[collection_name]
+    filename = export_filename(collection_name, format)
+    
+    return StreamingResponse(
+        iter_scanned_export(lambda: iter_mongo_batches(collection), format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/admin/query-profile")
+async def query_profile(limit: int = 50, admin: dict = Depends(get_admin_user)):
+    """Slowest Mongo query shapes with examine ratios and index advice"""
+    if db.profiler is None:
+        raise HTTPException(status_code=404, detail="Query profiler is disabled (QUERY_PROFILER_ENABLED)")
+    return {
+        "stats": db.profiler.get_stats(),
+        "queries": db.profiler.report(limit=min(limit, 500)),
+        "unindexed": db.profiler.unindexed(),
+    }
+
 @app.post("/api/admin/cache/clear")
 async def clear_cache(admin: dict = Depends(get_admin_user)):
     """Clear system cache"""
@@ -2424,33 +2485,74 @@ What would you like to know?"""
 # REAL-TIME WEBSOCKET
 # ============================================================================
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
-
-manager = ConnectionManager()
+# One queue per connection; `manager` keeps the name other modules import
+manager = broadcaster
 
 @app.websocket("/ws/trades")
-async def websocket_trades(websocket: WebSocket):
-    """Real-time trade updates"""
-    await manager.connect(websocket)
+async def websocket_trades(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Real-time trade updates
+    
+    Without a token: the public trade feed. With ?token=<jwt>: a
+    positions_snapshot frame, then the user's own events (trades, position
+    and pnl deltas), plus any of their bots sent as
+    {"action": "subscribe" | "unsubscribe", "bot_id": "..."}.
+    """
+    user = None
+    if token:
+        try:
+            payload = decode_token(token)
+            user = principal_cache.get(
+                payload.get("sub"),
+                lambda email: users_collection.find_one({"email": email})
+            )
+        except HTTPException:
+            user = None
+        if not user:
+            await websocket.close(code=1008)
+            return
+    
+    is_admin = bool(user) and user.get("role") == "admin"
+    topics = [user_topic(user["_id"])] if user else [PUBLIC_TOPIC]
+    if is_admin:
+        topics.append(ADMIN_TOPIC)
+    conn = await broadcaster.connect(websocket, topics, user_id=str(user["_id"]) if user else None)
+    if user:
+        broadcaster.send(conn, {
+            "type": "positions_snapshot",
+            "data": position_stream.snapshot(None if is_admin else str(user["_id"]))
+        })
     try:
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            if not user:
+                continue  # Keep connection alive
+            try:
+                request = json.loads(text)
+            except ValueError:
+                continue
+            action = request.get("action") if isinstance(request, dict) else None
+            if action not in ("subscribe", "unsubscribe") or not request.get("bot_id"):
+                continue
+            
+            bot_id = str(request["bot_id"])
+            if action == "unsubscribe":
+                broadcaster.unsubscribe(conn, bot_topic(bot_id))
+            elif _owns_bot(user, bot_id):
+                broadcaster.subscribe(conn, bot_topic(bot_id))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        await broadcaster.disconnect(conn)
+
+
+def _owns_bot(user: dict, bot_id: str) -> bool:
+    from bson import ObjectId
+    try:
+        bot = bot_instances_collection.find_one({"_id": ObjectId(bot_id)}, {"user_id": 1})
+    except Exception:
+        return False
+    return bool(bot) and (user.get("role") == "admin" or bot.get("user_id") == str(user["_id"]))
 
 
 # ============================================================================
@@ -2529,6 +2631,12 @@ async def health_check():
     return {
         "status": "healthy",
         "database": db_status,
+        "write_queue": db.writer.get_stats(),
+        "timeseries": db.timeseries.get_stats(),
+        "query_profiler": db.profiler.get_stats() if db.profiler else None,
+        "auth_cache": principal_cache.get_stats(),
+        "websockets": broadcaster.get_stats(),
+        "position_stream": position_stream.get_stats(),
         "timestamp": datetime.utcnow()
     }
 
@@ -3253,6 +3361,8 @@ async def startup_event():
     print(f"{Fore.GREEN}✅ Trading Bot API Started{Style.RESET_ALL}")
     print(f"{Fore.CYAN}📊 Admin Dashboard: http://localhost:8000/docs{Style.RESET_ALL}")
     print(f"{Fore.CYAN}🔌 WebSocket: ws://localhost:8000/ws/trades{Style.RESET_ALL}")
+    if broadcaster.use_redis(config.REDIS_URL):
+        print(f"{Fore.GREEN}✅ WebSocket events shared across workers via Redis{Style.RESET_ALL}")
     print(f"{Fore.YELLOW}💰 Flexible Position Sizing: $10-$1000{Style.RESET_ALL}")
     
     # Update existing admin accounts (does NOT change password)
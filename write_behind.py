@@ -0,0 +1,228 @@
+"""
+Write-Behind Buffer for MongoDB
+Queues non-critical writes (signals, performance snapshots, strategy
+counters) and flushes them with one bulk_write per collection, on size
+or on a timer, from a background thread. Trading loops only pay for an
+in-memory append. Hot counters (e.g. API key usage) are coalesced per
+document, so a thousand increments between flushes become one update.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque, OrderedDict
+from typing import Dict, Optional
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Batched, time/size-flushed writer
+
+    Operations keep their enqueue order per collection (bulk writes are
+    ordered), so an upsert followed by an $inc on the same document
+    lands in the right order. If the database is unreachable the
+    operations are put back and retried on the next flush; when the
+    queue is full the oldest operation is dropped and counted.
+    """
+
+    def __init__(self, db, max_batch: int = 500, flush_interval: float = 2.0,
+                 max_queue: int = 50000, start: bool = True):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue = deque()
+        self._counters: OrderedDict = OrderedDict()  # (collection, filter) -> pending $inc/$set
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+        self.stats = {
+            'enqueued': 0,
+            'coalesced': 0,
+            'written': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'errors': 0,
+            'last_flush_ms': 0.0,
+        }
+
+        if start:
+            self.start()
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+
+    def insert(self, collection: str, document: Dict):
+        """Queue an insert_one"""
+        self._enqueue(collection, InsertOne(document))
+
+    def update(self, collection: str, filter: Dict, update, upsert: bool = False):
+        """Queue an update_one (update may be a document or a pipeline)"""
+        self._enqueue(collection, UpdateOne(filter, update, upsert=upsert))
+
+    def increment(self, collection: str, filter: Dict, inc: Dict, set_fields: Optional[Dict] = None):
+        """
+        Queue an $inc (plus optional $set), merged with any pending
+        increment of the same document until the next flush
+        """
+        if self._closed:
+            update = {'$inc': inc}
+            if set_fields:
+                update['$set'] = set_fields
+            self.db[collection].bulk_write([UpdateOne(filter, update)])
+            return
+
+        key = (collection, tuple(sorted(filter.items())))
+        with self._lock:
+            pending = self._counters.get(key)
+            if pending is None:
+                self._counters[key] = {'filter': filter, 'inc': dict(inc), 'set': dict(set_fields or {})}
+                self.stats['enqueued'] += 1
+            else:
+                for field, amount in inc.items():
+                    pending['inc'][field] = pending['inc'].get(field, 0) + amount
+                pending['set'].update(set_fields or {})
+                self.stats['coalesced'] += 1
+
+    def _drain_counters(self):
+        """Turn pending increments into queued updates (called under _lock)"""
+        while self._counters:
+            (collection, _), pending = self._counters.popitem(last=False)
+            update = {'$inc': pending['inc']}
+            if pending['set']:
+                update['$set'] = pending['set']
+            self._queue.append((collection, UpdateOne(pending['filter'], update)))
+
+    def _enqueue(self, collection: str, operation):
+        if self._closed:
+            # After shutdown there is no flusher left; write through
+            self.db[collection].bulk_write([operation])
+            return
+
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.stats['dropped'] += 1
+            self._queue.append((collection, operation))
+            self.stats['enqueued'] += 1
+            full = len(self._queue) >= self.max_batch
+
+        if full:
+            self._wakeup.set()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of operations waiting to be written"""
+        return len(self._queue) + len(self._counters)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.queue_depth
+        return stats
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the background flusher thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    def flush(self) -> int:
+        """Write everything queued so far; returns operations written"""
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                self._drain_counters()
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        break
+                    batch = [self._queue.popleft()
+                             for _ in range(min(self.max_batch, len(self._queue)))]
+
+                started = time.perf_counter()
+                by_collection: Dict[str, list] = OrderedDict()
+                for collection, operation in batch:
+                    by_collection.setdefault(collection, []).append(operation)
+
+                pending = list(by_collection.items())
+                try:
+                    while pending:
+                        collection, operations = pending[0]
+                        try:
+                            self.db[collection].bulk_write(operations, ordered=True)
+                            done = len(operations)
+                        except BulkWriteError as e:
+                            # A rejected document (duplicate key, validation) will
+                            # never succeed: count it as dropped, keep the rest.
+                            # Operations before it were applied already.
+                            errors = e.details.get('writeErrors') or [{'index': 0}]
+                            failed_at = errors[0]['index']
+                            done = failed_at
+                            self.stats['dropped'] += 1
+                            logger.error(f"Write-behind dropped rejected write to {collection}: {errors[0].get('errmsg', e)}")
+                            pending[0] = (collection, operations[failed_at + 1:])
+                        written += done
+                        self.stats['written'] += done
+                        if not pending[0][1] or done == len(operations):
+                            pending.pop(0)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.error(f"Write-behind bulk_write failed, will retry: {e}")
+                    self._requeue(pending)
+                    break
+                finally:
+                    self.stats['flushes'] += 1
+                    self.stats['last_flush_ms'] = (time.perf_counter() - started) * 1000
+
+        return written
+
+    def _requeue(self, pending):
+        """Put unwritten operations back at the front, oldest first"""
+        with self._lock:
+            for collection, operations in reversed(pending):
+                for operation in reversed(operations):
+                    self._queue.appendleft((collection, operation))
+            # Same overflow policy as _enqueue: the oldest operations go first
+            while len(self._queue) > self.max_queue:
+                self._queue.popleft()
+                self.stats['dropped'] += 1
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Stop the flusher and write whatever is left"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Write-behind final flush failed: {e}")
+        if self.queue_depth:
+            logger.warning(f"Write-behind closed with {self.queue_depth} unwritten operations")